@@ -1,6 +1,8 @@
 # agents/forms.py
 from django import forms
-from .models import Agent
+
+from sources.models import DataSource, Tag
+from .models import Agent, AgentSourceLink
 
 class AgentCreateForm(forms.ModelForm):
     class Meta:
@@ -25,3 +27,51 @@ class AgentCreateForm(forms.ModelForm):
             "user_bubble_color": forms.TextInput(attrs={"type": "color"}),
             "text_color": forms.TextInput(attrs={"type": "color"}),
         }
+
+
+class AgentSourcesForm(forms.Form):
+    """
+    One multi-select per purpose, limited to the user's sources of the allowed types.
+    """
+    guidance = forms.ModelMultipleChoiceField(queryset=DataSource.objects.none(), required=False, widget=forms.CheckboxSelectMultiple)
+    contact = forms.ModelMultipleChoiceField(queryset=DataSource.objects.none(), required=False, widget=forms.CheckboxSelectMultiple)
+    support = forms.ModelMultipleChoiceField(queryset=DataSource.objects.none(), required=False, widget=forms.CheckboxSelectMultiple)
+    doc_referral = forms.ModelMultipleChoiceField(queryset=DataSource.objects.none(), required=False, widget=forms.CheckboxSelectMultiple)
+    tags = forms.ModelMultipleChoiceField(
+        queryset=Tag.objects.none(), required=False, widget=forms.CheckboxSelectMultiple,
+        label="Only content tagged (any of)",
+    )
+
+    def __init__(self, *args, agent=None, **kwargs):
+        self.agent = agent
+        initial = kwargs.setdefault("initial", {})
+        for source_id, purpose in agent.source_links.values_list("source_id", "purpose"):
+            initial.setdefault(purpose, []).append(source_id)
+        initial.setdefault("tags", list(agent.tags.values_list("id", flat=True)))
+        super().__init__(*args, **kwargs)
+        self.fields["tags"].queryset = Tag.objects.filter(user_id=agent.user_id).order_by("name")
+        labels = dict(AgentSourceLink.PURPOSE_CHOICES)
+        for purpose, types in AgentSourceLink.PURPOSE_SOURCE_TYPES.items():
+            self.fields[purpose].label = labels[purpose]
+            self.fields[purpose].queryset = DataSource.objects.filter(
+                user_id=agent.user_id, source_type__in=types
+            ).order_by("name")
+
+    def save(self) -> bool:
+        """
+        Sync AgentSourceLink rows and the tag scope with the selection.
+        Returns True if anything changed.
+        """
+        wanted = {(src.id, purpose) for purpose in AgentSourceLink.PURPOSE_SOURCE_TYPES for src in self.cleaned_data[purpose]}
+        current = set(self.agent.source_links.values_list("source_id", "purpose"))
+        for source_id, purpose in current - wanted:
+            self.agent.source_links.filter(source_id=source_id, purpose=purpose).delete()
+        AgentSourceLink.objects.bulk_create([
+            AgentSourceLink(agent=self.agent, source_id=source_id, purpose=purpose)
+            for source_id, purpose in sorted(wanted - current)
+        ])
+        tags = {t.id for t in self.cleaned_data["tags"]}
+        tags_changed = tags != set(self.agent.tags.values_list("id", flat=True))
+        if tags_changed:
+            self.agent.tags.set(tags)
+        return wanted != current or tags_changed
@@ -0,0 +1,55 @@
+# agents/management/commands/build_agent_kb.py
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from agents.models import Agent
+from agents.services.kb import build_kb, build_stale_kbs, get_kb, loaded_segments, _kb_dir
+
+
+class Command(BaseCommand):
+    help = "Compile agent knowledge-base snapshots and report size and query latency."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--agent", type=int, help="Agent id (default: every agent).")
+        parser.add_argument("--stale", action="store_true", help="Only rebuild agents whose sources changed.")
+        parser.add_argument("--query", default="", help="Time this query against the new snapshot.")
+        parser.add_argument("--repeat", type=int, default=1000, help="Timed query rounds.")
+
+    def handle(self, *args, **options):
+        if options["stale"]:
+            self.stdout.write(f"Rebuilt {build_stale_kbs(limit=10**6)} stale agent(s).")
+            return
+
+        agents = Agent.objects.order_by("id")
+        if options["agent"]:
+            agents = agents.filter(pk=options["agent"])
+            if not agents.exists():
+                raise CommandError(f"No agent #{options['agent']}")
+
+        for agent in agents:
+            t0 = time.perf_counter()
+            version = build_kb(agent)
+            build = time.perf_counter() - t0
+            kb = get_kb(agent.id)
+            size = os.path.getsize(os.path.join(_kb_dir(agent.id), f"{version}.kb"))
+            self.stdout.write(
+                f"#{agent.id} {agent.name}: {version[:12]}  entries: {len(kb)}  segments: {len(kb.segments)}  "
+                f"size: {size / 1024:.0f} KB  build: {build * 1000:.0f} ms"
+            )
+            if not options["query"]:
+                continue
+            rounds = max(options["repeat"], 1)
+            t0 = time.perf_counter()
+            for _ in range(rounds):
+                hits = get_kb(agent.id).search(options["query"], k=5)
+            self.stdout.write(f"  query: {(time.perf_counter() - t0) / rounds * 1e6:.0f} µs")
+            for h in hits:
+                self.stdout.write(f"  {h['score']:7.3f}  {h['kind']:6s} #{h['id']:<6d} {h.get('title') or h.get('name') or ''}")
+
+        shared = loaded_segments()
+        self.stdout.write(
+            f"Loaded segments: {shared['segments']} ({shared['docs']} entries, {shared['bytes'] / 1024:.0f} KB) "
+            f"referenced {shared['refs']} times"
+        )
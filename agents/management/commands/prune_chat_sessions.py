@@ -0,0 +1,15 @@
+# agents/management/commands/prune_chat_sessions.py
+from django.core.management.base import BaseCommand
+
+from agents.services.sessions import prune_sessions
+
+
+class Command(BaseCommand):
+    help = "Delete chat sessions idle for longer than CHAT_SESSION_TTL_DAYS."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=None, help="Override CHAT_SESSION_TTL_DAYS.")
+
+    def handle(self, *args, **options):
+        deleted = prune_sessions(options["days"])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} chat session(s)."))
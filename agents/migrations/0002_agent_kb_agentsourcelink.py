@@ -0,0 +1,43 @@
+# Generated by Django 6.0 on 2026-10-19 10:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agents', '0001_initial'),
+        ('sources', '0019_tagindexevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='agent',
+            name='kb_built_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='agent',
+            name='kb_stale',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='agent',
+            name='kb_version',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.CreateModel(
+            name='AgentSourceLink',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('purpose', models.CharField(choices=[('guidance', 'Website guidance'), ('contact', 'Contact data'), ('support', 'Support FAQ'), ('doc_referral', 'Document referral')], max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('agent', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='source_links', to='agents.agent')),
+                ('source', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='agent_links', to='sources.datasource')),
+            ],
+            options={
+                'unique_together': {('agent', 'source', 'purpose')},
+            },
+        ),
+    ]
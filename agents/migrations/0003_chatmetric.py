@@ -0,0 +1,30 @@
+# Generated by Django 6.0 on 2026-10-19 10:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agents', '0002_agent_kb_agentsourcelink'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChatMetric',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('intent', models.CharField(max_length=20)),
+                ('intent_ms', models.IntegerField(default=0)),
+                ('retrieval_ms', models.IntegerField(default=0)),
+                ('ttft_ms', models.IntegerField(blank=True, null=True)),
+                ('total_ms', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('agent', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chat_metrics', to='agents.agent')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['agent', 'created_at'], name='agents_chat_agent_i_e281bf_idx')],
+            },
+        ),
+    ]
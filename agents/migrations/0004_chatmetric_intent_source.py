@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-19 10:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agents', '0003_chatmetric'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatmetric',
+            name='intent_source',
+            field=models.CharField(choices=[('local', 'Local classifier'), ('llm', 'LLM')], default='llm', max_length=10),
+        ),
+    ]
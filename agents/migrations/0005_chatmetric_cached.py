@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-19 10:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agents', '0004_chatmetric_intent_source'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatmetric',
+            name='cached',
+            field=models.BooleanField(default=False),
+        ),
+    ]
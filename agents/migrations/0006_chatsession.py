@@ -0,0 +1,31 @@
+# Generated by Django 6.0 on 2026-10-19 10:47
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agents', '0005_chatmetric_cached'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChatSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('public_id', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('summary', models.TextField(blank=True, default='')),
+                ('turns', models.JSONField(blank=True, default=list)),
+                ('turn_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('agent', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chat_sessions', to='agents.agent')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['agent', 'updated_at'], name='agents_chat_agent_i_41701a_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 6.0 on 2026-10-19 11:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agents', '0006_chatsession'),
+        ('sources', '0019_tagindexevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='agent',
+            name='tags',
+            field=models.ManyToManyField(blank=True, related_name='agents', to='sources.tag'),
+        ),
+    ]
@@ -29,6 +29,13 @@ class Agent(models.Model):
 
     is_active = models.BooleanField(default=False)  # later: only active agents can be embedded
 
+    # compiled knowledge base (agents/services/kb.py): content hash of the live snapshot
+    kb_version = models.CharField(max_length=64, blank=True, default="")
+    kb_built_at = models.DateTimeField(null=True, blank=True)
+    kb_stale = models.BooleanField(default=False)  # a linked source changed since the last build
+    # retrieval scope: when set, chat only draws on pages/sources carrying any of these tags
+    tags = models.ManyToManyField("sources.Tag", blank=True, related_name="agents")
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -36,4 +43,81 @@ class Agent(models.Model):
         ordering = ["-created_at"]
 
     def __str__(self):
-        return self.name
\ No newline at end of file
+        return self.name
+
+class AgentSourceLink(models.Model):
+    """
+    A data source an agent may draw from, and for which purpose (one row per purpose).
+    """
+    PURPOSE_CHOICES = [
+        ("guidance", "Website guidance"),
+        ("contact", "Contact data"),
+        ("support", "Support FAQ"),
+        ("doc_referral", "Document referral"),
+    ]
+    # source types each purpose can use
+    PURPOSE_SOURCE_TYPES = {
+        "guidance": ("website", "custom"),
+        "contact": ("sheet", "custom", "website"),
+        "support": ("custom", "website", "document"),
+        "doc_referral": ("document",),
+    }
+
+    agent = models.ForeignKey(Agent, on_delete=models.CASCADE, related_name="source_links")
+    source = models.ForeignKey("sources.DataSource", on_delete=models.CASCADE, related_name="agent_links")
+    purpose = models.CharField(max_length=20, choices=PURPOSE_CHOICES)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = [("agent", "source", "purpose")]
+
+    def __str__(self):
+        return f"{self.agent} → {self.source} ({self.purpose})"
+
+
+class ChatMetric(models.Model):
+    """
+    Timings of one streamed chat answer (agents/services/chat.py), in milliseconds.
+    """
+    INTENT_SOURCE_CHOICES = [
+        ("local", "Local classifier"),
+        ("llm", "LLM"),
+    ]
+
+    agent = models.ForeignKey(Agent, on_delete=models.CASCADE, related_name="chat_metrics")
+    intent = models.CharField(max_length=20)
+    intent_source = models.CharField(max_length=10, choices=INTENT_SOURCE_CHOICES, default="llm")  # fast-path coverage
+    cached = models.BooleanField(default=False)  # served from the answer cache (agents/services/answers.py)
+
+    intent_ms = models.IntegerField(default=0)
+    retrieval_ms = models.IntegerField(default=0)
+    ttft_ms = models.IntegerField(null=True, blank=True)  # time to first token; None if no text was streamed
+    total_ms = models.IntegerField(default=0)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["agent", "created_at"])]
+
+
+class ChatSession(models.Model):
+    """
+    One visitor conversation with an agent (agents/services/sessions.py): a running summary
+    of compacted turns plus the last few turns verbatim, so its size stays bounded.
+    """
+    agent = models.ForeignKey(Agent, on_delete=models.CASCADE, related_name="chat_sessions")
+    public_id = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)  # handed to the widget
+
+    summary = models.TextField(blank=True, default="")
+    turns = models.JSONField(default=list, blank=True)  # [{"role": "user"|"assistant", "text": ...}], oldest first
+    turn_count = models.IntegerField(default=0)          # messages ever exchanged, compacted ones included
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["agent", "updated_at"])]
+
+    def __str__(self):
+        return f"{self.agent} session {self.public_id}"
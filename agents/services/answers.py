@@ -0,0 +1,129 @@
+# agents/services/answers.py
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from django.conf import settings
+
+from sources.services.embeddings import embed_texts, get_embedder
+from sources.services.search import tokenize
+
+
+def normalize_question(text: str) -> str:
+    # "Pricing?" / "what is the pricing" -> "pricing"
+    return " ".join(tokenize(text))
+
+
+class AnswerCache:
+    """
+    Process-local LRU + TTL cache of finished chat answers, keyed by
+    (agent id, KB version, normalized question). A new KB version starts an empty
+    key space, so re-ingested sources (sheet rows included, see kb._rows_stamp) or
+    edited summaries never serve old answers.
+
+    With a similarity threshold, a miss on the exact key falls back to the closest
+    cached question of the same agent/version (cosine over question embeddings).
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, similarity: float = 0.0):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self.similarity = similarity
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()     # (agent_id, version, key) -> (expires_at, answer)
+        self.buckets = {}                # (agent_id, version) -> {key: vector}
+        self._matrices = {}              # (agent_id, version) -> (keys, matrix), rebuilt lazily
+        self.hits = self.similar_hits = self.misses = 0
+
+    def _embed(self, key: str):
+        if not self.similarity:
+            return None
+        return embed_texts([key], get_embedder())[0]
+
+    def _drop(self, entry_key):
+        self.entries.pop(entry_key, None)
+        agent_id, version, key = entry_key
+        bucket = self.buckets.get((agent_id, version))
+        if bucket is not None:
+            bucket.pop(key, None)
+            self._matrices.pop((agent_id, version), None)
+            if not bucket:
+                del self.buckets[(agent_id, version)]
+
+    def _closest(self, agent_id, version, vec):
+        bucket = self.buckets.get((agent_id, version))
+        if not bucket or vec is None:
+            return None
+        cached = self._matrices.get((agent_id, version))
+        if cached is None:
+            keys = list(bucket)
+            cached = self._matrices[(agent_id, version)] = (keys, np.vstack([bucket[k] for k in keys]))
+        keys, matrix = cached
+        scores = matrix @ vec
+        best = int(np.argmax(scores))
+        return keys[best] if scores[best] >= self.similarity else None
+
+    def get(self, agent_id, version: str, question: str):
+        key = normalize_question(question)
+        if not key:
+            return None
+        vec = self._embed(key)
+        now = time.monotonic()
+        with self.lock:
+            candidates = [key]
+            if vec is not None and (agent_id, version, key) not in self.entries:
+                similar = self._closest(agent_id, version, vec)
+                if similar is not None:
+                    candidates.append(similar)
+            for candidate in candidates:
+                entry_key = (agent_id, version, candidate)
+                item = self.entries.get(entry_key)
+                if item is None:
+                    continue
+                if item[0] < now:
+                    self._drop(entry_key)
+                    continue
+                self.entries.move_to_end(entry_key)
+                if candidate == key:
+                    self.hits += 1
+                else:
+                    self.similar_hits += 1
+                return item[1]
+            self.misses += 1
+            return None
+
+    def put(self, agent_id, version: str, question: str, answer: dict):
+        key = normalize_question(question)
+        if not key:
+            return
+        vec = self._embed(key)
+        with self.lock:
+            # answers of this agent's older KB versions can never be served again
+            for agent_version in [av for av in self.buckets if av[0] == agent_id and av[1] != version]:
+                for old_key in list(self.buckets[agent_version]):
+                    self._drop((agent_id, agent_version[1], old_key))
+
+            entry_key = (agent_id, version, key)
+            self.entries[entry_key] = (time.monotonic() + self.ttl, answer)
+            self.entries.move_to_end(entry_key)
+            self.buckets.setdefault((agent_id, version), {})[key] = vec if vec is not None else np.zeros(1, dtype=np.float32)
+            self._matrices.pop((agent_id, version), None)
+            while len(self.entries) > self.max_entries:
+                self._drop(next(iter(self.entries)))
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_answer_cache() -> AnswerCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = AnswerCache(
+                max_entries=settings.ANSWER_CACHE_MAX_ENTRIES,
+                ttl_seconds=settings.ANSWER_CACHE_TTL_SECONDS,
+                similarity=settings.ANSWER_CACHE_SIMILARITY,
+            )
+        return _cache
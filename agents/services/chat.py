@@ -0,0 +1,272 @@
+# agents/services/chat.py
+import asyncio
+import os
+import time
+
+from asgiref.sync import sync_to_async
+from openai import AsyncOpenAI
+
+from agents.models import ChatMetric
+from agents.services.answers import get_answer_cache
+from agents.services.context import pack_context
+from agents.services.sessions import history_text, record_turn
+from agents.services.intent import CONFIDENCE_THRESHOLD, INTENTS, classify
+from sources.services.rowstore import lookup_rows
+from sources.services.search import STOPWORDS, TOKEN_RE
+from sources.services.tagindex import filter_keys
+from sources.services.vectors import semantic_search
+
+INTENT_PURPOSES = {
+    "navigation": ["guidance"],
+    "support": ["support"],
+    "contact": ["contact"],
+    "document": ["doc_referral"],
+    "general": None,   # any purpose
+}
+
+RETRIEVE_K = 24          # candidates fetched before the intent is known
+RRF_K = 60               # reciprocal-rank fusion damping for lexical + semantic hits
+MAX_BUTTONS = 4
+MAX_CARDS = 6
+CONTACT_ROWS = 5
+
+_async_client = None
+
+
+def get_async_openai_client():
+    global _async_client
+    if _async_client is None:
+        _async_client = AsyncOpenAI()
+    return _async_client
+
+
+def _ms(t0: float) -> int:
+    return int((time.perf_counter() - t0) * 1000)
+
+
+async def detect_intent(message: str) -> str:
+    """
+    One short LLM call; "general" if it fails or answers something unexpected.
+    """
+    try:
+        response = await get_async_openai_client().responses.create(
+            model=os.getenv("OPENAI_INTENT_MODEL", "gpt-5-nano"),
+            instructions=(
+                "Classify the website visitor's message. Reply with exactly one word: "
+                "navigation (looking for a page), support (how-to / FAQ), contact (people, emails, phones), "
+                "document (brochures, portfolios, case studies) or general."
+            ),
+            input=message[:1000],
+        )
+    except Exception:
+        return "general"
+    word = (getattr(response, "output_text", "") or "").strip().lower().strip(".")
+    return word if word in INTENTS else "general"
+
+
+def _in_scope(hit: dict, keys) -> bool:
+    if hit["kind"] == "page":
+        return ("page", hit["id"]) in keys
+    return ("source", hit["source_id"]) in keys
+
+
+def retrieve(kb, message: str, user_id=None) -> list[dict]:
+    """
+    BM25 over the KB blended with the user's vector index (restricted to the agent's
+    sources), so paraphrased questions still find their pages. Reciprocal-rank fusion:
+    the two score scales aren't comparable. All purposes: the intent isn't known yet,
+    hits are narrowed afterwards.
+
+    An agent scoped to tags is prefiltered through the user's tag bitmap index, so
+    tag edits apply without rebuilding the KB.
+    """
+    keys = filter_keys(user_id, kb.tags, "any", kb.source_ids()) if user_id is not None and kb.tags else None
+    lexical = kb.search(message, k=RETRIEVE_K, keys=keys)
+    if user_id is None:
+        return lexical
+    try:
+        semantic = kb.records(semantic_search(user_id, message, k=RETRIEVE_K, source_ids=kb.source_ids()))
+    except Exception:
+        return lexical  # embedding provider down: lexical results alone
+    if keys is not None:
+        semantic = [h for h in semantic if _in_scope(h, keys)]
+    fused = {}
+    for ranked in (lexical, semantic):
+        for rank, hit in enumerate(ranked):
+            key = (hit["kind"], hit["id"])
+            score = 1.0 / (RRF_K + rank + 1)
+            if key in fused:
+                fused[key]["score"] += score
+            else:
+                fused[key] = {**hit, "score": score}
+    return sorted(fused.values(), key=lambda h: -h["score"])[:RETRIEVE_K]
+
+
+def narrow(kb, hits: list[dict], intent: str) -> list[dict]:
+    purposes = INTENT_PURPOSES[intent]
+    if not purposes:
+        return hits
+    return [h for h in hits if set(kb.sources[h["source_id"]]["purposes"]) & set(purposes)]
+
+
+def contact_rows(kb, message: str) -> list[dict]:
+    """
+    Sheet rows matching any name/email/phone-like word of the message.
+    """
+    sheet_ids = [s["id"] for s in kb.sources.values() if s["type"] == "sheet" and "contact" in s["purposes"]]
+    if not sheet_ids:
+        return []
+    for word in TOKEN_RE.findall(message.lower()):
+        if len(word) < 3 or word in STOPWORDS:
+            continue
+        rows = lookup_rows(sheet_ids, word, limit=CONTACT_ROWS)
+        if rows:
+            return rows
+    return []
+
+
+def ui_blocks(kb, intent: str, hits: list[dict]) -> list[dict]:
+    """
+    Widget blocks: link buttons for navigation, cards for product pages,
+    a lead form in front of documents.
+    """
+    blocks = []
+    pages = [h for h in hits if h["kind"] == "page"]
+    products = [h for h in pages if h.get("category") == "product"]
+    if products:
+        blocks.append({"type": "cards", "items": [
+            {"title": h["title"] or h["url"], "description": h["description"], "image": h["image"], "url": h["url"]}
+            for h in products[:MAX_CARDS]
+        ]})
+    if intent in ("navigation", "general", "support") and pages:
+        blocks.append({"type": "buttons", "items": [
+            {"label": h["title"] or h["url"], "url": h["url"]}
+            for h in pages[:MAX_BUTTONS] if h not in products
+        ]})
+    if intent == "document":
+        source_ids = []
+        for h in hits:
+            if h["source_id"] not in source_ids and "doc_referral" in kb.sources[h["source_id"]]["purposes"]:
+                source_ids.append(h["source_id"])
+        source_ids = source_ids or kb.source_ids("doc_referral")
+        if source_ids:
+            blocks.append({
+                "type": "lead_form",
+                "fields": ["name", "email"],
+                "documents": [{"source_id": s, "name": kb.sources[s]["name"]} for s in source_ids[:MAX_BUTTONS]],
+            })
+    return [b for b in blocks if b.get("items") or b["type"] == "lead_form"]
+
+
+def ui_links(blocks: list[dict]) -> list[str]:
+    return [item["url"] for b in blocks for item in b.get("items", []) if item.get("url")]
+
+
+async def stream_answer(agent, message: str, intent: str, context: str, history: str = ""):
+    """
+    Yields text deltas as the model produces them. `history` is the session's
+    compacted conversation (sessions.history_text), so the prompt stays bounded.
+    """
+    conversation = f"CONVERSATION SO FAR:\n{history}\n\n" if history else ""
+    stream = await get_async_openai_client().responses.create(
+        model=os.getenv("OPENAI_CHAT_MODEL", "gpt-5-nano"),
+        instructions=(
+            f"You are {agent.name}, the assistant on this company's website. {agent.description}\n"
+            "Answer in 1-3 short sentences using only the context. If the context does not cover it, say so "
+            "and suggest contacting the team. Don't paste URLs: links are shown as buttons."
+        ),
+        input=f"Visitor intent: {intent}\n\n{conversation}CONTEXT:\n{context or '(nothing relevant found)'}\n\nQUESTION: {message}",
+        stream=True,
+    )
+    async for event in stream:
+        if event.type == "response.output_text.delta":
+            yield event.delta
+
+
+async def _cached_events(agent, kb, session, message: str, answer: dict, t0: float):
+    """
+    Replays a cached answer in the same event sequence as a fresh one.
+    """
+    yield "meta", {**answer["meta"], "kb_version": kb.version[:12], "session": str(session.public_id), "cached": True}
+    for block in answer["blocks"]:
+        yield "block", block
+    timings = {"ttft_ms": _ms(t0)}
+    yield "token", {"text": answer["text"]}
+    timings["total_ms"] = _ms(t0)
+    yield "done", timings
+    await record_turn(session, message, answer["text"])
+    await ChatMetric.objects.acreate(
+        agent=agent, intent=answer["meta"]["intent"], intent_source=answer["meta"]["intent_source"], cached=True, **timings
+    )
+
+
+async def chat_events(agent, kb, session, message: str):
+    """
+    Yields (event, data) for one message: "meta" once intent and retrieval are done,
+    one "block" per UI block, "token" per text delta, then "done" with the timings
+    that also go to ChatMetric.
+
+    The local classifier decides the intent when it is confident; otherwise the LLM
+    is asked, concurrently with retrieval. Repeated questions are answered from the
+    answer cache, which is bypassed while the agent's sources are being re-ingested
+    and for follow-ups (their answer depends on the conversation). The exchange is
+    recorded on the session after "done", compacting older turns when needed.
+
+    Blocking work (ORM, embedder) goes through sync_to_async, so it runs on the
+    request's thread and its DB connection is closed with the request.
+    """
+    t0 = time.perf_counter()
+    timings = {}
+    history = history_text(session)
+    cache = get_answer_cache() if not (agent.kb_stale or history) else None
+    if cache is not None:
+        answer = await sync_to_async(cache.get)(agent.id, kb.version, message)
+        if answer is not None:
+            async for event in _cached_events(agent, kb, session, message, answer, t0):
+                yield event
+            return
+
+    async def timed(name, coro):
+        started = time.perf_counter()
+        try:
+            return await coro
+        finally:
+            timings[name] = _ms(started)
+
+    started = time.perf_counter()
+    intent, confidence = await sync_to_async(classify)(message, kb)  # first call per KB builds the lexicon
+    if confidence >= CONFIDENCE_THRESHOLD:
+        intent_source = "local"
+        timings["intent_ms"] = _ms(started)
+        hits = await timed("retrieval_ms", sync_to_async(retrieve)(kb, message, agent.user_id))
+    else:
+        intent_source = "llm"
+        intent, hits = await asyncio.gather(
+            timed("intent_ms", detect_intent(message)),
+            timed("retrieval_ms", sync_to_async(retrieve)(kb, message, agent.user_id)),
+        )
+    hits = narrow(kb, hits, intent)
+    rows = await sync_to_async(contact_rows)(kb, message) if intent == "contact" else []
+    meta = {"intent": intent, "intent_source": intent_source, "sources": sorted({h["source_id"] for h in hits})}
+    yield "meta", {**meta, "kb_version": kb.version[:12], "session": str(session.public_id)}
+
+    blocks = ui_blocks(kb, intent, hits)
+    for block in blocks:
+        yield "block", block
+
+    ttft = None
+    text = []
+    context = pack_context(message, hits, rows, links=ui_links(blocks))
+    async for delta in stream_answer(agent, message, intent, context, history):
+        if ttft is None:
+            ttft = _ms(t0)
+        text.append(delta)
+        yield "token", {"text": delta}
+
+    timings.update(ttft_ms=ttft, total_ms=_ms(t0))
+    yield "done", timings
+    answer = "".join(text)
+    if cache is not None and answer:
+        await sync_to_async(cache.put)(agent.id, kb.version, message, {"meta": meta, "blocks": blocks, "text": answer})
+    await record_turn(session, message, answer)
+    await ChatMetric.objects.acreate(agent=agent, intent=intent, intent_source=intent_source, **timings)
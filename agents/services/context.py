@@ -0,0 +1,133 @@
+# agents/services/context.py
+import re
+
+from django.conf import settings
+
+from sources.services.search import tokenize
+
+CHARS_PER_TOKEN = 4          # rough English average; the budget is a bound, not an exact count
+HIT_SHARE = 0.4              # one hit may take at most this share of the budget
+DUPLICATE_OVERLAP = 0.8      # sentences sharing this much of their terms are the same content
+CONTACT_ROWS_SHARE = 0.3
+MIN_TRIM_TOKENS = 16         # below this a too-long sentence is skipped rather than cut
+
+LINKS_BLOCK_RE = re.compile(r"\n\s*Important links:\s*\n.*\Z", re.S | re.I)
+URL_RE = re.compile(r"https?://\S+|www\.\S+")
+SENTENCE_RE = re.compile(r"(?<=[.!?])\s+|\n+")
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def clean_text(text: str) -> str:
+    """
+    Drops the "Important links:" block summarize_with_openai appends and any inline URL:
+    the widget shows the links it needs as buttons and cards.
+    """
+    text = LINKS_BLOCK_RE.sub("", text or "")
+    return URL_RE.sub("", text)
+
+
+def _sentences(text: str) -> list[str]:
+    return [s.strip() for s in SENTENCE_RE.split(clean_text(text)) if len(s.strip()) > 2]
+
+
+def _label(hit: dict, links: set) -> str:
+    if hit["kind"] == "page":
+        title = hit["title"] or hit["url"]
+        return f"[page] {title} (shown as a link)" if hit["url"] in links else f"[page] {title}"
+    if hit["kind"] == "chunk":
+        return f"[document excerpt, p. {hit['page_start']}-{hit['page_end']}]" if hit.get("page_start") else "[document excerpt]"
+    return f"[{hit['type']}] {hit['name']}"
+
+
+def _texts(hit: dict) -> list[str]:
+    if hit["kind"] == "page":
+        return [hit["description"], hit["summary"]]
+    return [hit["summary"], hit["text"]]
+
+
+class _Seen:
+    """
+    Term sets of the sentences packed so far, to skip restatements across hits
+    (overlapping chunks, a page description repeated in its summary, ...).
+    """
+
+    def __init__(self):
+        self.sets = []
+
+    def duplicate(self, terms: frozenset) -> bool:
+        if not terms:
+            return True
+        for seen in self.sets:
+            smaller = min(len(terms), len(seen))
+            if terms == seen or (smaller >= 3 and len(terms & seen) >= DUPLICATE_OVERLAP * smaller):
+                return True
+        return False
+
+    def add(self, terms: frozenset):
+        self.sets.append(terms)
+
+
+def _contact_lines(rows: list[dict], budget: int) -> list[str]:
+    lines, used = [], 0
+    for r in rows:
+        line = "[contact] " + ", ".join(f"{k}: {v}" for k, v in r["data"].items() if v)
+        cost = estimate_tokens(line)
+        if used + cost > budget:
+            break
+        lines.append(line)
+        used += cost
+    return lines
+
+
+def pack_context(query: str, hits: list[dict], rows: list[dict] = (), links=(), budget: int | None = None) -> str:
+    """
+    Prompt context from ranked hits within `budget` tokens (settings.CHAT_CONTEXT_TOKENS).
+
+    Hits are taken in rank order; each contributes its sentences that share the most
+    terms with the query (kept in reading order), skipping ones already said by a
+    better-ranked hit. `links` are the URLs the UI shows, so the model can point at them.
+    """
+    budget = budget or settings.CHAT_CONTEXT_TOKENS
+    links = set(links)
+    query_terms = set(tokenize(query))
+    parts = _contact_lines(rows, int(budget * CONTACT_ROWS_SHARE))
+    used = sum(estimate_tokens(p) for p in parts)
+    seen = _Seen()
+    per_hit = max(int(budget * HIT_SHARE), 1)
+
+    for hit in hits:
+        if used >= budget:
+            break
+        label = _label(hit, links)
+        candidates = []
+        for text in _texts(hit):
+            for sentence in _sentences(text):
+                terms = frozenset(tokenize(sentence))
+                candidates.append((len(terms & query_terms), len(candidates), sentence, terms))
+
+        # most relevant first; ties keep reading order, so a hit without matches leads with its opening
+        chosen = []
+        allowance = min(per_hit, budget - used) - estimate_tokens(label) - 1
+        for _, position, sentence, terms in sorted(candidates, key=lambda c: (-c[0], c[1])):
+            if seen.duplicate(terms):
+                continue
+            cost = estimate_tokens(sentence) + 1
+            if cost > allowance:
+                if chosen or allowance < MIN_TRIM_TOKENS:
+                    continue
+                # a hit's best sentence is never dropped for length, only cut
+                sentence = sentence[:allowance * CHARS_PER_TOKEN].rsplit(" ", 1)[0] + " …"
+                cost = allowance
+            seen.add(terms)
+            chosen.append((position, sentence))
+            allowance -= cost
+        if not chosen:
+            continue
+
+        part = label + "\n" + " ".join(s for _, s in sorted(chosen))
+        parts.append(part)
+        used += estimate_tokens(part)
+    return "\n\n".join(parts)
@@ -0,0 +1,597 @@
+# agents/services/kb.py
+import hashlib
+import json
+import mmap
+import os
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from agents.models import Agent, AgentSourceLink
+from sources.models import DataSource, DocumentChunk
+from sources.services.search import K1, B, NAME_WEIGHT, TAG_WEIGHT, TEXT_WEIGHT, indexed_pages, indexed_sources, tokenize
+
+KB_MAGIC = b"MIRAKB2\n"
+SEGMENT_MAGIC = b"MIRASEG1\n"
+PURPOSES = [p for p, _ in AgentSourceLink.PURPOSE_CHOICES]
+PURPOSE_BITS = {p: 1 << i for i, p in enumerate(PURPOSES)}
+KINDS = {"source": 1, "page": 2, "chunk": 3}
+KIND_NAMES = {v: k for k, v in KINDS.items()}
+
+KB_CHECK_SECONDS = 2.0       # how often a chat worker looks for a newer snapshot
+KB_KEEP_VERSIONS = 3         # older snapshot/segment files are pruned after a build
+SECTION_ALIGN = 8
+
+
+# -----------------------------
+# File format: magic, header length, JSON header, 8-byte aligned sections
+# -----------------------------
+def _pack(magic: bytes, header: dict, sections: dict) -> tuple[str, bytes]:
+    """
+    Returns (sha256 of the content, bytes).
+    """
+    layout = {}
+    blobs = []
+    offset = 0
+    for name, value in sections.items():
+        data = value.tobytes() if isinstance(value, np.ndarray) else value
+        dtype = value.dtype.str if isinstance(value, np.ndarray) else "bytes"
+        layout[name] = [offset, len(data), dtype]
+        pad = -len(data) % SECTION_ALIGN
+        blobs.append(data + b"\0" * pad)
+        offset += len(data) + pad
+
+    head = json.dumps(dict(header, sections=layout), sort_keys=True).encode("utf-8")
+    head += b" " * (-(len(magic) + 8 + len(head)) % SECTION_ALIGN)
+    body = magic + len(head).to_bytes(8, "little") + head + b"".join(blobs)
+    return hashlib.sha256(body).hexdigest(), body
+
+
+class _Mapped:
+    """
+    Read-only mapping of a packed file. Array sections become zero-copy numpy views.
+    """
+    magic = b""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.version = os.path.basename(path).rsplit(".", 1)[0]
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:len(self.magic)] != self.magic:
+            raise ValueError(f"Unexpected file format: {path}")
+        start = len(self.magic) + 8
+        size = int.from_bytes(self._mm[len(self.magic):start], "little")
+        self.header = json.loads(self._mm[start:start + size])
+        base = start + size
+
+        self._bytes = {}
+        for name, (offset, length, dtype) in self.header["sections"].items():
+            if dtype == "bytes":
+                self._bytes[name] = (base + offset, length)
+            else:
+                dt = np.dtype(dtype)
+                setattr(self, name, np.frombuffer(self._mm, dtype=dt, count=length // dt.itemsize, offset=base + offset))
+
+    def _section(self, name: str, start: int = 0, end: int = None) -> bytes:
+        offset, length = self._bytes[name]
+        return self._mm[offset + start:offset + (length if end is None else end)]
+
+
+def _write_atomic(path: str, data: bytes):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _prune(directory: str, suffix: str, keep: set):
+    """
+    Drop all but the newest KB_KEEP_VERSIONS files, never those in `keep`.
+    Processes that still map a removed file keep reading it after the unlink.
+    """
+    old = sorted(
+        (e for e in os.scandir(directory) if e.name.endswith(suffix)),
+        key=lambda e: e.stat().st_mtime,
+        reverse=True,
+    )
+    for e in old[KB_KEEP_VERSIONS:]:
+        if e.name[:-len(suffix)] in keep:
+            continue
+        try:
+            os.remove(e.path)
+        except FileNotFoundError:
+            pass
+
+
+# -----------------------------
+# Per-source segments (shared by every agent linked to the source)
+# -----------------------------
+def _segment_dir(source_id) -> str:
+    return os.path.join(settings.AGENT_KB_DIR, "segments", str(source_id))
+
+
+def _tag_names(obj) -> list[str]:
+    return sorted(t.name for t in obj.tags.all())
+
+
+def _rows_stamp(src: DataSource) -> list:
+    """
+    [[tab page id, row generation]] of a sheet. Rows are looked up live (rowstore.lookup_rows),
+    not compiled, so this is what makes a re-upload with new contact data change the KB version;
+    sync_sheet_rows bumps the generation, so no row is read here.
+    """
+    return [list(p) for p in src.pages.order_by("id").values_list("id", "row_generation")]
+
+
+def _source_docs(src: DataSource) -> list[tuple]:
+    """
+    [(kind, id, record, fields)] for one source: itself, its pages and its chunks.
+    """
+    docs = []
+    s = indexed_sources(src.user_id).filter(pk=src.pk).first()
+    if s is not None:
+        tags = _tag_names(s)
+        record = {"name": s.name, "type": s.source_type, "summary": s.summary, "text": s.custom_text, "tags": tags}
+        fields = [(s.name, NAME_WEIGHT), (" ".join(tags), TAG_WEIGHT), (s.summary, TEXT_WEIGHT), (s.custom_text, TEXT_WEIGHT)]
+        docs.append(("source", s.id, record, fields))
+
+    for p in indexed_pages(src.user_id).filter(source_id=src.pk).order_by("id"):
+        preview = p.preview or {}
+        tags = _tag_names(p)
+        record = {
+            "url": p.url,
+            "title": preview.get("title") or "",
+            "description": preview.get("description") or "",
+            "image": preview.get("image") or "",
+            "category": p.category,
+            "summary": p.summary,
+            "tags": tags,
+        }
+        fields = [(record["title"], NAME_WEIGHT), (" ".join(tags), TAG_WEIGHT), (p.summary, TEXT_WEIGHT), (p.url, TEXT_WEIGHT)]
+        docs.append(("page", p.id, record, fields))
+
+    chunks = DocumentChunk.objects.filter(source_id=src.pk).order_by("ordinal")
+    for c in chunks.only("id", "ordinal", "page_start", "page_end", "summary", "keywords", "text"):
+        record = {
+            "ordinal": c.ordinal,
+            "page_start": c.page_start,
+            "page_end": c.page_end,
+            "summary": c.summary,
+            "text": c.text,
+        }
+        fields = [(" ".join(c.keywords or []), TAG_WEIGHT), (c.summary, TEXT_WEIGHT), (c.text, TEXT_WEIGHT)]
+        docs.append(("chunk", c.id, record, fields))
+    return docs
+
+
+def compile_segment(src: DataSource) -> tuple[str, bytes]:
+    """
+    BM25 postings of one source in CSR form (term -> doc numbers/frequencies) with raw
+    doc lengths, plus each doc's card payload as JSON. Collection statistics (idf, average
+    length) are left to query time, since they depend on which segments an agent combines.
+    """
+    docs = _source_docs(src)
+    term_ids = {}
+    postings = []
+    doc_len = np.zeros(len(docs), dtype=np.float32)
+    for d, (_, _, _, fields) in enumerate(docs):
+        counts = {}
+        for text, weight in fields:
+            for term in tokenize(text):
+                counts[term] = counts.get(term, 0) + weight
+                doc_len[d] += weight
+        for term, tf in counts.items():
+            tid = term_ids.setdefault(term, len(term_ids))
+            if tid == len(postings):
+                postings.append([])
+            postings[tid].append((d, min(tf, 0xFFFF)))
+
+    terms = sorted(term_ids)
+    term_offsets = np.zeros(len(terms) + 1, dtype=np.uint32)
+    post_docs, post_tfs = [], []
+    for i, term in enumerate(terms):
+        plist = postings[term_ids[term]]
+        term_offsets[i + 1] = term_offsets[i] + len(plist)
+        post_docs.extend(d for d, _ in plist)
+        post_tfs.extend(tf for _, tf in plist)
+
+    records = [json.dumps(r, ensure_ascii=False, sort_keys=True).encode("utf-8") for _, _, r, _ in docs]
+    rec_offsets = np.zeros(len(docs) + 1, dtype=np.uint64)
+    if docs:
+        rec_offsets[1:] = np.cumsum([len(r) for r in records])
+
+    header = {"format": 1, "source_id": src.id, "docs": len(docs), "total_len": float(doc_len.sum())}
+    return _pack(SEGMENT_MAGIC, header, {
+        "terms": "\n".join(terms).encode("utf-8"),
+        "term_offsets": term_offsets,
+        "post_docs": np.array(post_docs, dtype=np.uint32),
+        "post_tfs": np.array(post_tfs, dtype=np.uint16),
+        "doc_len": doc_len,
+        "doc_kind": np.array([KINDS[k] for k, *_ in docs], dtype=np.uint8),
+        "doc_id": np.array([i for _, i, *_ in docs], dtype=np.int64),
+        "rec_offsets": rec_offsets,
+        "records": b"".join(records),
+    })
+
+
+def build_segment(src: DataSource) -> str:
+    """
+    The source's current segment version, compiled only if the source changed since
+    the last build (mark_stale_for_source drops the pointer).
+    """
+    seg_dir = _segment_dir(src.id)
+    pointer = os.path.join(seg_dir, "CURRENT")
+    try:
+        with open(pointer) as f:
+            version = f.read().strip()
+        if os.path.exists(os.path.join(seg_dir, f"{version}.seg")):
+            return version
+    except FileNotFoundError:
+        pass
+
+    version, body = compile_segment(src)
+    os.makedirs(seg_dir, exist_ok=True)
+    path = os.path.join(seg_dir, f"{version}.seg")
+    if not os.path.exists(path):
+        _write_atomic(path, body)
+    _write_atomic(pointer, version.encode("ascii"))
+    _prune(seg_dir, ".seg", keep=_referenced_segments(src.id) | {version})
+    return version
+
+
+def _read_snapshot_header(agent_id) -> dict:
+    kb_dir = _kb_dir(agent_id)
+    try:
+        with open(os.path.join(kb_dir, "CURRENT")) as f:
+            version = f.read().strip()
+        with open(os.path.join(kb_dir, f"{version}.kb"), "rb") as f:
+            head = f.read(len(KB_MAGIC) + 8)
+            return json.loads(f.read(int.from_bytes(head[len(KB_MAGIC):], "little")))
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _referenced_segments(source_id) -> set:
+    """
+    Segment versions of this source that some agent's live snapshot still points at.
+    """
+    agent_ids = AgentSourceLink.objects.filter(source_id=source_id).values_list("agent_id", flat=True).distinct()
+    versions = set()
+    for agent_id in agent_ids:
+        for seg in _read_snapshot_header(agent_id).get("segments", []):
+            if seg["source_id"] == source_id:
+                versions.add(seg["version"])
+    return versions
+
+
+# -----------------------------
+# Agent snapshots: manifest + pinned segment versions
+# -----------------------------
+def _kb_dir(agent_id) -> str:
+    return os.path.join(settings.AGENT_KB_DIR, str(agent_id))
+
+
+def compile_kb(agent: Agent) -> tuple[str, bytes]:
+    """
+    Serialize the agent's knowledge base into one immutable artifact: the source
+    manifest plus the exact segment version of every linked source. Returns
+    (version, bytes); an unchanged knowledge base compiles to the same version.
+    """
+    masks = {}
+    for source_id, purpose in AgentSourceLink.objects.filter(agent=agent).values_list("source_id", "purpose"):
+        masks[source_id] = masks.get(source_id, 0) | PURPOSE_BITS[purpose]
+
+    manifest = []
+    segments = []
+    linked = DataSource.objects.filter(pk__in=masks, user_id=agent.user_id).prefetch_related("tags").order_by("id")
+    for src in linked:
+        first = src.pages.first() if src.source_type == "sheet" else None   # sheets keep their headers here
+        manifest.append({
+            "id": src.id,
+            "name": src.name,
+            "type": src.source_type,
+            "status": src.status,
+            "purposes": [p for p in PURPOSES if masks[src.id] & PURPOSE_BITS[p]],
+            "summary": src.summary,
+            "tags": _tag_names(src),
+            "filename": src.original_filename,
+            "headers": ((first.preview or {}) if first else {}).get("headers", []),
+            "rows": _rows_stamp(src) if src.source_type == "sheet" else [],
+        })
+        segments.append({"source_id": src.id, "version": build_segment(src), "mask": masks[src.id]})
+
+    tags = sorted(agent.tags.values_list("slug", flat=True))
+    header = {"format": 2, "agent_id": agent.id, "segments": segments, "tags": tags}
+    return _pack(KB_MAGIC, header, {"manifest": json.dumps(manifest, ensure_ascii=False, sort_keys=True).encode("utf-8")})
+
+
+def build_kb(agent: Agent) -> str:
+    """
+    Compile and publish a new snapshot; chat workers pick it up within KB_CHECK_SECONDS.
+    """
+    # clear the flag first: a source that changes mid-build sets it again
+    Agent.objects.filter(pk=agent.pk).update(kb_stale=False)
+    try:
+        version, body = compile_kb(agent)
+
+        kb_dir = _kb_dir(agent.id)
+        os.makedirs(kb_dir, exist_ok=True)
+        path = os.path.join(kb_dir, f"{version}.kb")
+        if not os.path.exists(path):
+            _write_atomic(path, body)
+        _write_atomic(os.path.join(kb_dir, "CURRENT"), version.encode("ascii"))
+    except Exception:
+        # not published: keep the agent queued for build_stale_kbs
+        Agent.objects.filter(pk=agent.pk).update(kb_stale=True)
+        raise
+
+    now = timezone.now()
+    Agent.objects.filter(pk=agent.pk).update(kb_version=version, kb_built_at=now)
+    agent.kb_version, agent.kb_built_at = version, now
+    _prune(kb_dir, ".kb", keep={version})
+    return version
+
+
+def mark_stale_for_source(src: DataSource):
+    try:
+        os.remove(os.path.join(_segment_dir(src.pk), "CURRENT"))
+    except FileNotFoundError:
+        pass
+    Agent.objects.filter(source_links__source_id=src.pk, kb_stale=False).update(kb_stale=True)
+
+
+def build_stale_kbs(limit: int = 5) -> int:
+    """
+    Rebuild agents whose sources changed (run from the source worker when idle).
+    A source shared by several agents is compiled once; the others reuse its segment.
+    """
+    built = 0
+    for agent in Agent.objects.filter(kb_stale=True).order_by("kb_built_at")[:limit]:
+        try:
+            build_kb(agent)
+        except Exception:
+            continue  # keep serving the previous snapshot; the next source change retries
+        built += 1
+    return built
+
+
+# -----------------------------
+# Load (chat workers)
+# -----------------------------
+class Segment(_Mapped):
+    magic = SEGMENT_MAGIC
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self.source_id = self.header["source_id"]
+        self.total_len = self.header["total_len"]
+        self.refs = 0
+        self._doc_numbers = None
+        terms = self._section("terms").decode("utf-8")
+        self.term_ids = {t: i for i, t in enumerate(terms.split("\n"))} if terms else {}
+
+    def __len__(self):
+        return len(self.doc_id)
+
+    def df(self, term: str) -> int:
+        tid = self.term_ids.get(term)
+        return 0 if tid is None else int(self.term_offsets[tid + 1] - self.term_offsets[tid])
+
+    def record(self, doc: int) -> dict:
+        return json.loads(self._section("records", int(self.rec_offsets[doc]), int(self.rec_offsets[doc + 1])))
+
+    def find(self, kind: str, object_id: int):
+        """
+        Doc number of (kind, object id), or None; the map is built on first use.
+        """
+        if self._doc_numbers is None:
+            self._doc_numbers = {(int(k), int(i)): d for d, (k, i) in enumerate(zip(self.doc_kind, self.doc_id))}
+        return self._doc_numbers.get((KINDS[kind], object_id))
+
+
+_segments_lock = threading.Lock()
+_segments = {}    # path -> Segment, shared by every loaded snapshot that references it
+
+
+def _acquire_segment(source_id, version) -> Segment:
+    path = os.path.join(_segment_dir(source_id), f"{version}.seg")
+    with _segments_lock:
+        seg = _segments.get(path)
+        if seg is None:
+            seg = _segments[path] = Segment(path)
+        seg.refs += 1
+        return seg
+
+
+def _release_segment(seg: Segment):
+    with _segments_lock:
+        seg.refs -= 1
+        if seg.refs <= 0:
+            _segments.pop(seg.path, None)  # unmapped once in-flight searches drop it
+
+
+def loaded_segments() -> dict:
+    with _segments_lock:
+        return {
+            "segments": len(_segments),
+            "docs": sum(len(s) for s in _segments.values()),
+            "bytes": sum(len(s._mm) for s in _segments.values()),
+            "refs": sum(s.refs for s in _segments.values()),
+        }
+
+
+class KBSnapshot(_Mapped):
+    """
+    An agent's view over shared per-source segments. Scores use collection statistics
+    over all of the agent's segments, so results don't depend on which sources
+    happen to be shared with other agents.
+    """
+    magic = KB_MAGIC
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self.sources = {s["id"]: s for s in json.loads(self._section("manifest") or b"[]")}
+        self.tags = self.header.get("tags", [])   # agent's tag scope (slugs), applied by chat.retrieve
+        self.segments = []
+        try:
+            for ref in self.header["segments"]:
+                self.segments.append((_acquire_segment(ref["source_id"], ref["version"]), ref["mask"]))
+        except Exception:
+            self.release()
+            raise
+        self.docs = sum(len(seg) for seg, _ in self.segments)
+        self.total_len = sum(seg.total_len for seg, _ in self.segments)
+
+    def release(self):
+        for seg, _ in self.segments:
+            _release_segment(seg)
+        self.segments = []
+
+    def __len__(self):
+        return self.docs
+
+    def source_ids(self, purpose: str = None) -> list[int]:
+        return [s["id"] for s in self.sources.values() if purpose is None or purpose in s["purposes"]]
+
+    def search(self, query: str, k: int = 5, purposes=None, kinds=None, source_ids=None, keys=None) -> list[dict]:
+        """
+        BM25 top-k over the agent's segments, optionally limited to purposes / kinds / sources,
+        and to `keys` ({("page"|"source", id)}, e.g. tagindex.filter_keys; a chunk counts
+        as its source). Returns [{"kind", "id", "source_id", "score", **card payload}], best first.
+        """
+        if not self.docs or k <= 0:
+            return []
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        n = self.docs
+        avg = (self.total_len / n) or 1.0
+        idf = {}
+        for term in terms:
+            df = sum(seg.df(term) for seg, _ in self.segments)
+            if df:
+                idf[term] = np.float32(np.log(1 + (n - df + 0.5) / (df + 0.5)) * (K1 + 1))
+
+        mask = 0
+        for p in purposes or ():
+            mask |= PURPOSE_BITS[p]
+        kind_codes = [KINDS[kd] for kd in kinds] if kinds else None
+        source_ids = set(source_ids) if source_ids is not None else None
+        if keys is not None:
+            page_ids = np.array([i for kd, i in keys if kd == "page"], dtype=np.int64)
+            kept_sources = {i for kd, i in keys if kd == "source"}
+
+        found = []
+        for seg, seg_mask in self.segments:
+            if (mask and not seg_mask & mask) or (source_ids is not None and seg.source_id not in source_ids):
+                continue
+            scores = None
+            for term, w in idf.items():
+                tid = seg.term_ids.get(term)
+                if tid is None:
+                    continue
+                if scores is None:
+                    scores = np.zeros(len(seg), dtype=np.float32)
+                a, b = seg.term_offsets[tid], seg.term_offsets[tid + 1]
+                docs = seg.post_docs[a:b]
+                tfs = seg.post_tfs[a:b].astype(np.float32)
+                norm = K1 * (1 - B + B * seg.doc_len[docs] / avg)
+                scores[docs] += w * tfs / (tfs + norm)
+            if scores is None:
+                continue
+            ok = scores > 0
+            if kind_codes:
+                ok &= np.isin(seg.doc_kind, kind_codes)
+            if keys is not None:
+                pages = seg.doc_kind == KINDS["page"]
+                allowed = pages & np.isin(seg.doc_id, page_ids)
+                if seg.source_id in kept_sources:
+                    allowed |= ~pages
+                ok &= allowed
+            hits = np.flatnonzero(ok)
+            if len(hits) > k:
+                hits = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+            found.extend((float(scores[d]), seg, int(d)) for d in hits)
+
+        found.sort(key=lambda t: -t[0])
+        return [
+            {
+                "kind": KIND_NAMES[int(seg.doc_kind[d])],
+                "id": int(seg.doc_id[d]),
+                "source_id": seg.source_id,
+                "score": round(score, 4),
+                **seg.record(d),
+            }
+            for score, seg, d in found[:k]
+        ]
+
+
+    def records(self, refs: list[dict]) -> list[dict]:
+        """
+        Card payloads for external hits ({"kind", "id", "source_id", ...}, e.g. from the
+        vector index), in order; hits this snapshot doesn't contain are dropped.
+        """
+        by_source = {seg.source_id: seg for seg, _ in self.segments}
+        out = []
+        for ref in refs:
+            seg = by_source.get(ref["source_id"])
+            d = seg.find(ref["kind"], ref["id"]) if seg is not None else None
+            if d is not None:
+                out.append({**ref, **seg.record(d)})
+        return out
+
+
+class _Loaded:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.snapshot = None
+        self.stamp = None
+        self.checked_at = 0.0
+
+
+_loaded_lock = threading.Lock()
+_loaded = {}
+
+
+def get_kb(agent_id) -> KBSnapshot | None:
+    """
+    The agent's current snapshot for this process. Checks the CURRENT pointer at most
+    every KB_CHECK_SECONDS and swaps to a new version atomically; requests already
+    holding the old snapshot finish on it.
+    """
+    with _loaded_lock:
+        entry = _loaded.get(agent_id)
+        if entry is None:
+            entry = _loaded[agent_id] = _Loaded()
+
+    now = time.monotonic()
+    if entry.snapshot is not None and now - entry.checked_at < KB_CHECK_SECONDS:
+        return entry.snapshot
+
+    with entry.lock:
+        if entry.snapshot is not None and now - entry.checked_at < KB_CHECK_SECONDS:
+            return entry.snapshot
+        entry.checked_at = now
+        pointer = os.path.join(_kb_dir(agent_id), "CURRENT")
+        try:
+            st = os.stat(pointer)
+        except FileNotFoundError:
+            if entry.snapshot is not None:
+                entry.snapshot.release()
+            entry.snapshot = entry.stamp = None
+            return None
+        stamp = (st.st_mtime_ns, st.st_ino)
+        if stamp != entry.stamp:
+            with open(pointer) as f:
+                version = f.read().strip()
+            if entry.snapshot is None or entry.snapshot.version != version:
+                old = entry.snapshot
+                entry.snapshot = KBSnapshot(os.path.join(_kb_dir(agent_id), f"{version}.kb"))
+                if old is not None:
+                    old.release()  # segments only this version used drop out of the registry
+            entry.stamp = stamp
+        return entry.snapshot
@@ -0,0 +1,114 @@
+# agents/services/sessions.py
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+
+from agents.models import ChatSession
+from agents.services.context import SENTENCE_RE, estimate_tokens
+
+KEEP_TURNS = 4               # messages always sent verbatim (the last two exchanges)
+MAX_TURN_CHARS = 1500        # longer messages are stored cut
+SUMMARY_MAX_TOKENS = 250
+RECORD_ATTEMPTS = 5          # compare-and-swap retries when messages of one session overlap
+ROLE_LABELS = {"user": "Visitor", "assistant": "Assistant"}
+
+
+async def get_session(agent, public_id=None) -> ChatSession:
+    """
+    The agent's session with this public id, or a new one (unknown, foreign or
+    malformed ids start over instead of failing the message).
+    """
+    if public_id:
+        try:
+            session = await ChatSession.objects.filter(agent=agent, public_id=public_id).afirst()
+        except ValidationError:
+            session = None
+        if session is not None:
+            return session
+    return await ChatSession.objects.acreate(agent=agent)
+
+
+def history_text(session: ChatSession) -> str:
+    """
+    What the model sees of the conversation: the running summary, then recent turns.
+    """
+    parts = [f"(Earlier: {session.summary})"] if session.summary else []
+    parts += [f"{ROLE_LABELS[t['role']]}: {t['text']}" for t in session.turns]
+    return "\n".join(parts)
+
+
+def _cap(text: str, tokens: int) -> str:
+    limit = tokens * 4
+    return text if len(text) <= limit else text[:limit].rsplit(" ", 1)[0] + " …"
+
+
+def _extractive_summary(summary: str, turns: list[dict]) -> str:
+    """
+    Fallback when the LLM is unavailable: first sentence of each compacted turn,
+    newest kept when over budget.
+    """
+    lines = [summary] if summary else []
+    for t in turns:
+        first = SENTENCE_RE.split(t["text"].strip(), maxsplit=1)[0]
+        lines.append(f"{ROLE_LABELS[t['role']]}: {first}")
+    text = " ".join(lines)
+    limit = SUMMARY_MAX_TOKENS * 4
+    return text if len(text) <= limit else "… " + text[-limit:].split(" ", 1)[-1]
+
+
+async def _summarize(summary: str, turns: list[dict]) -> str:
+    from agents.services.chat import get_async_openai_client
+
+    transcript = "\n".join(f"{ROLE_LABELS[t['role']]}: {t['text']}" for t in turns)
+    try:
+        response = await get_async_openai_client().responses.create(
+            model=os.getenv("OPENAI_SUMMARY_MODEL", "gpt-5-nano"),
+            instructions=(
+                "Update the running summary of a website chat with the new turns. Keep what the visitor "
+                "wants, facts they gave (name, company, needs) and what was already answered or promised. "
+                f"Plain text, at most {SUMMARY_MAX_TOKENS // 2} words."
+            ),
+            input=f"SUMMARY SO FAR:\n{summary or '(none)'}\n\nNEW TURNS:\n{transcript}",
+        )
+        text = (getattr(response, "output_text", "") or "").strip()
+    except Exception:
+        text = ""
+    return _cap(text, SUMMARY_MAX_TOKENS) if text else _extractive_summary(summary, turns)
+
+
+async def record_turn(session: ChatSession, message: str, answer: str):
+    """
+    Appends the exchange; once the verbatim turns pass settings.CHAT_HISTORY_TOKENS,
+    all but the last KEEP_TURNS are folded into the summary.
+
+    Overlapping messages of one session (a double send) each start from the stored row
+    and write only if turn_count hasn't moved since (compare-and-swap, no lock held over
+    the summarization call); the loser re-reads and tries again.
+    """
+    exchange = [
+        {"role": "user", "text": _cap(message, MAX_TURN_CHARS // 4)},
+        {"role": "assistant", "text": _cap(answer, MAX_TURN_CHARS // 4)},
+    ]
+    for _ in range(RECORD_ATTEMPTS):
+        row = await ChatSession.objects.filter(pk=session.pk).values("summary", "turns", "turn_count").afirst()
+        if row is None:
+            return  # pruned meanwhile
+        summary, turns = row["summary"], row["turns"] + exchange
+        if len(turns) > KEEP_TURNS and sum(estimate_tokens(t["text"]) for t in turns) > settings.CHAT_HISTORY_TOKENS:
+            summary = await _summarize(summary, turns[:-KEEP_TURNS])
+            turns = turns[-KEEP_TURNS:]
+        updated = await ChatSession.objects.filter(pk=session.pk, turn_count=row["turn_count"]).aupdate(
+            summary=summary, turns=turns, turn_count=row["turn_count"] + 2, updated_at=timezone.now()
+        )
+        if updated:
+            session.summary, session.turns, session.turn_count = summary, turns, row["turn_count"] + 2
+            return
+
+
+def prune_sessions(days: int | None = None) -> int:
+    days = settings.CHAT_SESSION_TTL_DAYS if days is None else days
+    deleted, _ = ChatSession.objects.filter(updated_at__lt=timezone.now() - timedelta(days=days)).delete()
+    return deleted
@@ -1,3 +1,274 @@
-from django.test import TestCase
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from agents.models import Agent, AgentSourceLink, ChatSession
+from agents.services import answers, context, kb, sessions
+from sources.models import DataSource, DataSourcePage
+from sources.services.rowstore import sync_sheet_rows
+
+
+class KnowledgeBaseSearchTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        settings_override = override_settings(AGENT_KB_DIR=tmp.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(self._unload)
+        check = mock.patch.object(kb, "KB_CHECK_SECONDS", 0)  # see every rebuild immediately
+        check.start()
+        self.addCleanup(check.stop)
+
+        self.user = get_user_model().objects.create_user(username="owner", password="pw")
+        self.site = DataSource.objects.create(
+            user=self.user, name="Acme site", source_type="website", status="done", summary="Acme makes widgets.",
+        )
+        self.faq = DataSource.objects.create(
+            user=self.user, name="Refund FAQ", source_type="custom", status="done",
+            custom_text="Refunds are issued within 14 days of purchase.",
+        )
+        self.pricing = self._page("pricing", "Pricing", "Plans start at 10 dollars per month.")
+        self._page("about", "About us", "Founded in 2010. See our pricing page for plans.")
+
+        self.agent = Agent.objects.create(user=self.user, name="Helper")
+        AgentSourceLink.objects.create(agent=self.agent, source=self.site, purpose="guidance")
+        AgentSourceLink.objects.create(agent=self.agent, source=self.faq, purpose="support")
+
+    def _unload(self):
+        for entry in kb._loaded.values():
+            if entry.snapshot is not None:
+                entry.snapshot.release()
+        kb._loaded.clear()
+
+    def _page(self, slug, title, summary):
+        return DataSourcePage.objects.create(
+            source=self.site, url=f"https://acme.test/{slug}", selected=True, status="done",
+            summary=summary, preview={"title": title},
+        )
+
+    def _search(self, query, **kwargs):
+        kb.build_kb(self.agent)
+        return kb.get_kb(self.agent.pk).search(query, **kwargs)
+
+    def test_title_match_outranks_body_mention(self):
+        hits = self._search("pricing plans")
+        self.assertEqual((hits[0]["kind"], hits[0]["id"]), ("page", self.pricing.pk))
+        self.assertEqual(hits[0]["title"], "Pricing")
+        self.assertGreater(hits[0]["score"], hits[1]["score"])
+
+    def test_purpose_kind_and_key_filters(self):
+        self.assertEqual([h["source_id"] for h in self._search("refunds", purposes=["support"])], [self.faq.pk])
+        self.assertEqual(self._search("refunds", purposes=["guidance"]), [])
+        self.assertTrue(all(h["kind"] == "page" for h in self._search("pricing", kinds=["page"])))
+
+        hits = self._search("pricing plans", keys={("page", self.pricing.pk)})
+        self.assertEqual([h["id"] for h in hits], [self.pricing.pk])
+
+    def test_added_and_removed_pages_show_up_after_a_rebuild(self):
+        self._search("pricing")
+        before = self.agent.kb_version
+        careers = self._page("careers", "Careers", "We are hiring engineers.")
+        kb.mark_stale_for_source(self.site)
+        self.assertEqual([h["id"] for h in self._search("hiring engineers")], [careers.pk])
+        self.assertNotEqual(self.agent.kb_version, before)
+
+        careers.delete()
+        kb.mark_stale_for_source(self.site)
+        self.assertEqual(self._search("hiring engineers"), [])
+
+    def test_unchanged_sources_keep_the_version_and_share_segments(self):
+        kb.build_kb(self.agent)
+        version = self.agent.kb_version
+        self.assertEqual(kb.build_kb(self.agent), version)
+
+        other = Agent.objects.create(user=self.user, name="Other")
+        AgentSourceLink.objects.create(agent=other, source=self.site, purpose="contact")
+        kb.build_kb(other)
+        ours = {s["source_id"]: s["version"] for s in kb._read_snapshot_header(self.agent.pk)["segments"]}
+        theirs = {s["source_id"]: s["version"] for s in kb._read_snapshot_header(other.pk)["segments"]}
+        self.assertEqual(theirs[self.site.pk], ours[self.site.pk])
+
+
+class AnswerCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.cache = answers.AnswerCache(max_entries=3, ttl_seconds=60)
+
+    def test_normalized_questions_share_an_entry(self):
+        self.cache.put(1, "v1", "What is the pricing?", {"answer": "10/month"})
+        self.assertEqual(self.cache.get(1, "v1", "pricing"), {"answer": "10/month"})
+        self.assertIsNone(self.cache.get(1, "v1", "refunds?"))
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_versions_and_agents_are_isolated(self):
+        self.cache.put(1, "v1", "pricing", {"answer": "old"})
+        self.cache.put(2, "v1", "pricing", {"answer": "other agent"})
+        self.assertIsNone(self.cache.get(1, "v2", "pricing"))
+
+        # a newer version's answer drops every answer of the agent's older versions
+        self.cache.put(1, "v2", "pricing", {"answer": "new"})
+        self.assertIsNone(self.cache.get(1, "v1", "pricing"))
+        self.assertEqual(self.cache.get(1, "v2", "pricing"), {"answer": "new"})
+        self.assertEqual(self.cache.get(2, "v1", "pricing"), {"answer": "other agent"})
+
+    def test_lru_eviction_and_ttl(self):
+        for q in ("pricing", "refunds", "hours"):
+            self.cache.put(1, "v1", q, {"answer": q})
+        self.cache.get(1, "v1", "pricing")
+        self.cache.put(1, "v1", "location", {"answer": "location"})
+        self.assertIsNone(self.cache.get(1, "v1", "refunds"))
+        self.assertIsNotNone(self.cache.get(1, "v1", "pricing"))
+
+        with mock.patch.object(answers.time, "monotonic", return_value=answers.time.monotonic() + 61):
+            self.assertIsNone(self.cache.get(1, "v1", "pricing"))
+        self.assertNotIn((1, "v1", "pricing"), self.cache.entries)
+
+    def test_similar_question_fallback(self):
+        cache = answers.AnswerCache(max_entries=10, ttl_seconds=60, similarity=0.8)
+        cache.put(1, "v1", "monthly pricing plans", {"answer": "10/month"})
+
+        self.assertEqual(cache.get(1, "v1", "plans pricing monthly"), {"answer": "10/month"})
+        self.assertIsNone(cache.get(1, "v1", "refund policy"))
+        self.assertIsNone(cache.get(1, "v2", "monthly pricing plans"))
+        self.assertEqual(cache.similar_hits, 1)
+
+
+class SheetKBVersionTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        settings_override = override_settings(AGENT_KB_DIR=tmp.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        user = get_user_model().objects.create_user(username="owner", password="pw")
+        self.src = DataSource.objects.create(user=user, name="Contacts", source_type="sheet", status="done")
+        self.page = DataSourcePage.objects.create(source=self.src, url="Sheet1", category="sheet")
+        self.agent = Agent.objects.create(user=user, name="Helper")
+        AgentSourceLink.objects.create(agent=self.agent, source=self.src, purpose="contact")
+
+    def _version_after(self, rows):
+        sync_sheet_rows(self.src, self.page, ["Name", "Email"], rows)
+        return kb.compile_kb(self.agent)[0]
+
+    def test_row_changes_change_the_version(self):
+        first = self._version_after([["Ann", "ann@x.com"]])
+        self.assertEqual(self._version_after([["Ann", "ann@x.com"]]), first)
+        self.assertNotEqual(self._version_after([["Ann", "ann@y.com"]]), first)
+
+
+class PackContextTests(SimpleTestCase):
+    def _page(self, title, summary, url=None, description=""):
+        return {
+            "kind": "page", "title": title, "url": url or f"https://acme.test/{title.lower()}",
+            "description": description, "summary": summary,
+        }
+
+    def test_stays_within_budget(self):
+        def filler(h):
+            # distinct terms per sentence, so nothing is skipped as a restatement
+            return " ".join(f"Widgets w{h}x{i}a w{h}x{i}b w{h}x{i}c." for i in range(50))
+
+        hits = [self._page(f"Page{i}", filler(i)) for i in range(10)]
+        rows = [{"data": {"Name": f"Person {i}", "Email": f"p{i}@x.com"}} for i in range(100)]
+
+        for budget in (100, 300, 1000):
+            packed = context.pack_context("widgets", hits, rows=rows, budget=budget)
+            self.assertLessEqual(context.estimate_tokens(packed), budget)
+            self.assertGreater(context.estimate_tokens(packed), budget * 0.8)
+            self.assertIn("[contact] Name: Person 0", packed)
+            self.assertIn("[page] Page0", packed)
+
+    def test_relevant_sentences_first_and_in_reading_order(self):
+        hit = self._page("Pricing", "We were founded in 2010. Plans cost 10 dollars. Support is 24/7. Annual plans save 20 percent.")
+        packed = context.pack_context("plans cost", [hit], budget=55)
+
+        self.assertIn("Plans cost 10 dollars.", packed)
+        self.assertNotIn("founded", packed)
+        self.assertLess(packed.index("Plans cost"), packed.index("Annual plans"))
+
+    def test_restatements_are_dropped(self):
+        first = self._page("Pricing", "Plans start at 10 dollars per month for small teams.")
+        second = self._page("Plans", "Plans start at 10 dollars per month for small teams! Enterprise is custom.")
+        packed = context.pack_context("plans", [first, second], budget=500)
+
+        self.assertEqual(packed.count("10 dollars"), 1)
+        self.assertIn("Enterprise is custom.", packed)
+
+    def test_links_and_urls(self):
+        hit = self._page("Pricing", "Plans cost 10 dollars, see https://acme.test/pricing.\n\nImportant links:\n- https://acme.test/buy")
+        packed = context.pack_context("plans", [hit], links=["https://acme.test/pricing"], budget=200)
+
+        self.assertIn("[page] Pricing (shown as a link)", packed)
+        self.assertNotIn("https://", packed)
+
+    def test_overlong_best_sentence_is_cut_not_dropped(self):
+        hit = self._page("Specs", "Widgets " + "really " * 400 + "matter.")
+        packed = context.pack_context("widgets", [hit], budget=100)
+        self.assertTrue(packed.endswith("…"))
+        self.assertLessEqual(context.estimate_tokens(packed), 100)
+
+
+@override_settings(CHAT_HISTORY_TOKENS=30)
+class RecordTurnTests(TestCase):
+    def setUp(self):
+        user = get_user_model().objects.create_user(username="owner", password="pw")
+        self.agent = Agent.objects.create(user=user, name="Helper")
+        self.session = ChatSession.objects.create(agent=self.agent)
+        # no LLM in tests: summaries use the extractive fallback
+        client = mock.patch("agents.services.chat.get_async_openai_client", side_effect=RuntimeError("offline"))
+        client.start()
+        self.addCleanup(client.stop)
+
+    async def test_turns_are_appended(self):
+        await sessions.record_turn(self.session, "Hi there.", "Hello! How can I help?")
+
+        row = await ChatSession.objects.aget(pk=self.session.pk)
+        self.assertEqual(row.turn_count, 2)
+        self.assertEqual([t["role"] for t in row.turns], ["user", "assistant"])
+        self.assertEqual(sessions.history_text(row), "Visitor: Hi there.\nAssistant: Hello! How can I help?")
+
+    async def test_old_turns_are_folded_into_the_summary(self):
+        for i in range(4):
+            await sessions.record_turn(self.session, f"Question {i} about plans. More detail here.", f"Answer {i} here.")
+
+        row = await ChatSession.objects.aget(pk=self.session.pk)
+        self.assertEqual(row.turn_count, 8)
+        self.assertEqual(len(row.turns), sessions.KEEP_TURNS)
+        self.assertEqual(row.turns[-1]["text"], "Answer 3 here.")
+        self.assertIn("Visitor: Question 0 about plans.", row.summary)
+        self.assertNotIn("More detail", row.summary)
+        self.assertEqual((self.session.turn_count, self.session.turns), (row.turn_count, row.turns))
+
+    async def test_overlapping_messages_are_not_lost(self):
+        for i in range(2):
+            await sessions.record_turn(self.session, f"Question {i} about plans and pricing.", f"Answer {i}.")
+        summarize = sessions._summarize
+        raced = []
+
+        async def racing_summarize(summary, turns):
+            if not raced:
+                # another message of the session lands while this one is summarizing
+                raced.append(True)
+                row = await ChatSession.objects.aget(pk=self.session.pk)
+                await ChatSession.objects.filter(pk=row.pk).aupdate(
+                    turns=row.turns + [{"role": "user", "text": "Parallel."}, {"role": "assistant", "text": "Reply."}],
+                    turn_count=row.turn_count + 2,
+                )
+            return await summarize(summary, turns)
+
+        with mock.patch.object(sessions, "_summarize", racing_summarize):
+            await sessions.record_turn(self.session, "Question 2 about plans and pricing.", "Answer 2.")
+
+        self.assertTrue(raced)
+        row = await ChatSession.objects.aget(pk=self.session.pk)
+        self.assertEqual(row.turn_count, 8)
+        self.assertIn("Parallel.", sessions.history_text(row))
+        self.assertEqual(row.turns[-1]["text"], "Answer 2.")
+
+    async def test_pruned_session_is_ignored(self):
+        await ChatSession.objects.filter(pk=self.session.pk).adelete()
+        await sessions.record_turn(self.session, "Hi.", "Hello.")
+        self.assertFalse(await ChatSession.objects.filter(pk=self.session.pk).aexists())
@@ -7,4 +7,5 @@ urlpatterns = [
     path("<int:agent_id>/", views.agent_detail, name="agent_detail"),
     path("", views.agent_list, name="agent_list"),
     path("<int:agent_id>/edit/", views.agent_edit, name="agent_edit"),
+    path("chat/<uuid:public_id>/stream/", views.agent_chat_stream, name="agent_chat_stream"),
 ]
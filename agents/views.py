@@ -1,16 +1,53 @@
 # agents/views.py
+import json
+import time
+from urllib.parse import urlsplit
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
-from .forms import AgentCreateForm
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+from .forms import AgentCreateForm, AgentSourcesForm
 from .models import Agent
+from .services.chat import chat_events
+from .services.sessions import get_session
+from .services.kb import get_kb
+
+CHAT_MAX_CHARS = 2000
 
 
 @login_required
 def agent_detail(request, agent_id: int):
-    # placeholder for now (next steps: attach sources, preview chat, etc.)
-    from .models import Agent
-    agent = Agent.objects.get(pk=agent_id, user=request.user)
-    return render(request, "agents/agent_detail.html", {"agent": agent})
+    agent = get_object_or_404(Agent, pk=agent_id, user=request.user)
+
+    if request.method == "POST":
+        form = AgentSourcesForm(request.POST, agent=agent)
+        if form.is_valid():
+            changed = form.save()
+            if changed or not agent.kb_version or agent.kb_stale:
+                # compiled by the source worker (build_stale_kbs), not inside this request
+                Agent.objects.filter(pk=agent.pk).update(kb_stale=True)
+                messages.success(request, "Sources saved. The knowledge base is being rebuilt in the background.")
+            else:
+                messages.info(request, "No changes — knowledge base is up to date.")
+            return redirect("agent_detail", agent_id=agent.id)
+    else:
+        form = AgentSourcesForm(agent=agent)
+
+    kb = get_kb(agent.id) if agent.kb_version else None
+    intents = agent.chat_metrics.aggregate(
+        total=Count("id"),
+        local=Count("id", filter=Q(intent_source="local")),
+        cached=Count("id", filter=Q(cached=True)),
+    )
+    return render(request, "agents/agent_detail.html", {"agent": agent, "form": form, "kb": kb, "intents": intents})
 
 @login_required
 def agent_list(request):
@@ -45,3 +82,96 @@ def agent_edit(request, agent_id: int):
 
     return render(request, "agents/agent_edit.html", {"form": form, "agent": agent})
 
+
+
+async def _sse(events):
+    try:
+        async for event, data in events:
+            yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+    except Exception as e:
+        yield f"event: error\ndata: {json.dumps({'error': str(e)[:300]})}\n\n"
+
+
+def _cors_origin(request) -> str | None:
+    origin = request.headers.get("Origin")
+    if "*" in settings.CHAT_ALLOWED_ORIGINS:
+        return "*"
+    return origin if origin in settings.CHAT_ALLOWED_ORIGINS else None
+
+
+def _cross_site(request) -> bool:
+    origin = request.headers.get("Origin")
+    return bool(origin) and urlsplit(origin).netloc != request.get_host()
+
+
+async def _over_rate(scope: str, ident: str, per_minute: int) -> bool:
+    """
+    Fixed one-minute window counter in the Django cache (per process with the default
+    local-memory cache; shared once CACHES points at Redis/Memcached).
+    """
+    if per_minute <= 0 or not ident:
+        return False
+    key = f"chat-rate:{scope}:{ident}:{int(time.time() // 60)}"
+    await cache.aadd(key, 0, timeout=120)
+    try:
+        count = await cache.aincr(key)
+    except ValueError:  # evicted between add and incr
+        await cache.aset(key, 1, timeout=120)
+        count = 1
+    return count > per_minute
+
+
+def _too_many() -> JsonResponse:
+    response = JsonResponse({"ok": False, "error": "Too many messages. Please wait a moment."}, status=429)
+    response["Retry-After"] = str(60 - int(time.time()) % 60)
+    return response
+
+
+async def _chat_response(request, public_id):
+    agent = await Agent.objects.filter(public_id=public_id).afirst()
+    # the owner's preview is same-site only: a cross-site request never acts as the logged-in user
+    user = None if _cross_site(request) else await request.auser()
+    if agent is None or not (agent.is_active or (user is not None and agent.user_id == user.id)):
+        return JsonResponse({"ok": False, "error": "Agent not found"}, status=404)
+    if await _over_rate("ip", request.META.get("REMOTE_ADDR", ""), settings.CHAT_RATE_PER_MINUTE_IP):
+        return _too_many()
+
+    try:
+        payload = json.loads(request.body.decode("utf-8") or "{}")
+    except json.JSONDecodeError:
+        return JsonResponse({"ok": False, "error": "Invalid JSON"}, status=400)
+    message = (payload.get("message") or "").strip()[:CHAT_MAX_CHARS]
+    if not message:
+        return JsonResponse({"ok": False, "error": "Empty message"}, status=400)
+    if await _over_rate("session", str(payload.get("session") or "")[:64], settings.CHAT_RATE_PER_MINUTE_SESSION):
+        return _too_many()
+
+    kb = await sync_to_async(get_kb)(agent.id)
+    if kb is None:
+        return JsonResponse({"ok": False, "error": "Knowledge base not built yet"}, status=409)
+
+    session = await get_session(agent, payload.get("session"))
+    response = StreamingHttpResponse(_sse(chat_events(agent, kb, session, message)), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # nginx: flush each event
+    return response
+
+
+@csrf_exempt  # called cross-site by the embedded widget: no cookies are honoured then (see _cross_site)
+@require_http_methods(["POST", "OPTIONS"])
+async def agent_chat_stream(request, public_id):
+    """
+    Server-Sent Events for one chat message. Accepts JSON: { "message": "...", "session": "<id from meta>" }
+    Inactive agents only answer their owner (builder preview). CORS for settings.CHAT_ALLOWED_ORIGINS
+    (OPTIONS is the browser's preflight for the JSON POST); rate limited per client IP and per session.
+    """
+    response = HttpResponse(status=204) if request.method == "OPTIONS" else await _chat_response(request, public_id)
+    origin = _cors_origin(request)
+    if origin:
+        response["Access-Control-Allow-Origin"] = origin
+        response["Access-Control-Allow-Methods"] = "POST, OPTIONS"
+        response["Access-Control-Allow-Headers"] = "Content-Type"
+        response["Access-Control-Max-Age"] = "86400"
+        if origin != "*":
+            patch_vary_headers(response, ["Origin"])
+    return response
@@ -5,6 +5,10 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
+
+Serve chat through this entry point (uvicorn mira.asgi:application, or gunicorn
+with -k uvicorn.workers.UvicornWorker): the SSE chat stream is an async view, so
+an open stream doesn't hold a worker thread.
 """
 
 import os
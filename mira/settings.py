@@ -132,5 +132,62 @@ LOGOUT_REDIRECT_URL = "/"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
-DATA_UPLOAD_MAX_MEMORY_SIZE = 50 * 1024 * 1024
-FILE_UPLOAD_MAX_MEMORY_SIZE = 50 * 1024 * 1024
+# Documents/sheets arrive through the chunked upload API (sources/services/uploads.py),
+# so request bodies stay small and plain multipart uploads spill to disk early.
+DATA_UPLOAD_MAX_MEMORY_SIZE = 5 * 1024 * 1024
+FILE_UPLOAD_MAX_MEMORY_SIZE = int(os.getenv("FILE_UPLOAD_MAX_MEMORY_SIZE", str(2 * 1024 * 1024)))
+UPLOAD_TEMP_DIR = os.getenv("UPLOAD_TEMP_DIR", str(BASE_DIR / "tmp" / "uploads"))
+
+# Uploaded source files go through the storage API (sources/services/storage.py), so ingestion
+# workers can run on other nodes. SOURCES_STORAGE_BACKEND=sources.services.storage.DirectoryRemoteStorage
+# with a shared SOURCES_STORAGE_LOCATION stands in for a remote object store.
+SOURCES_STORAGE_OPTIONS = {}
+if os.getenv("SOURCES_STORAGE_LOCATION"):
+    SOURCES_STORAGE_OPTIONS["location"] = os.getenv("SOURCES_STORAGE_LOCATION")
+
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+    "sources": {
+        "BACKEND": os.getenv("SOURCES_STORAGE_BACKEND", "django.core.files.storage.FileSystemStorage"),
+        "OPTIONS": SOURCES_STORAGE_OPTIONS,
+    },
+}
+
+# Worker-side cache of files pulled from a remote sources storage
+STORAGE_CACHE_DIR = os.getenv("STORAGE_CACHE_DIR", str(BASE_DIR / "tmp" / "storage-cache"))
+STORAGE_CACHE_MAX_MB = int(os.getenv("STORAGE_CACHE_MAX_MB", "2048"))
+
+# Adaptive re-crawl (python manage.py recrawl_sources): max pages re-checked per tenant per 24h
+RECRAWL_DAILY_PAGES_PER_USER = int(os.getenv("RECRAWL_DAILY_PAGES_PER_USER", "200"))
+
+# Per-host crawl politeness, shared by all workers (sources/services/politeness.py)
+CRAWL_MAX_CONCURRENT_PER_HOST = int(os.getenv("CRAWL_MAX_CONCURRENT_PER_HOST", "2"))
+CRAWL_MIN_DELAY_SECONDS = float(os.getenv("CRAWL_MIN_DELAY_SECONDS", "0.5"))
+
+# Semantic retrieval (sources/services/vectors.py): "hashing" works offline, "openai" uses embeddings API
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "hashing")
+VECTOR_INDEX_DIR = os.getenv("VECTOR_INDEX_DIR", str(BASE_DIR / "tmp" / "vectors"))
+VECTOR_DTYPE = os.getenv("VECTOR_DTYPE", "float32")  # float16 halves disk/RAM; widening costs CPU, so pair it with IVF
+VECTOR_IVF_MIN_ROWS = int(os.getenv("VECTOR_IVF_MIN_ROWS", "200000"))  # cluster (IVF) search above this many vectors
+
+# Compiled agent knowledge bases (agents/services/kb.py), mmapped by chat workers
+AGENT_KB_DIR = os.getenv("AGENT_KB_DIR", str(BASE_DIR / "tmp" / "agent-kb"))
+
+# Chat answer cache (agents/services/answers.py), per process; keyed by agent + KB version + question
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "5000"))
+ANSWER_CACHE_TTL_SECONDS = int(os.getenv("ANSWER_CACHE_TTL_SECONDS", "21600"))
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0"))  # e.g. 0.92 to reuse near-duplicate questions (one embedding per message); 0 = exact only
+
+# Prompt context per chat message (agents/services/context.py), in estimated tokens
+CHAT_CONTEXT_TOKENS = int(os.getenv("CHAT_CONTEXT_TOKENS", "1200"))
+
+# Chat sessions (agents/services/sessions.py): verbatim history above this many tokens is compacted into a summary
+CHAT_HISTORY_TOKENS = int(os.getenv("CHAT_HISTORY_TOKENS", "600"))
+CHAT_SESSION_TTL_DAYS = int(os.getenv("CHAT_SESSION_TTL_DAYS", "30"))  # python manage.py prune_chat_sessions
+
+# Chat endpoint (agents/views.py): origins that may embed the widget ("*" = any; no cookies are
+# honoured cross-site), and messages per minute per client IP / per chat session (0 = unlimited)
+CHAT_ALLOWED_ORIGINS = [o.strip() for o in os.getenv("CHAT_ALLOWED_ORIGINS", "*").split(",") if o.strip()]
+CHAT_RATE_PER_MINUTE_IP = int(os.getenv("CHAT_RATE_PER_MINUTE_IP", "20"))
+CHAT_RATE_PER_MINUTE_SESSION = int(os.getenv("CHAT_RATE_PER_MINUTE_SESSION", "8"))
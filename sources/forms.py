@@ -1,5 +1,8 @@
 from django import forms
 
+from .models import UploadSession
+from .services.uploads import open_upload
+
 class WebsiteSourceCreateForm(forms.Form):
     name = forms.CharField(max_length=120)
     domain_url = forms.CharField(max_length=300)
@@ -16,13 +19,49 @@ class UrlSelectionForm(forms.Form):
 
 MAX_FILE_MB = 50
 ALLOWED_EXTS = (".pdf", ".docx")
+SHEET_EXTS = (".xlsx", ".csv")
+
+class ChunkedUploadForm(forms.Form):
+    """
+    The file normally arrives through the chunked upload API (hidden upload_id);
+    the plain file input stays as a no-JS fallback. clean() puts whichever was used
+    into cleaned_data["file"].
+    """
+    upload_id = forms.UUIDField(required=False, widget=forms.HiddenInput)
+    file = forms.FileField(required=False)
+
+    def __init__(self, *args, **kwargs):
+        self.user = kwargs.pop("user", None)
+        super().__init__(*args, **kwargs)
+
+    def validate_file(self, f):
+        return f
+
+    def clean(self):
+        cleaned = super().clean()
+        upload_id = cleaned.get("upload_id")
+        f = cleaned.get("file")
+        if upload_id:
+            try:
+                f = open_upload(self.user, upload_id)
+            except UploadSession.DoesNotExist:
+                self.add_error("file", "Upload not found or not finished. Please upload the file again.")
+                return cleaned
+        if not f:
+            if "file" not in self.errors:
+                self.add_error("file", "Choose a file to upload.")
+            return cleaned
+        try:
+            cleaned["file"] = self.validate_file(f)
+        except forms.ValidationError as e:
+            self.add_error("file", e)
+        return cleaned
 
-class DocumentSourceCreateForm(forms.Form):
+class DocumentSourceCreateForm(ChunkedUploadForm):
     name = forms.CharField(max_length=120)
-    file = forms.FileField()
+    field_order = ["name", "file", "upload_id"]
 
-    def clean_file(self):
-        f = self.cleaned_data["file"]
+    def validate_file(self, f):
         if f.size > MAX_FILE_MB * 1024 * 1024:
             raise forms.ValidationError(f"File too large. Max {MAX_FILE_MB}MB.")
         name = (f.name or "").lower()
@@ -30,25 +69,36 @@ class DocumentSourceCreateForm(forms.Form):
             raise forms.ValidationError("Only PDF or DOCX files are allowed.")
         return f
 
-class SheetSourceCreateForm(forms.Form):
+def _clean_sheet_file(f):
+    if f.size > 50 * 1024 * 1024:
+        raise forms.ValidationError("File too large (max 50MB).")
+
+    name = (f.name or "").lower()
+    if not any(name.endswith(x) for x in SHEET_EXTS):
+        raise forms.ValidationError("Only .xlsx and .csv are supported for now.")
+    return f
+
+class SheetSourceCreateForm(ChunkedUploadForm):
     name = forms.CharField(max_length=120)
     source_context = forms.CharField(
         required=False,
         widget=forms.Textarea(attrs={"rows": 3}),
         help_text="Tell Mira what this sheet represents (1–2 lines)."
     )
-    file = forms.FileField()
+    field_order = ["name", "source_context", "file", "upload_id"]
 
-    def clean_file(self):
-        f = self.cleaned_data["file"]
-        if f.size > 50 * 1024 * 1024:
-            raise forms.ValidationError("File too large (max 50MB).")
+    def validate_file(self, f):
+        return _clean_sheet_file(f)
 
-        allowed = (".xlsx", ".csv")
-        name = (f.name or "").lower()
-        if not any(name.endswith(x) for x in allowed):
-            raise forms.ValidationError("Only .xlsx and .csv are supported for now.")
-        return f
+class SheetReuploadForm(ChunkedUploadForm):
+    key_column = forms.CharField(
+        required=False,
+        max_length=120,
+        help_text="Column that identifies a row (e.g. Email). Leave empty to match whole rows."
+    )
+
+    def validate_file(self, f):
+        return _clean_sheet_file(f)
 
 class CustomSourceCreateForm(forms.Form):
     name = forms.CharField(max_length=120)
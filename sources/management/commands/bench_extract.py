@@ -0,0 +1,59 @@
+# sources/management/commands/bench_extract.py
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from sources.services.html_extract import extract_html, extract_html_bs4
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the lxml single-pass extractor against the old BeautifulSoup path "
+        "over a directory of saved .html pages, and report output parity."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("corpus", help="Directory with saved pages (*.html / *.htm, searched recursively).")
+        parser.add_argument("--repeat", type=int, default=3, help="Timing rounds per engine (best is kept).")
+        parser.add_argument("--base-url", default="https://example.com/", help="Base URL for resolving links.")
+
+    def handle(self, *args, **options):
+        root = Path(options["corpus"])
+        files = sorted(p for p in root.rglob("*") if p.suffix.lower() in (".html", ".htm"))
+        if not files:
+            raise CommandError(f"No .html files found under {root}")
+
+        docs = [f.read_text(encoding="utf-8", errors="replace") for f in files]
+        base = options["base_url"]
+        total_mb = sum(len(d) for d in docs) / (1024 * 1024)
+
+        timings = {}
+        outputs = {}
+        for name, fn in (("bs4", extract_html_bs4), ("lxml", extract_html)):
+            best = None
+            for _ in range(max(options["repeat"], 1)):
+                t0 = time.perf_counter()
+                out = [fn(d, base) for d in docs]
+                elapsed = time.perf_counter() - t0
+                best = elapsed if best is None else min(best, elapsed)
+            timings[name] = best
+            outputs[name] = out
+
+        same_text = same_links = 0
+        jaccard_sum = 0.0
+        for old, new in zip(outputs["bs4"], outputs["lxml"]):
+            same_text += old["text"] == new["text"]
+            same_links += old["doc_links"] == new["doc_links"]
+            a, b = set(old["text"].split()), set(new["text"].split())
+            jaccard_sum += (len(a & b) / len(a | b)) if (a or b) else 1.0
+
+        n = len(docs)
+        self.stdout.write(f"Pages: {n} ({total_mb:.1f} MB)")
+        for name, secs in timings.items():
+            self.stdout.write(f"  {name:5s} {secs:8.3f}s  {secs / n * 1000:7.2f} ms/page  {total_mb / secs:7.1f} MB/s")
+        self.stdout.write(self.style.SUCCESS(f"Speedup: {timings['bs4'] / timings['lxml']:.2f}x"))
+        self.stdout.write(
+            f"Parity: identical text {same_text}/{n}, identical doc links {same_links}/{n}, "
+            f"mean token Jaccard {jaccard_sum / n:.4f}"
+        )
@@ -0,0 +1,68 @@
+# sources/management/commands/recrawl_sources.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from sources.models import DataSource
+from sources.services.recrawl import (
+    schedule_new_pages,
+    remaining_budgets,
+    due_pages,
+    check_page,
+    postpone_failed_check,
+    postpone_over_budget,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-check pages of done website sources on an adaptive schedule "
+        "and re-queue only the pages whose content changed."
+    )
+
+    POLL_SLEEP_SECONDS = 60
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Run one scheduling pass and exit.")
+        parser.add_argument("--batch", type=int, default=50, help="Max pages to check per pass.")
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS("Re-crawl scheduler started."))
+
+        while True:
+            checked, changed = self._run_pass(options["batch"])
+            if checked:
+                self.stdout.write(f"Checked {checked} page(s), {changed} changed.")
+            if options["once"]:
+                break
+            time.sleep(self.POLL_SLEEP_SECONDS)
+
+    def _run_pass(self, batch: int):
+        schedule_new_pages()
+
+        pages = list(due_pages(limit=batch))
+        budgets = remaining_budgets({p.source.user_id for p in pages})
+
+        checked = changed = 0
+        changed_sources = set()
+        over_budget = []
+        for p in pages:
+            uid = p.source.user_id
+            if budgets.get(uid, 0) <= 0:
+                over_budget.append(p)
+                continue
+            budgets[uid] -= 1
+            checked += 1
+            try:
+                if check_page(p):
+                    changed += 1
+                    changed_sources.add(p.source_id)
+            except Exception:
+                postpone_failed_check(p)
+        if over_budget:
+            postpone_over_budget(over_budget)
+
+        # Enqueue only sources that actually changed; the worker skips pages already "done".
+        if changed_sources:
+            DataSource.objects.filter(pk__in=changed_sources, status="done").update(status="pending", error_message="")
+        return checked, changed
@@ -0,0 +1,115 @@
+# sources/management/commands/reprocess_sources.py
+from django.core.management.base import BaseCommand
+
+from agents.services.kb import mark_stale_for_source
+from sources.models import DataSource, DataSourcePage
+from sources.services.blobs import get_text
+from sources.services.documents import extract_urls
+from sources.services.scrape import summarize_with_openai, summarize_document_with_openai
+from sources.services.vectors import embed_source
+from sources.services.tagging import (
+    extract_tags_with_openai,
+    set_tags_for_source,
+    set_tags_for_page,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-run summarization and/or tagging from stored extracted text (no HTTP, no file parsing). "
+        "Use after a prompt/model/tagger change."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--source", type=int, action="append", dest="source_ids", help="DataSource id (repeatable).")
+        parser.add_argument("--user", type=int, dest="user_id", help="Only sources of this user id.")
+        parser.add_argument("--summaries", action="store_true", help="Re-summarize (default: summaries + tags).")
+        parser.add_argument("--tags", action="store_true", help="Re-tag (default: summaries + tags).")
+        parser.add_argument("--limit", type=int, default=0, help="Stop after N pages/documents.")
+        parser.add_argument("--dry-run", action="store_true", help="Only count what would be reprocessed.")
+
+    def handle(self, *args, **options):
+        do_summaries = options["summaries"] or not options["tags"]
+        do_tags = options["tags"] or not options["summaries"]
+        self.limit = options["limit"] or None
+        self.dry_run = options["dry_run"]
+        self.count = 0
+
+        sources = DataSource.objects.filter(status="done", source_type__in=["website", "document"])
+        if options["source_ids"]:
+            sources = sources.filter(pk__in=options["source_ids"])
+        if options["user_id"]:
+            sources = sources.filter(user_id=options["user_id"])
+
+        ok = failed = 0
+        for src in sources.order_by("id"):
+            if self.limit and self.count >= self.limit:
+                break
+            if src.source_type == "website":
+                o, f = self._reprocess_website(src, do_summaries, do_tags)
+            else:
+                o, f = self._reprocess_document(src, do_summaries, do_tags)
+            ok += o
+            failed += f
+            if o and not self.dry_run:
+                # same post-change hooks as run_source_jobs: vectors, then agents' KB snapshots
+                self._reindex(embed_source, src)
+                self._reindex(mark_stale_for_source, src)
+
+        verb = "Would reprocess" if self.dry_run else "Reprocessed"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {ok} item(s); {failed} failed."))
+
+    def _reindex(self, notify, src: DataSource):
+        try:
+            notify(src)
+        except Exception as e:
+            self.stderr.write(f"{notify.__name__} failed for source {src.pk}: {e}")
+
+    def _reprocess_website(self, src: DataSource, do_summaries: bool, do_tags: bool):
+        ok = failed = 0
+        pages = (
+            DataSourcePage.objects.filter(source=src, selected=True, status="done", text_blob__isnull=False)
+            .select_related("text_blob", "source")
+            .order_by("id")
+        )
+        for p in pages.iterator():
+            if self.limit and self.count >= self.limit:
+                break
+            self.count += 1
+            if self.dry_run:
+                ok += 1
+                continue
+            try:
+                if do_summaries:
+                    p.summary = summarize_with_openai(p.url, get_text(p.text_blob), p.doc_links or [])
+                    p.save(update_fields=["summary", "updated_at"])
+                if do_tags:
+                    set_tags_for_page(p, extract_tags_with_openai(p.summary, max_tags=10))
+                ok += 1
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f"page {p.pk}: {e}")
+        return ok, failed
+
+    def _reprocess_document(self, src: DataSource, do_summaries: bool, do_tags: bool):
+        if not src.text_blob_id:
+            return 0, 0
+        self.count += 1
+        if self.dry_run:
+            return 1, 0
+        try:
+            if do_summaries:
+                text = get_text(src.text_blob)
+                src.summary = summarize_document_with_openai(src.original_filename or "document", text, extract_urls(text))
+                src.save(update_fields=["summary"])
+
+                first = src.pages.filter(selected=True).order_by("id").first()
+                if first:
+                    first.summary = src.summary
+                    first.save(update_fields=["summary", "updated_at"])
+            if do_tags:
+                set_tags_for_source(src, extract_tags_with_openai(src.summary, max_tags=10))
+            return 1, 0
+        except Exception as e:
+            self.stderr.write(f"source {src.pk}: {e}")
+            return 0, 1
@@ -1,23 +1,36 @@
 # sources/management/commands/run_source_jobs.py
 import os
 import time
+from datetime import timedelta
 
 from django.core.management.base import BaseCommand
 from django.db import transaction
-from django.db.models import F
+from django.db.models import F, Q
+from django.utils import timezone
 
+from agents.services.kb import build_stale_kbs, mark_stale_for_source
 from sources.models import DataSource, DataSourcePage
+from sources.services.categorize import categorize_url
+from sources.services.discover import DISCOVERY_BUDGET_SECONDS, discover_ranked_urls
 from sources.services.scrape import (
-    extract_text_and_docs,
+    DOC_SUMMARY_INPUT_CHARS,
+    extract_page,
     summarize_with_openai,
     summarize_document_with_openai,
     summarize_sheet_source_with_openai,
 )
 from sources.services.documents import (
-    extract_text_from_pdf,
+    iter_pdf_pages,
     extract_text_from_docx,
     extract_urls,
 )
+from sources.services.chunking import ingest_chunks
+from sources.services.rowstore import sync_sheet_rows
+from sources.services.sheets import iter_sheets
+from sources.services.storage import local_copy
+from sources.services.blobs import TextBlobWriter, normalize_text, put_text, get_text
+from sources.services.retry import MAX_ATTEMPTS, is_transient_error, backoff_delay
+from sources.services.vectors import embed_source
 from sources.services.tagging import (
     extract_tags_with_openai,
     set_tags_for_source,
@@ -31,12 +44,40 @@ class Command(BaseCommand):
     POLL_SLEEP_SECONDS = 2
     LOOP_SLEEP_SECONDS = 1
 
+    # Speculative prefetch: while users are still picking URLs (source is "draft"),
+    # idle workers download + extract text so summarization can start right away.
+    PREFETCH_BATCH_SIZE = 5
+    PREFETCH_MAX_DRAFT_AGE = timedelta(hours=2)  # don't keep fetching abandoned drafts
+    PREFETCH_STALE_AFTER = timedelta(minutes=10)  # reclaim pages from a crashed worker
+    DOC_SUMMARY_MAX_URLS = 10
+
+    # New website sources: the user is waiting on the page picker, so discovery runs first.
+    DISCOVERY_MAX_URLS = 300
+    DISCOVERY_LEASE = timedelta(seconds=DISCOVERY_BUDGET_SECONDS * 3)  # reclaim from a crashed worker
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--no-prefetch",
+            action="store_true",
+            help="Don't speculatively fetch pages of draft website sources while idle.",
+        )
+
     def handle(self, *args, **options):
         self.stdout.write(self.style.SUCCESS("Source worker started. Polling for pending jobs..."))
+        prefetch = not options.get("no_prefetch")
 
         while True:
+            if self._discover_next_source():
+                continue
+
             src = self._claim_next_source()
             if not src:
+                # agents whose sources changed get a fresh knowledge base snapshot
+                if build_stale_kbs():
+                    continue
+                # Low priority: only prefetch when there is no real job waiting
+                if prefetch and self._prefetch_batch():
+                    continue
                 time.sleep(self.POLL_SLEEP_SECONDS)
                 continue
 
@@ -49,13 +90,25 @@ class Command(BaseCommand):
                     error_message=str(e)[:300],
                 )
 
+            # summaries/tags/pages may all have changed: re-index the whole source
+            self._reindex(embed_source, src)
+            self._reindex(mark_stale_for_source, src)
+
             time.sleep(self.LOOP_SLEEP_SECONDS)
 
+    def _reindex(self, notify, obj):
+        # retrieval index is best-effort: never fail ingestion over it
+        try:
+            notify(obj)
+        except Exception as e:
+            self.stderr.write(f"{notify.__name__} failed for source {obj.pk}: {e}")
+
     def _claim_next_source(self):
         with transaction.atomic():
             src = (
                 DataSource.objects.select_for_update(skip_locked=True)
-                .filter(status="pending", source_type__in=["website", "document", "sheet"])
+                .filter(status="pending", source_type__in=["website", "document", "sheet", "custom"])
+                .filter(Q(next_run_at__isnull=True) | Q(next_run_at__lte=timezone.now()))
                 .order_by("created_at")
                 .first()
             )
@@ -65,10 +118,127 @@ class Command(BaseCommand):
             src.status = "running"
             src.error_message = ""
             src.processed_pages = 0
-            src.save(update_fields=["status", "error_message", "processed_pages"])
+            src.next_run_at = None
+            src.save(update_fields=["status", "error_message", "processed_pages", "next_run_at"])
+            return src
+
+    # -----------------------------
+    # URL DISCOVERY (new website sources)
+    # -----------------------------
+    def _claim_discovery(self):
+        now = timezone.now()
+        with transaction.atomic():
+            src = (
+                DataSource.objects.select_for_update(skip_locked=True)
+                .filter(status="discovering", source_type="website")
+                .filter(Q(next_run_at__isnull=True) | Q(next_run_at__lte=now))
+                .order_by("created_at")
+                .first()
+            )
+            if not src:
+                return None
+
+            src.next_run_at = now + self.DISCOVERY_LEASE
+            src.save(update_fields=["next_run_at"])
             return src
 
+    def _discover_next_source(self) -> bool:
+        src = self._claim_discovery()
+        if not src:
+            return False
+
+        try:
+            # Ranked by link-graph importance, so the cap keeps the most important pages.
+            ranked = discover_ranked_urls(src.domain_url, max_urls=self.DISCOVERY_MAX_URLS)
+        except Exception as e:
+            self.stderr.write(f"discovery failed for source {src.pk}: {e}")
+            ranked = []
+
+        if not ranked:
+            DataSource.objects.filter(pk=src.pk, status="discovering").update(
+                status="failed",
+                error_message="Could not discover any URLs from this website.",
+                next_run_at=None,
+            )
+            return True
+
+        DataSourcePage.objects.bulk_create(
+            [
+                DataSourcePage(
+                    source=src,
+                    url=u,
+                    category=categorize_url(u),
+                    selected=True,
+                    status="pending",
+                    importance=score,
+                )
+                for u, score in ranked
+            ],
+            ignore_conflicts=True,
+        )
+        # "draft" shows the picker and lets idle workers start prefetching
+        DataSource.objects.filter(pk=src.pk, status="discovering").update(
+            status="draft",
+            total_pages=src.pages.count(),
+            selected_pages=src.pages.filter(selected=True).count(),
+            next_run_at=None,
+        )
+        return True
+
+    # -----------------------------
+    # SPECULATIVE PREFETCH (website drafts, no LLM)
+    # -----------------------------
+    def _claim_prefetch_pages(self):
+        now = timezone.now()
+        with transaction.atomic():
+            pages = list(
+                DataSourcePage.objects.select_for_update(skip_locked=True, of=("self",))
+                .filter(
+                    source__status="draft",
+                    source__source_type="website",
+                    source__created_at__gte=now - self.PREFETCH_MAX_DRAFT_AGE,
+                    selected=True,
+                )
+                .filter(
+                    Q(fetch_status="")
+                    | Q(fetch_status="fetching", fetched_at__lt=now - self.PREFETCH_STALE_AFTER)
+                )
+                .order_by("-importance", "id")[: self.PREFETCH_BATCH_SIZE]
+            )
+            if pages:
+                DataSourcePage.objects.filter(pk__in=[p.pk for p in pages]).update(
+                    fetch_status="fetching",
+                    fetched_at=now,
+                )
+            return pages
+
+    def _prefetch_batch(self) -> int:
+        pages = self._claim_prefetch_pages()
+        for p in pages:
+            try:
+                page = extract_page(p.url)
+                p.text_blob = put_text(page["text"])
+                p.doc_links = page["doc_links"]
+                p.preview = page["meta"]
+                p.fetch_status = "fetched"
+            except Exception:
+                # the real job will simply fetch it again
+                p.fetch_status = "failed"
+            p.fetched_at = timezone.now()
+            p.save(update_fields=["text_blob", "doc_links", "preview", "fetch_status", "fetched_at", "updated_at"])
+        return len(pages)
+
     def _process_source(self, src: DataSource):
+        if src.source_type == "custom":
+            # no page rows: the text itself is the item
+            self._process_custom(src)
+            return
+
+        if src.source_type == "sheet":
+            # sheet pages are created by the worker's own parse pass
+            self._process_sheet(src, DataSourcePage.objects.filter(source=src, selected=True).order_by("id"))
+            return
+
         pages = DataSourcePage.objects.filter(source=src, selected=True).order_by("id")
         total = pages.count()
 
@@ -86,8 +256,6 @@ class Command(BaseCommand):
             self._process_website(src, pages)
         elif src.source_type == "document":
             self._process_document(src, pages)
-        elif src.source_type == "sheet":
-            self._process_sheet(src, pages)
         else:
             src.status = "failed"
             src.error_message = f"Unsupported source_type: {src.source_type}"
@@ -97,18 +265,45 @@ class Command(BaseCommand):
     # WEBSITE
     # -----------------------------
     def _process_website(self, src: DataSource, pages):
-        for p in pages:
+        # Only pending pages and retries that are due. "done" pages are kept (e.g. a re-crawl
+        # only re-queues changed pages) and permanently "failed" ones wait for a manual re-run.
+        now = timezone.now()
+        todo = pages.filter(
+            Q(status__in=["pending", "running"])
+            | Q(status="retry", next_attempt_at__lte=now)
+        )
+        finished = pages.filter(status__in=["done", "failed"]).count()
+        DataSource.objects.filter(pk=src.pk).update(processed_pages=finished)
+
+        # most important pages first, so partial progress is the useful part
+        for p in todo.order_by("-importance", "id"):
             try:
                 p.status = "running"
                 p.save(update_fields=["status", "updated_at"])
 
-                text, doc_links = extract_text_and_docs(p.url)
+                if p.fetch_status == "fetched" and p.text_blob_id:
+                    # already downloaded by the prefetcher
+                    text, doc_links = get_text(p.text_blob), p.doc_links
+                else:
+                    page = extract_page(p.url)
+                    # summarize exactly what is stored, as on the prefetched path
+                    text, doc_links = normalize_text(page["text"]), page["doc_links"]
+                    p.text_blob = put_text(text)
+                    p.preview = page["meta"]  # title/description/image for chat cards
+                    p.fetched_at = timezone.now()
                 summary = summarize_with_openai(p.url, text, doc_links)
 
                 p.summary = summary
                 p.status = "done"
                 p.error = ""
-                p.save(update_fields=["summary", "status", "error", "updated_at"])
+                p.doc_links = doc_links
+                p.fetch_status = ""
+                p.attempts = 0
+                p.next_attempt_at = None
+                p.save(update_fields=[
+                    "summary", "status", "error", "doc_links", "text_blob", "preview", "fetched_at",
+                    "fetch_status", "attempts", "next_attempt_at", "updated_at",
+                ])
 
                 # Tagging is optional — don't fail ingestion if tagging fails
                 try:
@@ -118,12 +313,26 @@ class Command(BaseCommand):
                     pass
 
             except Exception as e:
-                p.status = "failed"
                 p.error = str(e)[:300]
-                p.save(update_fields=["status", "error", "updated_at"])
+                p.attempts += 1
+                if is_transient_error(e) and p.attempts < MAX_ATTEMPTS:
+                    # Reschedule and move on; the rest of the source isn't blocked
+                    p.status = "retry"
+                    p.next_attempt_at = timezone.now() + backoff_delay(p.attempts)
+                    if p.text_blob_id:
+                        p.fetch_status = "fetched"  # text is stored, the retry won't refetch
+                    p.save(update_fields=[
+                        "status", "error", "attempts", "next_attempt_at",
+                        "text_blob", "doc_links", "preview", "fetched_at", "fetch_status", "updated_at",
+                    ])
+                    continue
+                p.status = "failed"
+                p.save(update_fields=["status", "error", "attempts", "updated_at"])
 
             DataSource.objects.filter(pk=src.pk).update(processed_pages=F("processed_pages") + 1)
 
+        if self._schedule_retries(src):
+            return
         self._finalize_source_from_pages(src)
 
     # -----------------------------
@@ -132,7 +341,8 @@ class Command(BaseCommand):
     def _process_document(self, src: DataSource, pages):
         """
         Document source:
-        - Parse file once
+        - Parse file once (full text, page by page for PDFs)
+        - Split into overlapping chunks with per-chunk summaries/keywords
         - Generate ONE summary
         - Save summary to src.summary (for chatbot)
         - Also copy it to the first page row for UI consistency
@@ -141,18 +351,36 @@ class Command(BaseCommand):
         try:
             pages.update(status="running", error="")
 
-            file_path = src.file.path
             ext = os.path.splitext(src.original_filename or "")[1].lower()
 
-            if ext == ".pdf":
-                text = extract_text_from_pdf(file_path)
-            elif ext == ".docx":
-                text = extract_text_from_docx(file_path)
-            else:
+            if ext not in (".pdf", ".docx"):
                 raise RuntimeError("Unsupported document type (only PDF/DOCX).")
 
-            urls = extract_urls(text)
-            summary = summarize_document_with_openai(src.original_filename or "document", text, urls)
+            # full document (not just the first 60k chars), streamed page by page: the chunker,
+            # the text blob and the URL list consume each page as it's parsed; only the head
+            # the summary prompt reads is kept
+            blob = TextBlobWriter(head_chars=DOC_SUMMARY_INPUT_CHARS)
+            urls = []
+
+            def doc_pages(file_path):
+                pages_iter = iter_pdf_pages(file_path) if ext == ".pdf" else [(None, extract_text_from_docx(file_path, max_chars=None))]
+                for n, t in pages_iter:
+                    if not t:
+                        continue
+                    blob.write(t)
+                    if len(urls) < self.DOC_SUMMARY_MAX_URLS:
+                        urls.extend(u for u in extract_urls(t) if u not in urls)
+                    yield n, t
+
+            # (local_copy: the file may live in remote storage; parsers get a cached local path)
+            with local_copy(src.file) as file_path:
+                ingest_chunks(src, doc_pages(file_path))
+
+            # keep the extracted text so we can re-summarize without re-parsing
+            src.text_blob = blob.save()
+            src.save(update_fields=["text_blob"])
+
+            summary = summarize_document_with_openai(src.original_filename or "document", blob.head, urls[:self.DOC_SUMMARY_MAX_URLS])
 
             # store for chatbot
             src.summary = summary
@@ -189,44 +417,123 @@ class Command(BaseCommand):
             src.error_message = str(e)[:300]
             src.save(update_fields=["processed_pages", "status", "error_message"])
 
+    # -----------------------------
+    # CUSTOM
+    # -----------------------------
+    def _process_custom(self, src: DataSource):
+        """
+        Custom sources are usable right away (custom_text); the job only builds chunks.
+        """
+        try:
+            ingest_chunks(src, [(None, src.custom_text)])
+            src.selected_pages = 1
+            src.processed_pages = 1
+            src.status = "done"
+            src.error_message = ""
+        except Exception as e:
+            src.status = "failed"
+            src.error_message = str(e)[:300]
+        src.save(update_fields=["selected_pages", "processed_pages", "status", "error_message"])
+
     # -----------------------------
     # SHEET
     # -----------------------------
     def _process_sheet(self, src: DataSource, pages):
         """
-        Sheet sources:
-        - Generate ONE source-level src.summary using stored previews
-        - Mark all selected pages done so the UI is consistent
+        Sheet sources (first upload and re-uploads alike):
+        - One pass over the file: detect the encoding once, create a page per sheet,
+          sync every sheet's rows into the row store, touching only changed rows
+        - Sheets new in the file get a page, sheets gone from it are dropped
+        - Rebuild ONE source-level src.summary only when the schema changed (or there is none yet)
         - Tag source-level (NOT per-sheet)
         """
         try:
             pages.update(status="running", error="")
 
-            lines = []
-            for pg in pages:
-                prev = pg.preview or {}
-                headers = prev.get("headers") or []
-                lines.append(f"Sheet/Table: {pg.url} | Columns: {', '.join(headers[:12])}")
-
-            overview_text = "\n".join(lines)[:15000]
-            context = (getattr(src, "source_context", "") or "").strip()
-
-            summary = summarize_sheet_source_with_openai(src.name, context, overview_text)
+            existing = {pg.url: pg for pg in DataSourcePage.objects.filter(source=src)}
+            old_schema = {name: (pg.preview or {}).get("headers") or [] for name, pg in existing.items() if pg.selected}
+            is_csv = os.path.splitext((src.original_filename or "").lower())[1] != ".xlsx"
+            new_schema = {}
+            totals = {"inserted": 0, "updated": 0, "deleted": 0, "unchanged": 0}
+
+            with local_copy(src.file) as file_path:
+                for sheet_name, headers, rows in iter_sheets(file_path, src.original_filename):
+                    pg = existing.pop(sheet_name, None)
+                    if pg is None and is_csv and len(existing) == 1:
+                        # a CSV is one sheet named after the file: a renamed re-upload keeps its page
+                        old_name, pg = existing.popitem()
+                        if old_name in old_schema:
+                            old_schema[sheet_name] = old_schema.pop(old_name)
+                        pg.url = sheet_name
+                    if pg is None:
+                        pg = DataSourcePage.objects.create(
+                            source=src, url=sheet_name, category="csv" if is_csv else "sheet",
+                            selected=True, status="running",
+                        )
+                    if not pg.selected:
+                        continue
+
+                    sample = []
+
+                    def sampled(rows=rows, sample=sample):
+                        for values in rows:
+                            if len(sample) < 10:
+                                sample.append([str(v) if v is not None else "" for v in values])
+                            yield values
+
+                    stats = sync_sheet_rows(src, pg, headers, sampled(), key_column=src.sheet_key_column)
+                    for k in totals:
+                        totals[k] += stats[k]
+                    new_schema[sheet_name] = headers
+
+                    pg.preview = {"headers": headers, "rows": sample, "row_count": stats["total"], "last_sync": stats}
+                    pg.save(update_fields=["url", "preview", "updated_at"])
+
+            if not new_schema:
+                raise ValueError("Could not read any sheets from this file. Try a CSV instead.")
+
+            # sheets that are no longer in the file (their rows cascade)
+            if existing:
+                DataSourcePage.objects.filter(pk__in=[pg.pk for pg in existing.values()]).delete()
+
+            pages = DataSourcePage.objects.filter(source=src, selected=True).order_by("id")
+            src.total_pages = DataSourcePage.objects.filter(source=src).count()
+            src.selected_pages = pages.count()
+
+            schema_changed = old_schema != new_schema
+            resummarize = schema_changed or not src.summary
+            if resummarize:
+                lines = []
+                for pg in pages:
+                    prev = pg.preview or {}
+                    headers = prev.get("headers") or []
+                    lines.append(
+                        f"Sheet/Table: {pg.url} | Rows: {prev.get('row_count', '?')} | Columns: {', '.join(headers[:12])}"
+                    )
+
+                overview_text = "\n".join(lines)[:15000]
+                context = (getattr(src, "source_context", "") or "").strip()
+
+                src.summary = summarize_sheet_source_with_openai(src.name, context, overview_text)
 
-            src.summary = summary
             src.processed_pages = src.selected_pages
             src.status = "done"
             src.error_message = ""
-            src.save(update_fields=["summary", "processed_pages", "status", "error_message"])
+            src.save(update_fields=["summary", "total_pages", "selected_pages", "processed_pages", "status", "error_message"])
 
             pages.update(status="done", error="")
+            self.stdout.write(
+                f"Sheet source {src.id}: +{totals['inserted']} ~{totals['updated']} -{totals['deleted']} "
+                f"={totals['unchanged']} rows, schema {'changed' if schema_changed else 'unchanged'}"
+            )
 
-            # Tagging source-level
-            try:
-                tags = extract_tags_with_openai(summary, max_tags=10)
-                set_tags_for_source(src, tags)
-            except Exception:
-                pass
+            # Tagging source-level (only when the summary was rebuilt)
+            if resummarize:
+                try:
+                    tags = extract_tags_with_openai(src.summary, max_tags=10)
+                    set_tags_for_source(src, tags)
+                except Exception:
+                    pass
 
         except Exception as e:
             pages.update(status="failed", error=str(e)[:300])
@@ -238,13 +545,34 @@ class Command(BaseCommand):
     # -----------------------------
     # FINALIZE helper (website only)
     # -----------------------------
+    def _schedule_retries(self, src: DataSource) -> bool:
+        """
+        If pages are waiting on a backoff, park the source as "pending" until the
+        earliest retry is due (the claim query skips it until then).
+        """
+        retries = DataSourcePage.objects.filter(source=src, selected=True, status="retry")
+        next_at = retries.order_by("next_attempt_at").values_list("next_attempt_at", flat=True).first()
+        if next_at is None:
+            return False
+
+        src.status = "pending"
+        src.next_run_at = next_at
+        src.error_message = f"Retrying {retries.count()} page(s) after temporary errors."
+        src.save(update_fields=["status", "next_run_at", "error_message"])
+        return True
+
     def _finalize_source_from_pages(self, src: DataSource):
         failed = DataSourcePage.objects.filter(source=src, selected=True, status="failed").count()
         empty = DataSourcePage.objects.filter(source=src, selected=True, status="done", summary="").count()
+        done = DataSourcePage.objects.filter(source=src, selected=True, status="done").exclude(summary="").count()
 
-        if failed > 0 or empty > 0:
+        # A few dead pages shouldn't sink a large crawl; only fail if nothing usable came out
+        if done == 0:
             src.status = "failed"
             src.error_message = f"Ingestion incomplete: failed_pages={failed}, empty_summaries={empty}"
+        elif failed > 0 or empty > 0:
+            src.status = "done"
+            src.error_message = f"Completed with failed_pages={failed}, empty_summaries={empty}"
         else:
             src.status = "done"
             src.error_message = ""
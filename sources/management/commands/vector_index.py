@@ -0,0 +1,48 @@
+# sources/management/commands/vector_index.py
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from sources.services.vectors import get_store, rebuild_user, semantic_search
+
+
+class Command(BaseCommand):
+    help = "Rebuild and/or query a user's memory-mapped vector index and report latency."
+
+    def add_arguments(self, parser):
+        parser.add_argument("username")
+        parser.add_argument("query", nargs="?", default="")
+        parser.add_argument("--rebuild", action="store_true", help="Re-embed everything into a fresh index.")
+        parser.add_argument("--k", type=int, default=5, help="Results to show.")
+        parser.add_argument("--repeat", type=int, default=100, help="Timed query rounds.")
+
+    def handle(self, *args, **options):
+        user = get_user_model().objects.filter(username=options["username"]).first()
+        if user is None:
+            raise CommandError(f"No user {options['username']!r}")
+
+        if options["rebuild"]:
+            t0 = time.perf_counter()
+            stats = rebuild_user(user.id)
+            self.stdout.write(f"Rebuilt: {stats['embedded']} vectors in {time.perf_counter() - t0:.1f} s")
+
+        store = get_store(user.id)
+        if not store._open():
+            raise CommandError("No vector index yet (run with --rebuild).")
+        meta = store.meta
+        self.stdout.write(
+            f"Vectors: {meta['count'] - meta['dead']} live / {meta['count']}  dim: {meta['dim']}  "
+            f"dtype: {meta['dtype']}  embedder: {meta['embedder']}  ivf: {'yes' if store.ivf is not None else 'no'}"
+        )
+        if not options["query"]:
+            return
+
+        semantic_search(user.id, options["query"], k=options["k"])  # warm the mapping
+        rounds = max(options["repeat"], 1)
+        t0 = time.perf_counter()
+        for _ in range(rounds):
+            hits = semantic_search(user.id, options["query"], k=options["k"])
+        self.stdout.write(f"query: {(time.perf_counter() - t0) / rounds * 1000:.2f} ms (embedding included)")
+        for h in hits:
+            self.stdout.write(f"  {h['score']:6.3f}  {h['kind']:6s} #{h['id']:<6d} source #{h['source_id']}")
@@ -0,0 +1,22 @@
+# Generated by Django 6.0 on 2026-10-19 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sources', '0006_tag_datasource_tags_datasourcepage_tags'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datasourcepage',
+            name='importance',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='datasourcepage',
+            index=models.Index(fields=['source', '-importance'], name='sources_dat_source__b965c1_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 6.0 on 2026-10-19 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sources', '0007_datasourcepage_importance_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datasourcepage',
+            name='doc_links',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='datasourcepage',
+            name='fetch_status',
+            field=models.CharField(blank=True, choices=[('', 'Not fetched'), ('fetching', 'Fetching'), ('fetched', 'Fetched'), ('failed', 'Failed')], default='', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='datasourcepage',
+            name='fetched_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
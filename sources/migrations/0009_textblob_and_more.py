@@ -0,0 +1,35 @@
+# Generated by Django 6.0 on 2026-10-19 10:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sources', '0008_datasourcepage_doc_links_datasourcepage_fetch_status_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TextBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64, unique=True)),
+                ('codec', models.CharField(choices=[('zlib', 'zlib')], default='zlib', max_length=10)),
+                ('raw_size', models.IntegerField(default=0)),
+                ('data', models.BinaryField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='datasource',
+            name='text_blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='sources.textblob'),
+        ),
+        migrations.AddField(
+            model_name='datasourcepage',
+            name='text_blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='sources.textblob'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 6.0 on 2026-10-19 10:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sources', '0009_textblob_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datasourcepage',
+            name='change_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='datasourcepage',
+            name='check_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='datasourcepage',
+            name='check_interval_hours',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='datasourcepage',
+            name='last_changed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='datasourcepage',
+            name='last_checked_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='datasourcepage',
+            name='next_check_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='datasourcepage',
+            index=models.Index(fields=['status', 'next_check_at'], name='sources_dat_status_c81c2f_idx'),
+        ),
+    ]
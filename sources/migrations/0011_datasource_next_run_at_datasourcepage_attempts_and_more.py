@@ -0,0 +1,33 @@
+# Generated by Django 6.0 on 2026-10-19 10:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sources', '0010_datasourcepage_change_count_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datasource',
+            name='next_run_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='datasourcepage',
+            name='attempts',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='datasourcepage',
+            name='next_attempt_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='datasourcepage',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('retry', 'Retrying'), ('done', 'Done'), ('failed', 'Failed'), ('skipped', 'Skipped')], default='pending', max_length=20),
+        ),
+    ]
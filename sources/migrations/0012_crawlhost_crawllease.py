@@ -0,0 +1,38 @@
+# Generated by Django 6.0 on 2026-10-19 10:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sources', '0011_datasource_next_run_at_datasourcepage_attempts_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CrawlHost',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('host', models.CharField(max_length=255, unique=True)),
+                ('max_concurrent', models.IntegerField(default=2)),
+                ('min_delay_seconds', models.FloatField(default=0.5)),
+                ('crawl_delay_seconds', models.FloatField(default=0)),
+                ('robots_checked_at', models.DateTimeField(blank=True, null=True)),
+                ('next_allowed_at', models.DateTimeField(blank=True, null=True)),
+                ('backoff_until', models.DateTimeField(blank=True, null=True)),
+                ('backoff_level', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CrawlLease',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('expires_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('host', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leases', to='sources.crawlhost')),
+            ],
+        ),
+    ]
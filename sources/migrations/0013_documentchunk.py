@@ -0,0 +1,32 @@
+# Generated by Django 6.0 on 2026-10-19 10:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sources', '0012_crawlhost_crawllease'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ordinal', models.IntegerField()),
+                ('page_start', models.IntegerField(blank=True, null=True)),
+                ('page_end', models.IntegerField(blank=True, null=True)),
+                ('text', models.TextField()),
+                ('token_count', models.IntegerField(default=0)),
+                ('summary', models.TextField(blank=True, default='')),
+                ('keywords', models.JSONField(blank=True, default=list)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('source', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='sources.datasource')),
+            ],
+            options={
+                'unique_together': {('source', 'ordinal')},
+            },
+        ),
+    ]
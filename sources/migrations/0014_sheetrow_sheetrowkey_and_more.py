@@ -0,0 +1,46 @@
+# Generated by Django 6.0 on 2026-10-19 10:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sources', '0013_documentchunk'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SheetRow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('row_number', models.IntegerField()),
+                ('values', models.JSONField(default=list)),
+                ('page', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rows', to='sources.datasourcepage')),
+                ('source', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sheet_rows', to='sources.datasource')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SheetRowKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('column', models.CharField(max_length=10)),
+                ('value', models.CharField(max_length=255)),
+                ('row', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='keys', to='sources.sheetrow')),
+                ('source', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='sources.datasource')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='sheetrow',
+            index=models.Index(fields=['page', 'row_number'], name='sources_she_page_id_08f786_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sheetrowkey',
+            index=models.Index(fields=['source', 'value'], name='sources_she_source__1fe925_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sheetrowkey',
+            index=models.Index(fields=['value'], name='sources_she_value_5cd9e2_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 6.0 on 2026-10-19 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sources', '0014_sheetrow_sheetrowkey_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datasource',
+            name='sheet_key_column',
+            field=models.CharField(blank=True, max_length=120),
+        ),
+        migrations.AddField(
+            model_name='sheetrow',
+            name='row_hash',
+            field=models.CharField(default='', max_length=40),
+        ),
+        migrations.AddField(
+            model_name='sheetrow',
+            name='row_key',
+            field=models.CharField(default='', max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='sheetrow',
+            index=models.Index(fields=['page', 'row_key'], name='sources_she_page_id_12d6fb_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-19 10:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sources', '0016_uploadsession'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datasource',
+            name='file_sha256',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 6.0 on 2026-10-19 10:23
+
+import sources.services.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sources', '0017_datasource_file_sha256'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='datasource',
+            name='file',
+            field=models.FileField(blank=True, null=True, storage=sources.services.storage.sources_storage, upload_to='sources/uploads/%Y/%m/'),
+        ),
+    ]
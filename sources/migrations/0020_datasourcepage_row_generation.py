@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-19 11:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sources', '0019_tagindexevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datasourcepage',
+            name='row_generation',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-19 11:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sources', '0020_datasourcepage_row_generation'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='datasource',
+            name='status',
+            field=models.CharField(choices=[('discovering', 'Discovering'), ('draft', 'Draft'), ('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='draft', max_length=20),
+        ),
+    ]
@@ -1,8 +1,13 @@
+import os
+import uuid
+
 from django.conf import settings
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils.text import slugify
 
+from sources.services.storage import sources_storage
+
 class Tag(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="tags")
     name = models.CharField(max_length=60)
@@ -19,6 +24,26 @@ class Tag(models.Model):
         super().save(*args, **kwargs)
 
 
+class TextBlob(models.Model):
+    """
+    Content-addressed store for normalized extracted text (zlib-compressed, deduped by sha256).
+    Lets us re-summarize / re-tag without refetching anything.
+    """
+    CODEC_CHOICES = [
+        ("zlib", "zlib"),
+    ]
+
+    sha256 = models.CharField(max_length=64, unique=True)
+    codec = models.CharField(max_length=10, choices=CODEC_CHOICES, default="zlib")
+    raw_size = models.IntegerField(default=0)
+    data = models.BinaryField()
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.raw_size} chars)"
+
+
 class DataSource(models.Model):
     TYPE_CHOICES = [
         ("website", "Website"),
@@ -27,6 +52,7 @@ class DataSource(models.Model):
         ("custom", "Custom"),
     ]
     STATUS_CHOICES = [
+        ("discovering", "Discovering"),  # websites: the worker is crawling for URLs
         ("draft", "Draft"),
         ("pending", "Pending"),
         ("running", "Running"),
@@ -41,6 +67,7 @@ class DataSource(models.Model):
     domain_url = models.URLField(blank=True)  # only for website
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="draft")
     error_message = models.CharField(max_length=300, blank=True)
+    next_run_at = models.DateTimeField(null=True, blank=True)  # pending: page retries due; discovering: lease expiry
 
     total_pages = models.IntegerField(default=0)
     selected_pages = models.IntegerField(default=0)
@@ -48,9 +75,12 @@ class DataSource(models.Model):
     source_context = models.TextField(blank=True, default="")
     summary = models.TextField(blank=True, default="")
 
-    file = models.FileField(upload_to="sources/uploads/%Y/%m/", blank=True, null=True)
+    file = models.FileField(upload_to="sources/uploads/%Y/%m/", storage=sources_storage, blank=True, null=True)
+    file_sha256 = models.CharField(max_length=64, blank=True, db_index=True)  # content address of `file` (services/filestore.py)
     original_filename = models.CharField(max_length=255, blank=True)
     custom_text = models.TextField(blank=True, default="")
+    sheet_key_column = models.CharField(max_length=120, blank=True)  # sheets: header identifying a row on re-upload
+    text_blob = models.ForeignKey(TextBlob, on_delete=models.SET_NULL, null=True, blank=True, related_name="+")  # documents
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -63,10 +93,17 @@ class DataSource(models.Model):
 class DataSourcePage(models.Model):
     STATUS_CHOICES = [
         ("pending", "Pending"),
+        ("retry", "Retrying"),
         ("done", "Done"),
         ("failed", "Failed"),
         ("skipped", "Skipped"),
     ]
+    FETCH_STATUS_CHOICES = [
+        ("", "Not fetched"),
+        ("fetching", "Fetching"),
+        ("fetched", "Fetched"),
+        ("failed", "Failed"),
+    ]
     CATEGORY_CHOICES = [
         ("blog", "Blog"),
         ("product", "Product"),
@@ -82,7 +119,28 @@ class DataSourcePage(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
     summary = models.TextField(blank=True)
     error = models.CharField(max_length=300, blank=True)
+    attempts = models.IntegerField(default=0)
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
     preview = models.JSONField(default=dict, blank=True)
+    importance = models.FloatField(default=0)  # link-graph rank + depth, set at discovery
+
+    # extracted text lives in the blob store; fetch_status="fetched" means
+    # it was (pre)fetched but not summarized yet
+    fetch_status = models.CharField(max_length=20, choices=FETCH_STATUS_CHOICES, blank=True, default="")
+    fetched_at = models.DateTimeField(null=True, blank=True)
+    text_blob = models.ForeignKey(TextBlob, on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    doc_links = models.JSONField(default=list, blank=True)
+
+    # adaptive re-crawl (see services/recrawl.py)
+    next_check_at = models.DateTimeField(null=True, blank=True)
+    check_interval_hours = models.FloatField(default=0)
+    last_checked_at = models.DateTimeField(null=True, blank=True)
+    last_changed_at = models.DateTimeField(null=True, blank=True)
+    check_count = models.IntegerField(default=0)
+    change_count = models.IntegerField(default=0)
+
+    # sheet tabs: bumped by rowstore.sync_sheet_rows whenever the tab's rows change
+    row_generation = models.IntegerField(default=0)
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -93,8 +151,154 @@ class DataSourcePage(models.Model):
         indexes = [
             models.Index(fields=["source", "category", "selected"]),
             models.Index(fields=["source", "status"]),
+            models.Index(fields=["source", "-importance"]),
+            models.Index(fields=["status", "next_check_at"]),
         ]
 
     def __str__(self):
         return self.url
 
+
+class DocumentChunk(models.Model):
+    """
+    Token-bounded, overlapping slice of a document/custom source, with its own
+    lightweight summary + keywords so retrieval isn't limited to the first 20k chars.
+    """
+    source = models.ForeignKey(DataSource, on_delete=models.CASCADE, related_name="chunks")
+    ordinal = models.IntegerField()
+    page_start = models.IntegerField(null=True, blank=True)  # PDFs only
+    page_end = models.IntegerField(null=True, blank=True)
+
+    text = models.TextField()
+    token_count = models.IntegerField(default=0)
+    summary = models.TextField(blank=True, default="")
+    keywords = models.JSONField(default=list, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = [("source", "ordinal")]
+
+    def __str__(self):
+        return f"{self.source_id}#{self.ordinal}"
+
+
+class SheetRow(models.Model):
+    """
+    Every row of an uploaded sheet (not just the 10-row preview), for contact lookup.
+    """
+    source = models.ForeignKey(DataSource, on_delete=models.CASCADE, related_name="sheet_rows")
+    page = models.ForeignKey(DataSourcePage, on_delete=models.CASCADE, related_name="rows")  # the sheet/tab
+    row_number = models.IntegerField()  # 1-based, header excluded
+    values = models.JSONField(default=list)
+    row_key = models.CharField(max_length=255, default="")  # key column value, or the row hash if there is none
+    row_hash = models.CharField(max_length=40, default="")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["page", "row_number"]),
+            models.Index(fields=["page", "row_key"]),
+        ]
+
+
+class SheetRowKey(models.Model):
+    """
+    Inverted index over normalized key columns (name / email / phone / city).
+    """
+    row = models.ForeignKey(SheetRow, on_delete=models.CASCADE, related_name="keys")
+    source = models.ForeignKey(DataSource, on_delete=models.CASCADE, related_name="+")
+    column = models.CharField(max_length=10)  # key kind: name/email/phone/city
+    value = models.CharField(max_length=255)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["source", "value"]),
+            models.Index(fields=["value"]),
+        ]
+
+
+class CrawlHost(models.Model):
+    """
+    Per-host politeness state shared by every worker (see services/politeness.py).
+    """
+    host = models.CharField(max_length=255, unique=True)
+
+    max_concurrent = models.IntegerField(default=2)
+    min_delay_seconds = models.FloatField(default=0.5)
+    crawl_delay_seconds = models.FloatField(default=0)  # robots.txt Crawl-delay
+    robots_checked_at = models.DateTimeField(null=True, blank=True)
+
+    next_allowed_at = models.DateTimeField(null=True, blank=True)
+    backoff_until = models.DateTimeField(null=True, blank=True)  # after 429/503
+    backoff_level = models.IntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.host
+
+
+class CrawlLease(models.Model):
+    """
+    One in-flight request against a host. Leases expire so a crashed worker can't hold a slot.
+    """
+    host = models.ForeignKey(CrawlHost, on_delete=models.CASCADE, related_name="leases")
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+
+class UploadSession(models.Model):
+    """
+    A resumable chunked upload (see services/uploads.py). Bytes are appended to a temp
+    file on disk; once `received == size` and the client's sha256 matches, a source form claims it.
+    """
+    STATUS_CHOICES = [
+        ("uploading", "Uploading"),
+        ("complete", "Complete"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="upload_sessions")
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    sha256 = models.CharField(max_length=64)  # hex digest computed by the client
+    received = models.BigIntegerField(default=0)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="uploading")
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "sha256"]),
+        ]
+
+    @property
+    def temp_path(self):
+        return os.path.join(settings.UPLOAD_TEMP_DIR, f"{self.id}.part")
+
+    def __str__(self):
+        return f"{self.filename} ({self.received}/{self.size})"
+
+
+class TagIndexEvent(models.Model):
+    """
+    Tag change journal for the in-memory tag indexes (services/tagindex.py):
+    every process that holds an index replays the events it hasn't seen yet.
+    kind "page" = one page; kind "source" = the source and all its pages.
+    """
+    KIND_CHOICES = [
+        ("page", "Page"),
+        ("source", "Source"),
+    ]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+")
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "id"]),
+            models.Index(fields=["created_at"]),
+        ]
@@ -0,0 +1,90 @@
+# sources/services/blobs.py
+import hashlib
+import re
+import unicodedata
+import zlib
+
+from sources.models import TextBlob
+
+ZLIB_LEVEL = 6
+
+
+def normalize_text(text: str) -> str:
+    text = unicodedata.normalize("NFC", text or "")
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def text_sha256(text: str) -> str:
+    """
+    Content address of text as stored: always the hash of the normalized form,
+    so raw and stored text can be compared by hash.
+    """
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def put_text(text: str):
+    """
+    Store normalized text once (deduped by hash). Returns the TextBlob, or None for empty text.
+    """
+    text = normalize_text(text)
+    if not text:
+        return None
+
+    digest = text_sha256(text)
+    blob, _ = TextBlob.objects.get_or_create(
+        sha256=digest,
+        defaults={
+            "codec": "zlib",
+            "raw_size": len(text),
+            "data": zlib.compress(text.encode("utf-8"), ZLIB_LEVEL),
+        },
+    )
+    return blob
+
+
+class TextBlobWriter:
+    """
+    Builds a TextBlob from text pieces as they stream in: each piece is normalized, hashed
+    and compressed on arrival, so only the compressed bytes (and a short head) stay in memory.
+    save() stores the same blob put_text(" ".join(pieces)) would.
+    """
+
+    def __init__(self, head_chars: int = 0):
+        self._sha = hashlib.sha256()
+        self._zlib = zlib.compressobj(ZLIB_LEVEL)
+        self._parts = []
+        self.size = 0
+        self.head_chars = head_chars
+        self.head = ""      # first head_chars of the normalized text (e.g. for a summary prompt)
+
+    def write(self, text: str):
+        text = normalize_text(text)
+        if not text:
+            return
+        if self.size:
+            text = " " + text
+        data = text.encode("utf-8")
+        self._sha.update(data)
+        self._parts.append(self._zlib.compress(data))
+        self.size += len(text)
+        if len(self.head) < self.head_chars:
+            self.head += text[:self.head_chars - len(self.head)]
+
+    def save(self):
+        if not self.size:
+            return None
+        self._parts.append(self._zlib.flush())
+        blob, _ = TextBlob.objects.get_or_create(
+            sha256=self._sha.hexdigest(),
+            defaults={"codec": "zlib", "raw_size": self.size, "data": b"".join(self._parts)},
+        )
+        return blob
+
+
+def get_text(blob) -> str:
+    if blob is None:
+        return ""
+    data = bytes(blob.data)
+    if blob.codec == "zlib":
+        return zlib.decompress(data).decode("utf-8")
+    raise ValueError(f"Unknown blob codec: {blob.codec}")
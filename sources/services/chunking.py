@@ -0,0 +1,125 @@
+# sources/services/chunking.py
+import re
+
+from sources.models import DocumentChunk
+from sources.services.scrape import summarize_chunks_with_openai
+from sources.services.tagging import fallback_keywords
+
+CHUNK_MAX_TOKENS = 350
+CHUNK_OVERLAP_TOKENS = 50
+SUMMARY_BATCH_SIZE = 8   # chunks per LLM call (and per bulk insert)
+
+SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def approx_tokens(text: str) -> int:
+    # words + punctuation is within ~10-20% of BPE counts for English prose
+    return len(TOKEN_RE.findall(text or ""))
+
+
+def _units(page_no, text: str, max_tokens: int):
+    """
+    Sentence-sized units (long sentences are split on words) tagged with their page.
+    """
+    for sentence in SENTENCE_RE.split(text or ""):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        n = approx_tokens(sentence)
+        if n <= max_tokens:
+            yield page_no, sentence, n
+            continue
+        words = sentence.split()
+        step = max(max_tokens // 2, 1)
+        for i in range(0, len(words), step):
+            part = " ".join(words[i:i + step])
+            yield page_no, part, approx_tokens(part)
+
+
+def chunk_pages(pages, max_tokens: int = CHUNK_MAX_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS):
+    """
+    pages: iterable of (page_number or None, text).
+    Yields {"text", "page_start", "page_end", "token_count"}; consecutive chunks
+    share ~overlap_tokens of trailing sentences so answers at a boundary aren't lost.
+    The overlap never includes a chunk's first sentence (so no chunk repeats the
+    previous one) and never pushes the next chunk past max_tokens.
+    """
+    window = []   # [(page_no, sentence, tokens)]
+    size = 0
+
+    def emit():
+        pages_seen = [p for p, _, _ in window if p is not None]
+        return {
+            "text": " ".join(s for _, s, _ in window),
+            "page_start": min(pages_seen) if pages_seen else None,
+            "page_end": max(pages_seen) if pages_seen else None,
+            "token_count": size,
+        }
+
+    for page_no, text in pages:
+        for unit in _units(page_no, text, max_tokens):
+            if window and size + unit[2] > max_tokens:
+                yield emit()
+                # carry the tail over as overlap
+                carry, carried = [], 0
+                for u in reversed(window[1:]):
+                    if carried + u[2] > overlap_tokens or carried + u[2] + unit[2] > max_tokens:
+                        break
+                    carry.insert(0, u)
+                    carried += u[2]
+                window, size = carry, carried
+            window.append(unit)
+            size += unit[2]
+
+    if window:
+        yield emit()
+
+
+def _summarize_batch(source_name: str, batch: list[dict]) -> list[dict]:
+    try:
+        return summarize_chunks_with_openai(source_name, [c["text"] for c in batch])
+    except Exception:
+        # cheap local fallback: lead sentence + frequency keywords
+        return [
+            {"summary": SENTENCE_RE.split(c["text"], maxsplit=1)[0][:300], "keywords": fallback_keywords(c["text"], max_tags=6)}
+            for c in batch
+        ]
+
+
+def ingest_chunks(src, pages) -> int:
+    """
+    Replace src's chunks from (page_number, text) pages. Works batch by batch
+    (summarize -> bulk insert), so memory doesn't grow with document size.
+    """
+    DocumentChunk.objects.filter(source=src).delete()
+
+    ordinal = 0
+    batch = []
+
+    def flush():
+        nonlocal ordinal
+        meta = _summarize_batch(src.name, batch)
+        rows = []
+        for c, m in zip(batch, meta):
+            rows.append(DocumentChunk(
+                source=src,
+                ordinal=ordinal,
+                page_start=c["page_start"],
+                page_end=c["page_end"],
+                text=c["text"],
+                token_count=c["token_count"],
+                summary=m["summary"],
+                keywords=m["keywords"],
+            ))
+            ordinal += 1
+        DocumentChunk.objects.bulk_create(rows)
+        batch.clear()
+
+    for chunk in chunk_pages(pages):
+        batch.append(chunk)
+        if len(batch) >= SUMMARY_BATCH_SIZE:
+            flush()
+    if batch:
+        flush()
+    return ordinal
@@ -1,12 +1,31 @@
 import re
+import time
 from collections import deque
 from urllib.parse import urljoin, urlparse
 
-import requests
 from bs4 import BeautifulSoup
 
+from sources.services.politeness import HostBusy, polite_get
+
 SITEMAP_PATHS = ["/sitemap.xml", "/sitemap_index.xml"]
 
+# How much of a sitemap we read before ranking (sitemaps can list 50k+ URLs)
+SITEMAP_SCAN_FACTOR = 20
+
+PAGERANK_DAMPING = 0.85
+PAGERANK_ITERATIONS = 30
+PAGERANK_TOLERANCE = 1e-6
+
+# importance = RANK_WEIGHT * normalized pagerank + DEPTH_WEIGHT * 1/(1+depth)
+RANK_WEIGHT = 0.7
+DEPTH_WEIGHT = 0.3
+
+# The user waits on discovery before picking pages: past this budget it stops waiting on
+# per-host delays and ranks what it has (the worker fetches pages politely later)
+DISCOVERY_BUDGET_SECONDS = 20
+
+ASSET_RE = re.compile(r"\.(png|jpg|jpeg|gif|webp|svg|pdf|zip)$", re.I)
+
 def _same_domain(base: str, url: str) -> bool:
     return urlparse(base).netloc == urlparse(url).netloc
 
@@ -14,44 +33,128 @@ def _clean_url(url: str) -> str:
     url = url.split("#")[0]
     return url.rstrip("/")
 
-def discover_urls(domain_url: str, max_urls: int = 300, timeout: int = 10) -> list[str]:
-    urls = []
-    seen = set()
+def _path_depth(url: str) -> int:
+    return len([s for s in (urlparse(url).path or "").split("/") if s])
+
+
+def _fetch(url: str, timeout: int, deadline: float):
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise HostBusy("Discovery time budget spent")
+    return polite_get(url, timeout=min(timeout, max(remaining, 1)), max_wait=remaining)
+
+
+def pagerank(graph: dict[str, set[str]]) -> dict[str, float]:
+    """
+    Plain power-iteration PageRank over an adjacency dict {url: {linked urls}}.
+    Dangling pages spread their rank evenly (standard teleport fix).
+    """
+    nodes = set(graph)
+    for targets in graph.values():
+        nodes.update(targets)
+    n = len(nodes)
+    if n == 0:
+        return {}
+
+    rank = {u: 1.0 / n for u in nodes}
+    base = (1.0 - PAGERANK_DAMPING) / n
+
+    for _ in range(PAGERANK_ITERATIONS):
+        dangling = sum(rank[u] for u in nodes if not graph.get(u))
+        nxt = {u: base + PAGERANK_DAMPING * dangling / n for u in nodes}
+        for u, targets in graph.items():
+            if not targets:
+                continue
+            share = PAGERANK_DAMPING * rank[u] / len(targets)
+            for v in targets:
+                nxt[v] += share
+        delta = sum(abs(nxt[u] - rank[u]) for u in nodes)
+        rank = nxt
+        if delta < PAGERANK_TOLERANCE:
+            break
+    return rank
+
+
+def score_urls(graph: dict[str, set[str]], depths: dict[str, int]) -> dict[str, float]:
+    """
+    Combine link-graph rank and click depth into one 0..1 importance score.
+    """
+    ranks = pagerank(graph)
+    top = max(ranks.values(), default=0.0) or 1.0
+    scores = {}
+    for u in set(ranks) | set(depths):
+        depth = depths.get(u, _path_depth(u))
+        scores[u] = RANK_WEIGHT * (ranks.get(u, 0.0) / top) + DEPTH_WEIGHT / (1 + depth)
+    return scores
+
+
+def _top_ranked(scores: dict[str, float], max_urls: int) -> list[tuple[str, float]]:
+    ranked = sorted(scores.items(), key=lambda x: (-x[1], x[0]))
+    return [(u, round(s, 6)) for u, s in ranked[:max_urls]]
+
+
+def _ranked_from_sitemap(domain_url: str, max_urls: int, timeout: int, deadline: float) -> list[tuple[str, float]]:
+    """
+    Sitemaps carry no link graph, so rank by <priority> (when present) and path depth.
+    """
+    scan_limit = max_urls * SITEMAP_SCAN_FACTOR
 
-    # 1) Try sitemap(s)
     for path in SITEMAP_PATHS:
         sm_url = urljoin(domain_url + "/", path.lstrip("/"))
         try:
-            r = requests.get(sm_url, timeout=timeout, headers={"User-Agent": "MiraBot/0.1"})
+            r = _fetch(sm_url, timeout, deadline)
             if r.status_code >= 400 or "xml" not in (r.headers.get("Content-Type", "").lower()):
                 continue
             soup = BeautifulSoup(r.text, "xml")
-            locs = [loc.get_text(strip=True) for loc in soup.find_all("loc")]
-            for u in locs:
-                u = _clean_url(u)
-                if u and _same_domain(domain_url, u) and u not in seen:
-                    seen.add(u)
-                    urls.append(u)
-                    if len(urls) >= max_urls:
-                        return urls
-            if urls:
-                return urls
+
+            scores = {}
+            for entry in soup.find_all("url") or soup.find_all("sitemap"):
+                loc = entry.find("loc")
+                if loc is None:
+                    continue
+                u = _clean_url(loc.get_text(strip=True))
+                if not u or not _same_domain(domain_url, u) or u in scores:
+                    continue
+                try:
+                    priority = float(entry.find("priority").get_text(strip=True))
+                except Exception:
+                    priority = 0.5
+                scores[u] = RANK_WEIGHT * min(max(priority, 0.0), 1.0) + DEPTH_WEIGHT / (1 + _path_depth(u))
+                if len(scores) >= scan_limit:
+                    break
+
+            if scores:
+                return _top_ranked(scores, max_urls)
+        except HostBusy:
+            break
         except Exception:
             continue
+    return []
 
-    # 2) Fallback: crawl from homepage
-    q = deque([domain_url])
-    seen.add(domain_url)
 
-    while q and len(urls) < max_urls:
+def _ranked_from_crawl(domain_url: str, max_urls: int, timeout: int, deadline: float) -> list[tuple[str, float]]:
+    """
+    BFS from the homepage (fetching at most max_urls pages) while recording the link graph.
+    Linked-but-unfetched URLs are candidates too; the cap keeps the highest-ranked ones.
+    """
+    start = _clean_url(domain_url)
+    q = deque([start])
+    depths = {start: 0}
+    graph: dict[str, set[str]] = {}
+    dead = set()
+    fetched = 0
+
+    while q and fetched < max_urls:
         current = q.popleft()
         try:
-            r = requests.get(current, timeout=timeout, headers={"User-Agent": "MiraBot/0.1"})
+            r = _fetch(current, timeout, deadline)
             if r.status_code >= 400:
+                dead.add(current)
                 continue
-            urls.append(_clean_url(current))
+            fetched += 1
             soup = BeautifulSoup(r.text, "lxml")
 
+            links = set()
             for a in soup.select("a[href]"):
                 href = a.get("href", "").strip()
                 if not href:
@@ -64,12 +167,44 @@ def discover_urls(domain_url: str, max_urls: int = 300, timeout: int = 10) -> li
                 if not _same_domain(domain_url, nxt):
                     continue
                 # skip obvious asset links
-                if re.search(r"\.(png|jpg|jpeg|gif|webp|svg|pdf|zip)$", nxt, re.I):
+                if ASSET_RE.search(nxt):
+                    continue
+                if nxt == current:
                     continue
-                if nxt not in seen:
-                    seen.add(nxt)
+                links.add(nxt)
+                if nxt not in depths:
+                    depths[nxt] = depths[current] + 1
                     q.append(nxt)
+            graph[current] = links
+        except HostBusy:
+            break  # out of time: rank the graph seen so far
         except Exception:
+            dead.add(current)
             continue
 
-    return urls
+    scores = score_urls(graph, depths)
+    for u in dead:
+        scores.pop(u, None)
+    return _top_ranked(scores, max_urls)
+
+
+def discover_ranked_urls(
+    domain_url: str, max_urls: int = 300, timeout: int = 10, budget_seconds: float = DISCOVERY_BUDGET_SECONDS
+) -> list[tuple[str, float]]:
+    """
+    Returns [(url, importance)] sorted by importance (highest first), capped at max_urls.
+    Spends at most about budget_seconds, including politeness waits.
+    """
+    deadline = time.monotonic() + budget_seconds
+
+    # 1) Try sitemap(s)
+    ranked = _ranked_from_sitemap(domain_url, max_urls, timeout, deadline)
+    if ranked:
+        return ranked
+
+    # 2) Fallback: crawl from homepage
+    return _ranked_from_crawl(domain_url, max_urls, timeout, deadline)
+
+
+def discover_urls(domain_url: str, max_urls: int = 300, timeout: int = 10) -> list[str]:
+    return [u for u, _ in discover_ranked_urls(domain_url, max_urls=max_urls, timeout=timeout)]
@@ -1,10 +1,25 @@
 # sources/services/documents.py
+import os
 import re
+import signal
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
 from pypdf import PdfReader
 from docx import Document as DocxDocument
 
 URL_RE = re.compile(r"https?://[^\s\)\]\}<>\"']+")
 
+PDF_PAGES_PER_TASK = 8          # pages handed to one pool task
+PDF_PARALLEL_MIN_PAGES = 16     # below this the pool costs more than it saves
+PDF_MAX_WORKERS = min(4, os.cpu_count() or 1)
+PDF_PAGE_TIMEOUT_SECONDS = 20   # pathological pages (huge vector art, broken streams) get skipped
+
+
+class _PageTimeout(Exception):
+    pass
+
+
 def _clean_text(t: str) -> str:
     t = re.sub(r"\s+", " ", (t or "")).strip()
     return t
@@ -22,19 +37,84 @@ def extract_urls(text: str, limit: int = 10) -> list[str]:
             break
     return out
 
-def extract_text_from_pdf(path: str, max_chars: int = 60000) -> str:
+
+def _on_alarm(signum, frame):
+    raise _PageTimeout()
+
+
+def _extract_page(page, timeout: float) -> str:
+    # SIGALRM only works on the main thread (true for pool workers and the job runner)
+    use_alarm = timeout and hasattr(signal, "setitimer") and threading.current_thread() is threading.main_thread()
+    if use_alarm:
+        previous = signal.signal(signal.SIGALRM, _on_alarm)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return _clean_text(page.extract_text() or "")
+    except Exception:
+        return ""
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous)
+
+
+def _extract_page_range(path: str, start: int, stop: int, timeout: float) -> list[tuple[int, str]]:
+    """
+    Pool task: open the PDF in this process and extract pages [start, stop).
+    Returns [(page_number (1-based), text)].
+    """
     reader = PdfReader(path)
+    return [(i + 1, _extract_page(reader.pages[i], timeout)) for i in range(start, stop)]
+
+
+def iter_pdf_pages(path: str, page_timeout: float = PDF_PAGE_TIMEOUT_SECONDS, max_workers: int = PDF_MAX_WORKERS):
+    """
+    Yields (page_number, text) in page order.
+    Large PDFs fan page ranges out over a process pool; only a small window of
+    ranges is in flight at once, so memory stays bounded whatever the page count.
+    """
+    total = len(PdfReader(path).pages)
+
+    if total < PDF_PARALLEL_MIN_PAGES or max_workers <= 1:
+        for item in _extract_page_range(path, 0, total, page_timeout):
+            yield item
+        return
+
+    ranges = [(s, min(s + PDF_PAGES_PER_TASK, total)) for s in range(0, total, PDF_PAGES_PER_TASK)]
+    window = max_workers * 2
+
+    pool = ProcessPoolExecutor(max_workers=max_workers)
+    try:
+        futures = []
+        next_range = 0
+        while next_range < len(ranges) or futures:
+            while next_range < len(ranges) and len(futures) < window:
+                s, e = ranges[next_range]
+                futures.append(pool.submit(_extract_page_range, path, s, e, page_timeout))
+                next_range += 1
+            # results stay in page order: always wait on the oldest range
+            for item in futures.pop(0).result():
+                yield item
+    finally:
+        # also runs when the caller stops early (max_chars reached)
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def extract_text_from_pdf(path: str, max_chars: int | None = 60000) -> str:
     parts = []
-    for page in reader.pages:
-        try:
-            parts.append(page.extract_text() or "")
-        except Exception:
+    total = 0
+    for _, text in iter_pdf_pages(path):
+        if not text:
             continue
-        if sum(len(p) for p in parts) >= max_chars:
+        parts.append(text)
+        total += len(text) + 1
+        if max_chars and total >= max_chars:
             break
-    return _clean_text(" ".join(parts))[:max_chars]
+    text = " ".join(parts)
+    return text[:max_chars] if max_chars else text
 
-def extract_text_from_docx(path: str, max_chars: int = 60000) -> str:
+def extract_text_from_docx(path: str, max_chars: int | None = 60000) -> str:
     doc = DocxDocument(path)
     parts = [p.text for p in doc.paragraphs if (p.text or "").strip()]
-    return _clean_text(" ".join(parts))[:max_chars]
+    text = _clean_text(" ".join(parts))
+    return text[:max_chars] if max_chars else text
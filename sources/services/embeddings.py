@@ -0,0 +1,95 @@
+# sources/services/embeddings.py
+import os
+import re
+import zlib
+
+import numpy as np
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from sources.services.tagging import get_openai_client
+
+EMBED_BATCH_SIZE = 64   # texts per embedding call
+EMBED_MAX_CHARS = 8000
+
+WORD_RE = re.compile(r"[^\W_]+")
+
+
+def _normalize(m: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(m, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (m / norms).astype(np.float32)
+
+
+class HashingEmbedder:
+    """
+    Offline embedder: signed feature hashing of words and word bigrams into `dim` buckets.
+    Lexical rather than semantic, but free, deterministic and fast (no network).
+    """
+    name = "hashing-256"
+    dim = 256
+
+    def _features(self, text: str):
+        words = WORD_RE.findall((text or "").lower()[:EMBED_MAX_CHARS])
+        for w in words:
+            yield w, 1.0
+        for a, b in zip(words, words[1:]):
+            yield f"{a} {b}", 0.5
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feat, weight in self._features(text):
+                h = zlib.crc32(feat.encode("utf-8"))  # stable across processes, unlike hash()
+                out[row, h % self.dim] += weight if (h & 0x80000000) else -weight
+        return _normalize(out)
+
+
+class OpenAIEmbedder:
+    """
+    OpenAI embeddings (one API call per batch).
+    """
+    def __init__(self):
+        self.model = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-small")
+        self.dim = int(os.getenv("OPENAI_EMBEDDING_DIM", "1536"))
+        self.name = f"openai-{self.model}-{self.dim}"
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        resp = get_openai_client().embeddings.create(
+            model=self.model,
+            input=[(t or " ")[:EMBED_MAX_CHARS] for t in texts],
+            dimensions=self.dim,
+        )
+        return _normalize(np.array([d.embedding for d in resp.data], dtype=np.float32))
+
+
+EMBEDDERS = {
+    "hashing": HashingEmbedder,
+    "openai": OpenAIEmbedder,
+}
+
+_embedder = None
+
+
+def get_embedder():
+    """
+    settings.EMBEDDING_BACKEND: "hashing", "openai" or a dotted path to a class with
+    name / dim / embed(texts) -> (n, dim) L2-normalized float32 matrix.
+    """
+    global _embedder
+    if _embedder is None:
+        backend = settings.EMBEDDING_BACKEND
+        cls = EMBEDDERS.get(backend) or import_string(backend)
+        _embedder = cls()
+    return _embedder
+
+
+def embed_texts(texts: list[str], embedder=None) -> np.ndarray:
+    """
+    Embed in EMBED_BATCH_SIZE batches (one provider call each).
+    """
+    embedder = embedder or get_embedder()
+    if not texts:
+        return np.zeros((0, embedder.dim), dtype=np.float32)
+    parts = [embedder.embed(texts[i:i + EMBED_BATCH_SIZE]) for i in range(0, len(texts), EMBED_BATCH_SIZE)]
+    return np.vstack(parts)
@@ -0,0 +1,126 @@
+# sources/services/filestore.py
+import hashlib
+import os
+
+from django.db import transaction
+
+from sources.models import DataSource, DataSourcePage, DocumentChunk
+
+CAS_PREFIX = "sources/cas"
+COPY_BATCH_SIZE = 500
+
+
+def file_sha256(f) -> str:
+    session = getattr(f, "upload_session", None)
+    if session is not None:
+        return session.sha256  # already verified against the bytes by finish_upload
+    h = hashlib.sha256()
+    for chunk in f.chunks():
+        h.update(chunk)
+    f.seek(0)
+    return h.hexdigest()
+
+
+def cas_name(sha256: str, filename: str) -> str:
+    ext = os.path.splitext(filename or "")[1].lower()[:10]
+    return f"{CAS_PREFIX}/{sha256[:2]}/{sha256[2:4]}/{sha256}{ext}"
+
+
+def store_file(src: DataSource, f):
+    """
+    Point src.file at the content-addressed copy of f, writing it only if these bytes
+    were never stored before. Sets file / original_filename / file_sha256 (caller saves).
+
+    The backend creates files exclusively and renames on a clash, so when a concurrent
+    upload of the same bytes wins the race, ours lands under a suffixed name: that copy
+    is dropped and the existing one used, keeping one file per content hash.
+    """
+    sha = file_sha256(f)
+    name = cas_name(sha, f.name)
+    storage = src.file.storage
+    if not storage.exists(name):
+        saved = storage.save(name, f)
+        if saved != name:
+            storage.delete(saved)
+    src.file.name = name
+    src.original_filename = os.path.basename(f.name or "")
+    src.file_sha256 = sha
+
+
+def delete_file_if_unused(name: str, storage):
+    """
+    Stored files are shared between sources with the same content: only the last user removes it.
+    """
+    if name and not DataSource.objects.filter(file=name).exists():
+        storage.delete(name)
+
+
+def find_processed(src: DataSource):
+    """
+    A finished source of the same user and type built from the exact same bytes, if any.
+    """
+    if not src.file_sha256:
+        return None
+    return (
+        DataSource.objects.filter(
+            user_id=src.user_id,
+            source_type=src.source_type,
+            file_sha256=src.file_sha256,
+            status="done",
+        )
+        .exclude(pk=src.pk)
+        .exclude(summary="")
+        .order_by("-updated_at")
+        .first()
+    )
+
+
+@transaction.atomic
+def reuse_document(src: DataSource, donor: DataSource):
+    """
+    Copy extracted text, chunks, summary and tags from donor: src is done without any parsing or LLM calls.
+    """
+    src.text_blob_id = donor.text_blob_id
+    src.summary = donor.summary
+    src.processed_pages = src.selected_pages
+    src.status = "done"
+    src.error_message = ""
+    src.save(update_fields=["text_blob", "summary", "processed_pages", "status", "error_message"])
+    src.tags.set(donor.tags.all())
+
+    DataSourcePage.objects.filter(source=src).update(summary=donor.summary, status="done", error="")
+
+    batch = []
+    for c in donor.chunks.order_by("ordinal").iterator(chunk_size=COPY_BATCH_SIZE):
+        c.pk = None
+        c.source = src
+        batch.append(c)
+        if len(batch) >= COPY_BATCH_SIZE:
+            DocumentChunk.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        DocumentChunk.objects.bulk_create(batch)
+
+
+@transaction.atomic
+def reuse_sheet(src: DataSource, donor: DataSource):
+    """
+    Copy summary, tags and the per-sheet pages (headers, previews) from donor.
+    The worker still loads the rows into src's row store, but with the schema
+    unchanged and a summary present it skips the LLM entirely.
+    """
+    src.summary = donor.summary
+    src.save(update_fields=["summary"])
+    src.tags.set(donor.tags.all())
+
+    DataSourcePage.objects.bulk_create([
+        DataSourcePage(
+            source=src,
+            url=pg.url,
+            category=pg.category,
+            selected=pg.selected,
+            status="pending",
+            preview=pg.preview,
+        )
+        for pg in donor.pages.order_by("id")
+    ])
@@ -0,0 +1,136 @@
+# sources/services/html_extract.py
+import re
+from urllib.parse import urljoin
+
+from lxml import etree
+
+DOC_EXTENSIONS = (".pdf", ".doc", ".docx", ".ppt", ".pptx", ".xls", ".xlsx")
+SKIP_TAGS = {"script", "style", "noscript", "svg"}
+WS_RE = re.compile(r"\s+")
+
+
+class _PageCollector:
+    """
+    lxml parser target: gets SAX-style events while the HTML is parsed,
+    so visible text, document links and metadata come out of a single pass
+    without ever building a tree.
+    """
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+        self.skip_depth = 0
+        self.buf = []
+        self.chunks = []
+        self.doc_links = []
+        self.meta = {}
+        self.in_title = False
+        self.in_h1 = False
+        self.title_parts = []
+        self.h1_parts = []
+
+    def _flush(self):
+        # one flushed buffer == one text node (lxml may split a node across data() calls)
+        if self.buf:
+            s = "".join(self.buf).strip()
+            if s:
+                self.chunks.append(s)
+            self.buf = []
+
+    def start(self, tag, attrib):
+        self._flush()
+        if tag in SKIP_TAGS:
+            self.skip_depth += 1
+
+        # links are collected even inside <noscript>/<svg>, like soup.select("a[href]")
+        if tag == "a":
+            href = (attrib.get("href") or "").strip()
+            if href:
+                abs_url = urljoin(self.base_url, href)
+                if abs_url.lower().split("?")[0].endswith(DOC_EXTENSIONS):
+                    self.doc_links.append(abs_url)
+        elif tag == "meta":
+            key = (attrib.get("property") or attrib.get("name") or "").lower()
+            content = (attrib.get("content") or "").strip()
+            if content and key in ("description", "og:title", "og:description", "og:image"):
+                self.meta.setdefault(key, content)
+        elif tag == "link":
+            if "canonical" in (attrib.get("rel") or "").lower().split() and attrib.get("href"):
+                self.meta.setdefault("canonical", urljoin(self.base_url, attrib["href"]))
+        elif tag == "title":
+            self.in_title = True
+        elif tag == "h1":
+            self.in_h1 = True
+
+    def end(self, tag):
+        self._flush()
+        if tag in SKIP_TAGS and self.skip_depth:
+            self.skip_depth -= 1
+        elif tag == "title":
+            self.in_title = False
+        elif tag == "h1":
+            self.in_h1 = False
+
+    def data(self, data):
+        if self.skip_depth:
+            return
+        self.buf.append(data)
+        if self.in_title:
+            self.title_parts.append(data)
+        if self.in_h1 and not self.meta.get("h1"):
+            self.h1_parts.append(data)
+
+    def comment(self, text):
+        pass
+
+    def close(self):
+        self._flush()
+        text = WS_RE.sub(" ", " ".join(self.chunks)).strip()
+
+        title = WS_RE.sub(" ", "".join(self.title_parts)).strip()
+        h1 = WS_RE.sub(" ", "".join(self.h1_parts)).strip()
+        image = self.meta.get("og:image", "")
+        meta = {
+            "title": self.meta.get("og:title") or title or h1,
+            "description": self.meta.get("description") or self.meta.get("og:description", ""),
+            "image": urljoin(self.base_url, image) if image else "",
+            "canonical": self.meta.get("canonical", ""),
+        }
+        return {
+            "text": text,
+            "doc_links": list(dict.fromkeys(self.doc_links)),
+            "meta": {k: v for k, v in meta.items() if v},
+        }
+
+
+def extract_html(html: str, base_url: str) -> dict:
+    """
+    One-pass extraction -> {"text", "doc_links", "meta": {title, description, image, canonical}}.
+    """
+    parser = etree.HTMLParser(target=_PageCollector(base_url), recover=True, remove_comments=True)
+    parser.feed(html or " ")
+    return parser.close()
+
+
+def extract_html_bs4(html: str, base_url: str) -> dict:
+    """
+    Previous BeautifulSoup implementation, kept as the reference for bench_extract.
+    """
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "lxml")
+
+    doc_links = []
+    for a in soup.select("a[href]"):
+        href = (a.get("href") or "").strip()
+        if not href:
+            continue
+        abs_url = urljoin(base_url, href)
+        if abs_url.lower().split("?")[0].endswith(DOC_EXTENSIONS):
+            doc_links.append(abs_url)
+
+    for tag in soup(["script", "style", "noscript", "svg"]):
+        tag.decompose()
+
+    text = soup.get_text(separator=" ", strip=True)
+    text = WS_RE.sub(" ", text).strip()
+    return {"text": text, "doc_links": list(dict.fromkeys(doc_links)), "meta": {}}
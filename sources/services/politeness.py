@@ -0,0 +1,157 @@
+# sources/services/politeness.py
+import time
+from datetime import timedelta
+from urllib.parse import urlparse
+from urllib.robotparser import RobotFileParser
+
+import requests
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from sources.models import CrawlHost, CrawlLease
+
+USER_AGENT = "MiraBot/0.1"
+
+LEASE_SECONDS = 120             # a request holding a slot longer than this is presumed dead
+MAX_WAIT_SECONDS = 300          # give up waiting for a slot (raises a transient error)
+ROBOTS_TTL = timedelta(hours=24)
+MAX_CRAWL_DELAY_SECONDS = 60    # don't let a robots.txt stall us forever
+
+BACKOFF_STATUS = {429, 503}
+BACKOFF_BASE_SECONDS = 10
+BACKOFF_MAX_SECONDS = 15 * 60
+MAX_MIN_DELAY_SECONDS = 30
+
+
+class HostBusy(TimeoutError):
+    """No slot freed up for this host in time (treated as transient by services/retry.py)."""
+
+
+def host_of(url: str) -> str:
+    return (urlparse(url).netloc or "").lower()
+
+
+def _load_robots_delay(host: str, scheme: str) -> float:
+    try:
+        r = requests.get(f"{scheme}://{host}/robots.txt", timeout=10, headers={"User-Agent": USER_AGENT})
+        if r.status_code >= 400:
+            return 0.0
+        rp = RobotFileParser()
+        rp.parse(r.text.splitlines())
+        delay = rp.crawl_delay(USER_AGENT)
+        if delay is None:
+            rate = rp.request_rate(USER_AGENT)
+            delay = (rate.seconds / rate.requests) if rate and rate.requests else 0
+        return min(float(delay or 0), MAX_CRAWL_DELAY_SECONDS)
+    except Exception:
+        return 0.0
+
+
+def _get_host(url: str) -> CrawlHost:
+    host = host_of(url)
+    row, _ = CrawlHost.objects.get_or_create(
+        host=host,
+        defaults={
+            "max_concurrent": settings.CRAWL_MAX_CONCURRENT_PER_HOST,
+            "min_delay_seconds": settings.CRAWL_MIN_DELAY_SECONDS,
+        },
+    )
+    now = timezone.now()
+    if row.robots_checked_at is None or row.robots_checked_at < now - ROBOTS_TTL:
+        delay = _load_robots_delay(host, urlparse(url).scheme or "https")
+        CrawlHost.objects.filter(pk=row.pk).update(crawl_delay_seconds=delay, robots_checked_at=now)
+        row.crawl_delay_seconds = delay
+    return row
+
+
+def acquire(row: CrawlHost, max_wait: float = MAX_WAIT_SECONDS) -> int:
+    """
+    Block until this host has a free slot and its minimum delay has passed. Returns a lease id.
+
+    The slot is claimed with one conditional UPDATE (gate passed and fewer live leases than
+    max_concurrent), which is atomic on every backend; select_for_update is a no-op on SQLite.
+    """
+    deadline = time.monotonic() + max_wait
+    while True:
+        now = timezone.now()
+        CrawlLease.objects.filter(host_id=row.pk, expires_at__lte=now).delete()
+        h = CrawlHost.objects.get(pk=row.pk)
+        delay = max(h.min_delay_seconds, h.crawl_delay_seconds)
+        live = (
+            CrawlLease.objects.filter(host_id=OuterRef("pk"), expires_at__gt=now)
+            .values("host_id")
+            .annotate(n=Count("pk"))
+            .values("n")
+        )
+        with transaction.atomic():
+            claimed = (
+                CrawlHost.objects.filter(pk=row.pk)
+                .filter(Q(next_allowed_at__isnull=True) | Q(next_allowed_at__lte=now))
+                .filter(Q(backoff_until__isnull=True) | Q(backoff_until__lte=now))
+                .filter(max_concurrent__gt=Coalesce(Subquery(live), 0))
+                .update(next_allowed_at=now + timedelta(seconds=delay), updated_at=now)
+            )
+            if claimed:
+                return CrawlLease.objects.create(host_id=row.pk, expires_at=now + timedelta(seconds=LEASE_SECONDS)).pk
+
+        gate = max([t for t in (h.next_allowed_at, h.backoff_until) if t] or [now])
+        wait = (gate - now).total_seconds() if gate > now else 0.2
+        if time.monotonic() + wait > deadline:
+            raise HostBusy(f"Timed out waiting for a crawl slot on {h.host}")
+        time.sleep(min(max(wait, 0.05), 5))
+
+
+def _retry_after_seconds(value) -> float | None:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None  # HTTP-date form: fall back to our own backoff
+
+
+def release(lease_id: int, status_code: int | None = None, retry_after=None):
+    """
+    Free the slot and feed the response back: 429/503 back the whole host off
+    (honouring Retry-After), successes slowly relax it again.
+    """
+    with transaction.atomic():
+        lease = CrawlLease.objects.select_related("host").filter(pk=lease_id).first()
+        if lease is None:
+            return
+        h = CrawlHost.objects.select_for_update().get(pk=lease.host_id)
+        lease.delete()
+
+        now = timezone.now()
+        if status_code in BACKOFF_STATUS:
+            h.backoff_level += 1
+            seconds = _retry_after_seconds(retry_after)
+            if seconds is None:
+                seconds = BACKOFF_BASE_SECONDS * (2 ** (h.backoff_level - 1))
+            h.backoff_until = now + timedelta(seconds=min(seconds, BACKOFF_MAX_SECONDS))
+            h.min_delay_seconds = min(h.min_delay_seconds * 2, MAX_MIN_DELAY_SECONDS)
+        elif status_code is not None and status_code < 400:
+            h.backoff_level = 0
+            h.min_delay_seconds = max(settings.CRAWL_MIN_DELAY_SECONDS, h.min_delay_seconds * 0.9)
+        else:
+            return
+        h.save(update_fields=["backoff_level", "backoff_until", "min_delay_seconds", "updated_at"])
+
+
+def polite_get(url: str, timeout: int = 10, max_wait: float = MAX_WAIT_SECONDS, **kwargs):
+    """
+    Drop-in for requests.get() that respects per-host concurrency, delay,
+    robots.txt Crawl-delay and 429/503 backoff across all workers.
+    Raises HostBusy rather than waiting longer than max_wait for a slot.
+    """
+    headers = {"User-Agent": USER_AGENT, **(kwargs.pop("headers", None) or {})}
+    row = _get_host(url)
+    lease_id = acquire(row, max_wait=max_wait)
+    try:
+        r = requests.get(url, timeout=timeout, headers=headers, **kwargs)
+    except Exception:
+        release(lease_id)
+        raise
+    release(lease_id, r.status_code, r.headers.get("Retry-After"))
+    return r
@@ -0,0 +1,162 @@
+# sources/services/recrawl.py
+import random
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count
+from django.utils import timezone
+
+from sources.models import DataSourcePage
+from sources.services.blobs import put_text
+from sources.services.scrape import extract_page
+
+# First re-check after ingestion, by page category (hours)
+INITIAL_INTERVAL_HOURS = {
+    "blog": 24,
+    "product": 24,
+    "info": 24 * 7,
+}
+MIN_INTERVAL_HOURS = 6
+MAX_INTERVAL_HOURS = 24 * 30
+
+BACKOFF_FACTOR = 2.0    # unchanged page -> check half as often
+SPEEDUP_FACTOR = 0.5    # changed page -> check twice as often
+JITTER = 0.1            # +-10% so pages ingested together don't stay in lockstep
+OVER_BUDGET_RETRY_HOURS = 6   # pages of a tenant out of daily budget wait this long
+
+
+def _jittered(hours: float) -> timedelta:
+    return timedelta(hours=hours * random.uniform(1 - JITTER, 1 + JITTER))
+
+
+def initial_interval(page) -> float:
+    return float(INITIAL_INTERVAL_HOURS.get(page.category, INITIAL_INTERVAL_HOURS["info"]))
+
+
+def next_interval(page, changed: bool) -> float:
+    """
+    Exponential backoff for pages that keep coming back identical,
+    and a faster cadence for pages that actually change (blogs, product listings).
+    """
+    current = page.check_interval_hours or initial_interval(page)
+    current *= SPEEDUP_FACTOR if changed else BACKOFF_FACTOR
+    return min(max(current, MIN_INTERVAL_HOURS), MAX_INTERVAL_HOURS)
+
+
+def schedule_new_pages(limit: int = 1000) -> int:
+    """
+    Give freshly ingested pages their first check time (no fetching).
+    """
+    pages = list(
+        DataSourcePage.objects.filter(
+            source__source_type="website",
+            source__status="done",
+            selected=True,
+            status="done",
+            next_check_at__isnull=True,
+        ).only("id", "category", "updated_at")[:limit]
+    )
+    for p in pages:
+        p.check_interval_hours = initial_interval(p)
+        p.next_check_at = p.updated_at + _jittered(p.check_interval_hours)
+    DataSourcePage.objects.bulk_update(pages, ["check_interval_hours", "next_check_at"])
+    return len(pages)
+
+
+def remaining_budgets(user_ids) -> dict[int, int]:
+    """
+    Per-tenant crawl budget: pages re-checked in the last 24h count against
+    settings.RECRAWL_DAILY_PAGES_PER_USER.
+    """
+    budget = getattr(settings, "RECRAWL_DAILY_PAGES_PER_USER", 200)
+    since = timezone.now() - timedelta(hours=24)
+    used = dict(
+        DataSourcePage.objects.filter(source__user_id__in=user_ids, last_checked_at__gte=since)
+        .values_list("source__user_id")
+        .annotate(n=Count("id"))
+        .values_list("source__user_id", "n")
+    )
+    return {uid: max(budget - used.get(uid, 0), 0) for uid in user_ids}
+
+
+def _due():
+    return DataSourcePage.objects.filter(
+        source__source_type="website",
+        source__status="done",
+        selected=True,
+        status="done",
+        next_check_at__lte=timezone.now(),
+    )
+
+
+def due_pages(limit: int = 50):
+    """
+    Oldest due pages of tenants that still have crawl budget today, so one tenant's
+    backlog can't fill every batch.
+    """
+    user_ids = set(_due().values_list("source__user_id", flat=True).distinct())
+    exhausted = [uid for uid, left in remaining_budgets(user_ids).items() if left <= 0]
+    return (
+        _due()
+        .exclude(source__user_id__in=exhausted)
+        .select_related("source", "text_blob")
+        .order_by("next_check_at")[:limit]
+    )
+
+
+def postpone_over_budget(pages):
+    """
+    Pages skipped because their tenant ran out of budget mid-pass: not a check, just later.
+    """
+    now = timezone.now()
+    for p in pages:
+        p.next_check_at = now + _jittered(OVER_BUDGET_RETRY_HOURS)
+    DataSourcePage.objects.bulk_update(pages, ["next_check_at"])
+
+
+def check_page(page) -> bool:
+    """
+    Refetch one page and compare its normalized text hash with what we summarized.
+    Changed pages keep their new text and go back to "pending" for re-summarization.
+    """
+    now = timezone.now()
+    extracted = extract_page(page.url)
+    blob = put_text(extracted["text"])
+    # pages ingested before text was stored have nothing to compare: this fetch becomes the baseline
+    baseline = not page.text_blob_id
+    changed = blob is not None and not baseline and blob.sha256 != page.text_blob.sha256
+
+    page.check_interval_hours = next_interval(page, changed)
+    page.next_check_at = now + _jittered(page.check_interval_hours)
+    page.last_checked_at = now
+    page.check_count += 1
+    fields = ["check_interval_hours", "next_check_at", "last_checked_at", "check_count"]
+
+    if baseline and blob is not None:
+        page.text_blob = blob
+        fields.append("text_blob")
+
+    if changed:
+        page.text_blob = blob
+        page.doc_links = extracted["doc_links"]
+        page.preview = extracted["meta"]
+        page.fetched_at = now
+        page.fetch_status = "fetched"   # worker summarizes the stored text, no refetch
+        page.status = "pending"
+        page.last_changed_at = now
+        page.change_count += 1
+        fields += ["text_blob", "doc_links", "preview", "fetched_at", "fetch_status", "status", "last_changed_at", "change_count"]
+
+    page.save(update_fields=fields + ["updated_at"])
+    return changed
+
+
+def postpone_failed_check(page):
+    """
+    Fetch errors during a re-check don't touch the ingested summary; just try later.
+    """
+    now = timezone.now()
+    page.last_checked_at = now
+    page.check_count += 1
+    page.next_check_at = now + _jittered(page.check_interval_hours or initial_interval(page))
+    page.save(update_fields=["last_checked_at", "check_count", "next_check_at", "updated_at"])
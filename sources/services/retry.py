@@ -0,0 +1,45 @@
+# sources/services/retry.py
+import random
+from datetime import timedelta
+
+import openai
+import requests
+
+# HTTP statuses worth retrying; everything else 4xx (404, 410, 403...) is permanent
+TRANSIENT_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+MAX_ATTEMPTS = 5
+BACKOFF_BASE_SECONDS = 30
+BACKOFF_MAX_SECONDS = 60 * 60
+
+_TRANSIENT_EXCEPTIONS = (
+    requests.Timeout,
+    requests.ConnectionError,
+    ConnectionError,   # includes ConnectionResetError
+    TimeoutError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+
+def is_transient_error(exc: Exception) -> bool:
+    """
+    Timeouts, connection resets, 429/5xx and LLM rate limits are transient.
+    404s, parse errors, empty LLM output etc. are permanent.
+    """
+    if isinstance(exc, _TRANSIENT_EXCEPTIONS):
+        return True
+    if isinstance(exc, requests.HTTPError) and exc.response is not None:
+        return exc.response.status_code in TRANSIENT_STATUS
+    return False
+
+
+def backoff_delay(attempt: int) -> timedelta:
+    """
+    Exponential backoff with "equal jitter": half the window is fixed, half random.
+    attempt is 1-based (1 = first retry).
+    """
+    window = min(BACKOFF_BASE_SECONDS * (2 ** max(attempt - 1, 0)), BACKOFF_MAX_SECONDS)
+    return timedelta(seconds=window / 2 + random.uniform(0, window / 2))
@@ -0,0 +1,244 @@
+# sources/services/rowstore.py
+import hashlib
+import re
+import unicodedata
+
+from django.db import transaction
+from django.db.models import F
+
+from sources.models import DataSourcePage, SheetRow, SheetRowKey
+
+INSERT_BATCH_SIZE = 1000
+
+# header keywords -> key kind (first match wins, so "email" beats "name" in "email name")
+KEY_COLUMN_PATTERNS = [
+    ("email", ("email", "e-mail", "mail id", "mail")),
+    ("phone", ("phone", "mobile", "whatsapp", "contact no", "contact number", "tel", "cell")),
+    ("city", ("city", "town", "location")),
+    ("name", ("name", "contact person", "person")),
+]
+
+EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def detect_key_columns(headers: list[str]) -> dict[int, str]:
+    """
+    {column index: key kind} for headers that look like name/email/phone/city.
+    """
+    out = {}
+    for i, h in enumerate(headers):
+        h = (h or "").strip().lower()
+        for kind, words in KEY_COLUMN_PATTERNS:
+            if any(w in h for w in words):
+                out[i] = kind
+                break
+    return out
+
+
+def _fold(value: str) -> str:
+    value = unicodedata.normalize("NFKD", value or "")
+    value = "".join(c for c in value if not unicodedata.combining(c))
+    return re.sub(r"\s+", " ", value).strip().lower()
+
+
+def normalize_phone(value: str) -> str:
+    digits = re.sub(r"\D", "", value or "")
+    return digits[-10:]  # drop country codes / trunk prefixes
+
+
+def index_terms(kind: str, value: str) -> set[str]:
+    """
+    Normalized lookup terms for one cell. Names and cities also index each word,
+    so "rohit" finds "Rohit Sharma" and "new york" finds "New York";
+    emails also index the local part.
+    """
+    if kind == "phone":
+        digits = normalize_phone(value)
+        return {digits} if len(digits) >= 6 else set()
+
+    folded = _fold(value)
+    if not folded:
+        return set()
+    terms = {folded[:255]}
+    if kind == "email":
+        terms.add(folded.split("@", 1)[0][:255])
+    elif kind in ("name", "city"):
+        terms.update(w for w in WORD_RE.findall(folded) if len(w) >= 2)
+    return terms
+
+
+def _row_keys(row: SheetRow, key_columns: dict[int, str]) -> list[SheetRowKey]:
+    keys = []
+    for idx, kind in key_columns.items():
+        if idx >= len(row.values):
+            continue
+        for term in index_terms(kind, row.values[idx]):
+            keys.append(SheetRowKey(row=row, source_id=row.source_id, column=kind, value=term))
+    return keys
+
+
+def row_hash(values: list[str]) -> str:
+    return hashlib.sha1("\x1f".join(v.strip() for v in values).encode("utf-8")).hexdigest()
+
+
+def _reindex(rows: list[SheetRow], key_columns: dict[int, str]):
+    keys = []
+    for r in rows:
+        keys.extend(_row_keys(r, key_columns))
+    SheetRowKey.objects.bulk_create(keys, batch_size=INSERT_BATCH_SIZE)
+
+
+def _insert_batch(rows: list[SheetRow], key_columns: dict[int, str]):
+    SheetRow.objects.bulk_create(rows)  # PKs come back (RETURNING) for the key rows
+    _reindex(rows, key_columns)
+
+
+def _update_batch(rows: list[SheetRow], key_columns: dict[int, str]):
+    SheetRow.objects.bulk_update(rows, ["values", "row_hash", "row_number"])
+    SheetRowKey.objects.filter(row__in=rows).delete()
+    _reindex(rows, key_columns)
+
+
+@transaction.atomic
+def sync_sheet_rows(src, page, headers: list[str], rows, key_column: str = "") -> dict:
+    """
+    Bring one sheet's row store in line with a (re-)uploaded file, touching only what changed:
+    rows are matched by key_column (header matched case-insensitively; else an email column;
+    rows without a key or repeating one use the full-row hash), then inserted / updated / deleted.
+    A first upload is just the all-inserts case.
+
+    One transaction: a sync that fails midway leaves the previous rows in place, and
+    lookup_rows never sees a sheet that is half old and half new. Any change bumps
+    page.row_generation (the agents' KB version depends on it).
+    """
+    key_columns = detect_key_columns(headers)
+    folded_headers = [(h or "").strip().lower() for h in headers]
+    if key_column and key_column.strip().lower() in folded_headers:
+        key_idx = folded_headers.index(key_column.strip().lower())
+    else:
+        # no usable key column given: an email column is the natural row identity
+        key_idx = next((i for i, kind in key_columns.items() if kind == "email"), None)
+
+    # row_key -> (id, row_hash, row_number); small per row, the values stay in the DB
+    existing = {}
+    unkeyed = []  # rows stored before keys existed: always replaced
+    for pk, k, h, n in SheetRow.objects.filter(page=page).values_list("id", "row_key", "row_hash", "row_number"):
+        if k:
+            existing[k] = (pk, h, n)
+        else:
+            unkeyed.append(pk)
+
+    stats = {"inserted": 0, "updated": 0, "deleted": 0, "unchanged": 0, "total": 0}
+    seen = set()
+    inserts, updates, moves = [], [], []
+    moved = 0
+
+    for values in rows:
+        values = [str(v) if v is not None else "" for v in values]
+        if not any(v.strip() for v in values):
+            continue
+        stats["total"] += 1
+        number = stats["total"]
+        h = row_hash(values)
+
+        key = _fold(values[key_idx])[:200] if key_idx is not None and key_idx < len(values) else ""
+        if not key or key in seen:
+            # no key, or a repeated one: the row's content is its identity, so a duplicate
+            # never overwrites the first row with that key
+            key = h
+        if key in seen:  # identical rows: keep them apart deterministically
+            dup = 2
+            while f"{key}#{dup}" in seen:
+                dup += 1
+            key = f"{key}#{dup}"
+        seen.add(key)
+
+        old = existing.get(key)
+        if old is None:
+            inserts.append(SheetRow(source=src, page=page, row_number=number, values=values, row_key=key, row_hash=h))
+            stats["inserted"] += 1
+        elif old[1] != h:
+            updates.append(SheetRow(pk=old[0], source=src, page=page, row_number=number, values=values, row_key=key, row_hash=h))
+            stats["updated"] += 1
+        else:
+            # unchanged values: at most the position moved (rows inserted/deleted above it);
+            # only row_number is rewritten, the values and lookup keys stay
+            stats["unchanged"] += 1
+            if old[2] != number:
+                moves.append(SheetRow(pk=old[0], row_number=number))
+                moved += 1
+
+        if len(inserts) >= INSERT_BATCH_SIZE:
+            _insert_batch(inserts, key_columns)
+            inserts = []
+        if len(updates) >= INSERT_BATCH_SIZE:
+            _update_batch(updates, key_columns)
+            updates = []
+        if len(moves) >= INSERT_BATCH_SIZE:
+            SheetRow.objects.bulk_update(moves, ["row_number"])
+            moves = []
+
+    if inserts:
+        _insert_batch(inserts, key_columns)
+    if updates:
+        _update_batch(updates, key_columns)
+    if moves:
+        SheetRow.objects.bulk_update(moves, ["row_number"])
+
+    gone = unkeyed + [pk for k, (pk, _, _) in existing.items() if k not in seen]
+    for i in range(0, len(gone), INSERT_BATCH_SIZE):
+        SheetRow.objects.filter(pk__in=gone[i:i + INSERT_BATCH_SIZE]).delete()
+    stats["deleted"] = len(gone)
+    if stats["inserted"] or stats["updated"] or stats["deleted"] or moved:
+        DataSourcePage.objects.filter(pk=page.pk).update(row_generation=F("row_generation") + 1)
+    return stats
+
+
+def lookup_rows(source_ids, query: str, limit: int = 20, page_ids=None) -> list[dict]:
+    """
+    Exact (then prefix) match of a name/email/phone/city query against the inverted index,
+    optionally within some sheets (page_ids).
+    Returns [{"source_id", "sheet", "row_number", "data": {header: value}}].
+    """
+    query = (query or "").strip()
+    if not query:
+        return []
+
+    folded = _fold(query)
+    if EMAIL_RE.match(folded):
+        terms = [folded]
+    elif len(normalize_phone(query)) >= 6 and not re.search(r"[a-z]", folded):
+        terms = [normalize_phone(query)]
+    else:
+        terms = [w for w in WORD_RE.findall(folded) if len(w) >= 2] or [folded]
+
+    keys = SheetRowKey.objects.filter(source_id__in=source_ids)
+    rows = SheetRow.objects.filter(source_id__in=source_ids)
+    if page_ids is not None:
+        rows = rows.filter(page_id__in=page_ids)
+
+    # a multi-word value ("new york", "rohit sharma") is also indexed whole
+    if len(terms) > 1 and keys.filter(value=folded[:255]).exists():
+        terms = [folded[:255]]
+
+    # every term must match (AND, done in SQL on the value index);
+    # exact first, prefix as a fallback for partial input
+    for term in terms:
+        matched = keys.filter(value=term)
+        if not matched.exists():
+            # range scan instead of LIKE so the value index is used on every backend
+            matched = keys.filter(value__gte=term, value__lt=term + "\uffff")
+        rows = rows.filter(pk__in=matched.values("row_id"))
+
+    rows = rows.select_related("page").order_by("page_id", "row_number")[:limit]
+    out = []
+    for r in rows:
+        headers = (r.page.preview or {}).get("headers") or []
+        out.append({
+            "source_id": r.source_id,
+            "sheet": r.page.url,
+            "row_number": r.row_number,
+            "data": {(headers[i] if i < len(headers) else f"Column {i+1}"): v for i, v in enumerate(r.values)},
+        })
+    return out
@@ -0,0 +1,59 @@
+# sources/services/search.py
+import re
+
+from django.db.models import Q
+
+from sources.models import DataSource, DataSourcePage
+
+# BM25 parameters and field weights of the agent knowledge-base segments (agents/services/kb.py)
+K1 = 1.2
+B = 0.75
+
+NAME_WEIGHT = 2      # source names / page titles
+TAG_WEIGHT = 2
+TEXT_WEIGHT = 1      # summaries, custom text, url words
+
+TOKEN_RE = re.compile(r"[^\W_]+")
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from has have how i in is it its of on or our "
+    "that the this to was we what when where which who why will with you your".split()
+)
+
+
+def tokenize(text: str) -> list[str]:
+    out = []
+    for w in TOKEN_RE.findall((text or "").lower()):
+        if len(w) < 2 or w in STOPWORDS:
+            continue
+        if len(w) > 3 and w.endswith("s") and not w.endswith("ss"):
+            w = w[:-1]  # plans -> plan
+        out.append(w)
+    return out
+
+
+def indexed_pages(user_id):
+    """
+    The user's pages that retrieval covers (KB segments, vector index): finished,
+    selected website pages with a summary.
+    """
+    return (
+        DataSourcePage.objects.filter(
+            source__user_id=user_id,
+            source__source_type="website",
+            selected=True,
+            status="done",
+        )
+        .exclude(summary="")
+        .prefetch_related("tags")
+    )
+
+
+def indexed_sources(user_id):
+    """
+    The user's finished sources with a summary or custom text.
+    """
+    return (
+        DataSource.objects.filter(user_id=user_id, status="done")
+        .exclude(Q(summary="") & Q(custom_text=""))
+        .prefetch_related("tags")
+    )
@@ -1,49 +1,74 @@
 # sources/services/sheets.py
+import codecs
 import csv
 import os
+from charset_normalizer import from_bytes
 from openpyxl import load_workbook
 
+CSV_SNIFF_BYTES = 256 * 1024
+
 def _cell(v):
     if v is None:
         return ""
     return str(v)
 
-def preview_xlsx(path: str, max_rows: int = 10):
+def _headers(row) -> list[str]:
+    headers = [_cell(x).strip() for x in (row or [])]
+    return [h if h else f"Column {i+1}" for i, h in enumerate(headers)]
+
+
+def _csv_encoding(path: str) -> str:
+    """
+    Detect the encoding once from a leading sample (UTF-8, else charset-normalizer)
+    instead of trial-decoding the file per candidate encoding.
+    """
+    with open(path, "rb") as f:
+        sample = f.read(CSV_SNIFF_BYTES)
+    try:
+        # strict UTF-8 first; a sample cut mid-character is not a reason to guess a code page
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=len(sample) < CSV_SNIFF_BYTES)
+        return "utf-8-sig"  # also strips an Excel BOM
+    except UnicodeDecodeError:
+        pass
+    matches = from_bytes(sample)
+    best = matches.best()
+    if best is None:
+        return "latin-1"   # binary-ish noise: decode byte-for-byte rather than fail
+    if best.encoding in ("utf_8", "ascii"):
+        return "utf-8-sig"  # also strips an Excel BOM
+    # short samples tie between several code pages: prefer Excel's Western default
+    for m in matches:
+        if m.chaos <= best.chaos and "cp1252" in m.could_be_from_charset:
+            return "cp1252"
+    return best.encoding
+
+
+def iter_xlsx_sheets(path: str):
+    """
+    Streams a workbook (openpyxl read_only): yields (sheet_name, headers, rows_iterator).
+    Consume each rows_iterator before moving to the next sheet.
+    """
     wb = load_workbook(path, read_only=True, data_only=True)
-    out = []
-    for ws in wb.worksheets:
-        headers = []
-        rows = []
-        for i, row in enumerate(ws.iter_rows(values_only=True)):
-            if i == 0:
-                headers = [_cell(x) for x in row]
-                # fallback header names
-                headers = [h if h.strip() else f"Column {idx+1}" for idx, h in enumerate(headers)]
-                continue
-            if i > max_rows:
-                break
-            rows.append([_cell(x) for x in row])
-        out.append({
-            "sheet_name": ws.title,
-            "headers": headers,
-            "rows": rows,
-        })
-    return out
-
-def preview_csv(path: str, max_rows: int = 10):
-    # try utf-8 then fallback
-    for enc in ("utf-8", "utf-8-sig", "latin-1"):
-        try:
-            with open(path, "r", newline="", encoding=enc) as f:
-                reader = csv.reader(f)
-                headers = next(reader, [])
-                headers = [h.strip() if h.strip() else f"Column {i+1}" for i, h in enumerate(headers)]
-                rows = []
-                for i, row in enumerate(reader):
-                    if i >= max_rows:
-                        break
-                    rows.append([c for c in row])
-                return {"headers": headers, "rows": rows}
-        except Exception:
-            continue
-    return {"headers": [], "rows": []}
+    try:
+        for ws in wb.worksheets:
+            rows = ws.iter_rows(values_only=True)
+            headers = _headers(next(rows, None))
+            yield ws.title, headers, ([_cell(x) for x in row] for row in rows)
+    finally:
+        wb.close()
+
+
+def iter_csv_sheets(path: str, sheet_name: str):
+    """
+    Same shape as iter_xlsx_sheets: a CSV is one sheet named after the file.
+    """
+    with open(path, "r", newline="", encoding=_csv_encoding(path), errors="replace") as f:
+        reader = csv.reader(f)
+        headers = _headers(next(reader, []))
+        yield sheet_name, headers, reader
+
+
+def iter_sheets(path: str, filename: str):
+    if os.path.splitext(filename.lower())[1] == ".xlsx":
+        return iter_xlsx_sheets(path)
+    return iter_csv_sheets(path, filename)
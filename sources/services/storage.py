@@ -0,0 +1,140 @@
+# sources/services/storage.py
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage, Storage, storages
+from django.utils.deconstruct import deconstructible
+
+READ_BYTES = 1024 * 1024
+CACHE_MIN_AGE_SECONDS = 3600   # never evict files used within the last hour (a worker may still be reading)
+
+
+def sources_storage():
+    """
+    Storage for uploaded source files (settings.STORAGES["sources"]).
+    Used as a callable on DataSource.file so the backend can change per deployment.
+    """
+    return storages["sources"]
+
+
+@deconstructible
+class DirectoryRemoteStorage(Storage):
+    """
+    Stand-in for an object store (S3/GCS), backed by a shared directory.
+    Only the Storage API is exposed (no .path()), so anything in the ingestion
+    path that still assumes local files fails here exactly as it would remotely.
+    """
+
+    def __init__(self, location=None, base_url=None):
+        self._fs = FileSystemStorage(
+            location=location or os.path.join(settings.MEDIA_ROOT, "remote"),
+            base_url=base_url,
+        )
+
+    def _open(self, name, mode="rb"):
+        return self._fs._open(name, mode)
+
+    def _save(self, name, content):
+        return self._fs._save(name, content)
+
+    def delete(self, name):
+        self._fs.delete(name)
+
+    def exists(self, name):
+        return self._fs.exists(name)
+
+    def size(self, name):
+        return self._fs.size(name)
+
+    def listdir(self, path):
+        return self._fs.listdir(path)
+
+    def url(self, name):
+        return self._fs.url(name)
+
+    def get_modified_time(self, name):
+        return self._fs.get_modified_time(name)
+
+
+def _has_local_paths(storage) -> bool:
+    try:
+        storage.path("x")
+        return True
+    except NotImplementedError:
+        return False
+
+
+def _cache_path(name: str) -> str:
+    # stored names are content-addressed (sources/cas/..), so a cached copy never goes stale
+    return os.path.join(settings.STORAGE_CACHE_DIR, name.replace("\\", "/").lstrip("/"))
+
+
+def _evict(keep: str):
+    """
+    Trim the cache to STORAGE_CACHE_MAX_MB, least recently used first.
+    """
+    limit = settings.STORAGE_CACHE_MAX_MB * 1024 * 1024
+    entries = []
+    total = 0
+    for root, _, files in os.walk(settings.STORAGE_CACHE_DIR):
+        for fn in files:
+            p = os.path.join(root, fn)
+            try:
+                st = os.stat(p)
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, p))
+            total += st.st_size
+    if total <= limit:
+        return
+
+    cutoff = time.time() - CACHE_MIN_AGE_SECONDS
+    for mtime, size, p in sorted(entries):
+        if total <= limit or mtime > cutoff:
+            break
+        if p == keep:
+            continue
+        try:
+            os.remove(p)
+            total -= size
+        except FileNotFoundError:
+            pass
+
+
+def _download(storage, name: str, dest: str):
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(dest), suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out, storage.open(name, "rb") as src:
+            for block in iter(lambda: src.read(READ_BYTES), b""):
+                out.write(block)
+        os.replace(tmp, dest)  # atomic: concurrent workers never see a half-written file
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+@contextmanager
+def local_copy(fieldfile):
+    """
+    A local filesystem path for a stored file, for parsers that need one (pypdf pool, openpyxl).
+    Local storages hand out their own path; remote ones are streamed once into the
+    node's cache (settings.STORAGE_CACHE_DIR) and reused by later jobs.
+    """
+    storage = fieldfile.storage
+    name = fieldfile.name
+    if _has_local_paths(storage):
+        yield storage.path(name)
+        return
+
+    dest = _cache_path(name)
+    if os.path.exists(dest):
+        os.utime(dest)  # LRU touch
+    else:
+        _download(storage, name, dest)
+        _evict(keep=dest)
+    yield dest
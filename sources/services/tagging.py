@@ -4,6 +4,7 @@ import re
 from django.utils.text import slugify
 from openai import OpenAI
 from sources.models import Tag
+from sources.services.tagindex import tags_changed
 
 _client = None
 
@@ -14,7 +15,7 @@ def get_openai_client():
     return _client
 
 
-def _fallback_keywords(text: str, max_tags: int = 10) -> list[str]:
+def fallback_keywords(text: str, max_tags: int = 10) -> list[str]:
     """
     Cheap fallback if OpenAI fails / disabled.
     Very simple keyword-ish extraction (keeps phrases that look important).
@@ -39,7 +40,7 @@ def extract_tags_with_openai(summary_text: str, max_tags: int = 10) -> list[str]
 
     # allow turning off tagging by env var
     if os.getenv("OPENAI_TAGS_ENABLED", "1") != "1":
-        return _fallback_keywords(summary_text, max_tags=max_tags)
+        return fallback_keywords(summary_text, max_tags=max_tags)
 
     instructions = (
         "Extract concise keyword tags for retrieval.\n"
@@ -64,14 +65,14 @@ def extract_tags_with_openai(summary_text: str, max_tags: int = 10) -> list[str]
 
     raw = (getattr(resp, "output_text", "") or "").strip()
     if not raw:
-        return _fallback_keywords(summary_text, max_tags=max_tags)
+        return fallback_keywords(summary_text, max_tags=max_tags)
 
     try:
         tags = json.loads(raw)
         if not isinstance(tags, list):
-            return _fallback_keywords(summary_text, max_tags=max_tags)
+            return fallback_keywords(summary_text, max_tags=max_tags)
     except Exception:
-        return _fallback_keywords(summary_text, max_tags=max_tags)
+        return fallback_keywords(summary_text, max_tags=max_tags)
 
     cleaned = []
     seen = set()
@@ -94,6 +95,7 @@ def extract_tags_with_openai(summary_text: str, max_tags: int = 10) -> list[str]
 
 def set_tags_for_source(src, tag_names: list[str]):
     src.tags.clear()
+    tags = []
     for name in tag_names:
         sl = slugify(name)[:80]
         tag, _ = Tag.objects.get_or_create(
@@ -102,10 +104,13 @@ def set_tags_for_source(src, tag_names: list[str]):
             defaults={"name": name[:60], "slug": sl},
         )
         src.tags.add(tag)
+        tags.append(tag)
+    tags_changed("source", src, src.user_id, tags)
 
 
 def set_tags_for_page(page, tag_names: list[str]):
     page.tags.clear()
+    tags = []
     for name in tag_names:
         sl = slugify(name)[:80]
         tag, _ = Tag.objects.get_or_create(
@@ -114,3 +119,5 @@ def set_tags_for_page(page, tag_names: list[str]):
             defaults={"name": name[:60], "slug": sl},
         )
         page.tags.add(tag)
+        tags.append(tag)
+    tags_changed("page", page, page.source.user_id, tags)
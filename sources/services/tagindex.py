@@ -0,0 +1,286 @@
+# sources/services/tagindex.py
+import threading
+import time
+from datetime import timedelta
+
+import numpy as np
+from django.db.models import Max
+from django.utils import timezone
+
+from sources.models import DataSource, DataSourcePage, Tag, TagIndexEvent
+
+EVENT_POLL_SECONDS = 2.0     # how stale another process's tag edits may look
+REBUILD_SECONDS = 3600       # full rebuild as a safety net
+EVENT_TTL = timedelta(days=1)
+
+
+def _to_bitset(ordinals, size: int) -> int:
+    buf = np.zeros((size + 7) // 8, dtype=np.uint8)
+    ords = np.asarray(ordinals, dtype=np.int64)
+    np.bitwise_or.at(buf, ords >> 3, (1 << (ords & 7)).astype(np.uint8))
+    return int.from_bytes(buf.tobytes(), "little")
+
+
+def _ordinals(bits: int) -> np.ndarray:
+    if not bits:
+        return np.zeros(0, dtype=np.int64)
+    raw = np.frombuffer(bits.to_bytes((bits.bit_length() + 7) // 8, "little"), dtype=np.uint8)
+    return np.flatnonzero(np.unpackbits(raw, bitorder="little"))
+
+
+class _Space:
+    """
+    Dense ordinals for one kind of object (pages or sources) and a bitset per tag.
+    Ordinals are never reused; a removed object just loses its bits until the next rebuild.
+    """
+
+    def __init__(self):
+        self.ordinal = {}            # object id -> ordinal
+        self.ids = []                # ordinal -> object id
+        self.owner = []              # ordinal -> source id
+        self.tags = {}               # ordinal -> frozenset of tag ids
+        self.bits = {}               # tag id -> int bitset of ordinals
+        self.by_source = {}          # source id -> int bitset of ordinals
+
+    def load(self, rows):
+        """
+        rows: (object id, source id, tag id), grouped per tag at the end to avoid
+        rebuilding Python ints bit by bit.
+        """
+        per_tag = {}
+        for object_id, source_id, tag_id in rows:
+            o = self.ordinal.get(object_id)
+            if o is None:
+                o = self.ordinal[object_id] = len(self.ids)
+                self.ids.append(object_id)
+                self.owner.append(source_id)
+                self.tags[o] = set()
+            self.tags[o].add(tag_id)
+            per_tag.setdefault(tag_id, []).append(o)
+
+        size = len(self.ids)
+        self.tags = {o: frozenset(t) for o, t in self.tags.items()}
+        self.bits = {tag_id: _to_bitset(ords, size) for tag_id, ords in per_tag.items()}
+        per_source = {}
+        for o, source_id in enumerate(self.owner):
+            per_source.setdefault(source_id, []).append(o)
+        self.by_source = {s: _to_bitset(ords, size) for s, ords in per_source.items()}
+
+    def set(self, object_id, source_id, tag_ids):
+        o = self.ordinal.get(object_id)
+        if o is None:
+            if not tag_ids:
+                return
+            o = self.ordinal[object_id] = len(self.ids)
+            self.ids.append(object_id)
+            self.owner.append(source_id)
+            self.by_source[source_id] = self.by_source.get(source_id, 0) | (1 << o)
+        bit = 1 << o
+        old = self.tags.get(o, frozenset())
+        new = frozenset(tag_ids)
+        for t in old - new:
+            self.bits[t] &= ~bit
+        for t in new - old:
+            self.bits[t] = self.bits.get(t, 0) | bit
+        self.tags[o] = new
+
+    def remove_source(self, source_id):
+        for o in _ordinals(self.by_source.pop(source_id, 0)):
+            self.set(self.ids[o], source_id, ())
+
+    def match(self, tag_ids, mode: str = "all", source_ids=None) -> int:
+        """
+        Bitset of objects having all (or any) of tag_ids, optionally within some sources.
+        """
+        if mode == "all":
+            bits = -1
+            for t in tag_ids:
+                bits &= self.bits.get(t, 0)
+                if not bits:
+                    break
+            if bits == -1:
+                bits = (1 << len(self.ids)) - 1
+        else:
+            bits = 0
+            for t in tag_ids:
+                bits |= self.bits.get(t, 0)
+        if source_ids is not None:
+            scope = 0
+            for s in source_ids:
+                scope |= self.by_source.get(s, 0)
+            bits &= scope
+        return bits
+
+    def facets(self, within: int) -> dict:
+        """
+        {tag id: number of objects in `within` having it}, zeros dropped.
+        """
+        counts = {}
+        for t, bits in self.bits.items():
+            c = (bits & within).bit_count()
+            if c:
+                counts[t] = c
+        return counts
+
+    def object_ids(self, bits: int) -> list[int]:
+        return [self.ids[o] for o in _ordinals(bits)]
+
+
+class TagIndex:
+    """
+    Per-user tag -> bitset index over pages and sources, for AND/OR filtering
+    and facet counts without touching the M2M tables.
+    """
+
+    def __init__(self):
+        self.pages = _Space()
+        self.sources = _Space()
+        self.tag_slugs = {}          # slug -> tag id
+        self.tag_names = {}          # tag id -> name
+
+    def tag_ids(self, slugs) -> list[int]:
+        # unknown slugs map to -1, which matches nothing
+        return [self.tag_slugs.get(s, -1) for s in slugs]
+
+
+# -----------------------------
+# Per-user indexes (one per process), kept fresh through TagIndexEvent
+# -----------------------------
+class _Entry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.index = None
+        self.last_event_id = 0
+        self.built_at = 0.0
+        self.checked_at = 0.0
+
+
+_registry_lock = threading.Lock()
+_entries = {}
+
+
+def build_tag_index(user_id) -> TagIndex:
+    index = TagIndex()
+    for tag_id, slug, name in Tag.objects.filter(user_id=user_id).values_list("id", "slug", "name"):
+        index.tag_slugs[slug] = tag_id
+        index.tag_names[tag_id] = name
+
+    page_tags = DataSourcePage.tags.through.objects.filter(datasourcepage__source__user_id=user_id)
+    index.pages.load(page_tags.values_list("datasourcepage_id", "datasourcepage__source_id", "tag_id").order_by("datasourcepage_id"))
+    source_tags = DataSource.tags.through.objects.filter(datasource__user_id=user_id)
+    index.sources.load(source_tags.values_list("datasource_id", "datasource_id", "tag_id").order_by("datasource_id"))
+    return index
+
+
+def _learn_tags(index: TagIndex, tags):
+    for t in tags:
+        index.tag_slugs[t.slug] = t.id
+        index.tag_names[t.id] = t.name
+
+
+def _apply(index: TagIndex, user_id, kind: str, object_id: int):
+    if kind == "page":
+        p = DataSourcePage.objects.filter(pk=object_id, source__user_id=user_id).prefetch_related("tags").first()
+        if p is None:
+            index.pages.set(object_id, 0, ())
+            return
+        tags = list(p.tags.all())
+        _learn_tags(index, tags)
+        index.pages.set(p.id, p.source_id, [t.id for t in tags])
+        return
+
+    src = DataSource.objects.filter(pk=object_id, user_id=user_id).prefetch_related("tags").first()
+    if src is None:
+        index.sources.set(object_id, object_id, ())
+        index.pages.remove_source(object_id)
+        return
+    tags = list(src.tags.all())
+    _learn_tags(index, tags)
+    index.sources.set(src.id, src.id, [t.id for t in tags])
+    for p in src.pages.prefetch_related("tags"):
+        tags = list(p.tags.all())
+        _learn_tags(index, tags)
+        index.pages.set(p.id, src.id, [t.id for t in tags])
+
+
+def _refresh(entry: _Entry, user_id):
+    now = time.monotonic()
+    if entry.index is None or now - entry.built_at > REBUILD_SECONDS:
+        # take the high-water mark first: events racing the build get replayed (idempotent)
+        last = TagIndexEvent.objects.filter(user_id=user_id).aggregate(m=Max("id"))["m"] or 0
+        entry.index = build_tag_index(user_id)
+        entry.last_event_id = last
+        entry.built_at = entry.checked_at = now
+        TagIndexEvent.objects.filter(created_at__lt=timezone.now() - EVENT_TTL).delete()
+        return
+
+    if now - entry.checked_at < EVENT_POLL_SECONDS:
+        return
+    entry.checked_at = now
+    events = TagIndexEvent.objects.filter(user_id=user_id, id__gt=entry.last_event_id).order_by("id")
+    seen = set()
+    for ev_id, kind, object_id in events.values_list("id", "kind", "object_id"):
+        if (kind, object_id) not in seen:
+            _apply(entry.index, user_id, kind, object_id)
+            seen.add((kind, object_id))
+        entry.last_event_id = ev_id
+
+
+def get_tag_index(user_id) -> TagIndex:
+    with _registry_lock:
+        entry = _entries.get(user_id)
+        if entry is None:
+            entry = _entries[user_id] = _Entry()
+    with entry.lock:
+        _refresh(entry, user_id)
+        return entry.index
+
+
+def filter_keys(user_id, tag_slugs, mode: str = "all", source_ids=None) -> set:
+    """
+    {("page", id), ("source", id)} tagged with all (or any) of tag_slugs:
+    the retrieval prefilter of tag-scoped agents (agents/services/chat.py).
+    """
+    index = get_tag_index(user_id)
+    tag_ids = index.tag_ids(tag_slugs)
+    keys = {("page", i) for i in index.pages.object_ids(index.pages.match(tag_ids, mode, source_ids))}
+    keys |= {("source", i) for i in index.sources.object_ids(index.sources.match(tag_ids, mode, source_ids))}
+    return keys
+
+
+def page_facets(user_id, source_id, tag_slugs=(), limit: int = 30) -> tuple[list[dict], list[int] | None]:
+    """
+    Tag chips for one source's pages: [{"slug", "name", "count"}] (most common first)
+    counted within the current selection, plus the page ids matching tag_slugs
+    (None when no tag is selected).
+    """
+    index = get_tag_index(user_id)
+    scope = index.pages.match([], "all", [source_id])
+    selected = scope
+    page_ids = None
+    if tag_slugs:
+        selected = index.pages.match(index.tag_ids(tag_slugs), "all", [source_id])
+        page_ids = index.pages.object_ids(selected)
+    counts = index.pages.facets(selected)
+    slugs = {v: k for k, v in index.tag_slugs.items() if v in counts}
+    chips = [
+        {"slug": slugs[t], "name": index.tag_names.get(t, slugs[t]), "count": c}
+        for t, c in sorted(counts.items(), key=lambda tc: (-tc[1], index.tag_names.get(tc[0], "")))
+        if t in slugs
+    ][:limit]
+    return chips, page_ids
+
+
+def tags_changed(kind: str, obj, user_id, tags):
+    """
+    Called by set_tags_for_page / set_tags_for_source: patch this process's index
+    in place and journal the change so other processes catch up.
+    """
+    TagIndexEvent.objects.create(user_id=user_id, kind=kind, object_id=obj.pk)
+    entry = _entries.get(user_id)
+    if entry is None or entry.index is None:
+        return
+    with entry.lock:
+        _learn_tags(entry.index, tags)
+        space = entry.index.pages if kind == "page" else entry.index.sources
+        space.set(obj.pk, obj.source_id if kind == "page" else obj.pk, [t.id for t in tags])
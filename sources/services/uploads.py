@@ -0,0 +1,216 @@
+# sources/services/uploads.py
+import glob
+import hashlib
+import os
+import re
+import shutil
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+from sources.models import UploadSession
+
+UPLOAD_MAX_BYTES = 50 * 1024 * 1024
+UPLOAD_CHUNK_BYTES = 2 * 1024 * 1024     # what the client is told to send per request
+UPLOAD_MAX_CHUNK_BYTES = 8 * 1024 * 1024  # hard cap per request body
+UPLOAD_STALE_HOURS = 24
+READ_BYTES = 64 * 1024
+
+SHA256_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+class UploadError(ValueError):
+    pass
+
+
+class OffsetMismatch(UploadError):
+    """
+    The client's offset doesn't match what we have on disk; it should resume from `offset`.
+    """
+    def __init__(self, offset: int):
+        super().__init__(f"Expected offset {offset}.")
+        self.offset = offset
+
+
+def _sha256_file(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(READ_BYTES), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def purge_stale_uploads(user=None, hours: int = UPLOAD_STALE_HOURS) -> int:
+    """
+    Drop sessions (and their temp files) nobody touched for `hours`.
+    """
+    qs = UploadSession.objects.filter(updated_at__lt=timezone.now() - timedelta(hours=hours))
+    if user is not None:
+        qs = qs.filter(user=user)
+    n = 0
+    for session in qs:
+        for path in [session.temp_path] + glob.glob(f"{session.temp_path}.*"):  # part files of killed requests
+            _remove(path)
+        session.delete()
+        n += 1
+    return n
+
+
+def start_upload(user, filename: str, size: int, sha256: str, allowed_exts=None) -> UploadSession:
+    """
+    Open (or resume) an upload. The same user re-sending the same file (name, size, sha256)
+    gets the unfinished session back, so a reload or dropped connection continues where it stopped.
+    """
+    filename = os.path.basename((filename or "").replace("\\", "/")).strip()[:255]
+    sha256 = (sha256 or "").strip().lower()
+    if not filename:
+        raise UploadError("Missing file name.")
+    if allowed_exts and not filename.lower().endswith(tuple(allowed_exts)):
+        raise UploadError(f"Unsupported file type. Allowed: {', '.join(allowed_exts)}")
+    if size <= 0:
+        raise UploadError("File is empty.")
+    if size > UPLOAD_MAX_BYTES:
+        raise UploadError(f"File too large (max {UPLOAD_MAX_BYTES // (1024 * 1024)}MB).")
+    if not SHA256_RE.match(sha256):
+        raise UploadError("Missing or malformed sha256 checksum.")
+
+    purge_stale_uploads(user)
+
+    session = (
+        UploadSession.objects.filter(user=user, sha256=sha256, size=size, filename=filename, status="uploading")
+        .order_by("-updated_at")
+        .first()
+    )
+    if session is not None:
+        # trust the disk over the row if a previous request died mid-write
+        on_disk = os.path.getsize(session.temp_path) if os.path.exists(session.temp_path) else 0
+        if on_disk != session.received:
+            session.received = min(on_disk, session.received)
+            session.save(update_fields=["received", "updated_at"])
+        return session
+
+    os.makedirs(settings.UPLOAD_TEMP_DIR, exist_ok=True)
+    session = UploadSession.objects.create(user=user, filename=filename, size=size, sha256=sha256)
+    open(session.temp_path, "wb").close()
+    return session
+
+
+def _check_chunk(session: UploadSession, offset: int, length: int):
+    if session.status != "uploading":
+        raise UploadError("Upload already finished.")
+    if offset != session.received:
+        raise OffsetMismatch(session.received)
+    if offset + length > session.size:
+        raise UploadError("Chunk runs past the declared file size.")
+
+
+def append_chunk(session_id, user, offset: int, stream, length: int, chunk_sha256: str = "") -> UploadSession:
+    """
+    Stream one chunk from `stream` to the end of the temp file (never the whole body in memory).
+    `offset` must equal the bytes already received; an optional per-chunk sha256 is verified
+    and a bad chunk is dropped. A connection that drops mid-chunk keeps what arrived.
+
+    The network read goes to a per-request part file with no transaction open (a slow
+    client must not hold the database's write lock). Only the local append runs in a short
+    transaction, whose conditional update re-checks the offset and serializes writers.
+    """
+    if length <= 0 or length > UPLOAD_MAX_CHUNK_BYTES:
+        raise UploadError(f"Chunk size must be between 1 and {UPLOAD_MAX_CHUNK_BYTES} bytes.")
+
+    session = UploadSession.objects.get(pk=session_id, user=user)
+    _check_chunk(session, offset, length)  # early answer for a stale client, before it sends the body
+
+    part = f"{session.temp_path}.{uuid.uuid4().hex}"
+    try:
+        h = hashlib.sha256()
+        written = 0
+        with open(part, "wb") as f:
+            while written < length:
+                block = stream.read(min(READ_BYTES, length - written))
+                if not block:
+                    break
+                f.write(block)
+                h.update(block)
+                written += len(block)
+        if chunk_sha256 and (written != length or h.hexdigest() != chunk_sha256.strip().lower()):
+            raise UploadError("Chunk checksum mismatch. Resend it.")
+
+        with transaction.atomic():
+            claimed = UploadSession.objects.filter(
+                pk=session_id, user=user, status="uploading", received=offset
+            ).update(updated_at=timezone.now())
+            if not claimed:
+                # another request moved the offset (or finished the upload) meanwhile
+                _check_chunk(UploadSession.objects.get(pk=session_id, user=user), offset, written)
+            with open(session.temp_path, "r+b") as out, open(part, "rb") as src:
+                out.seek(offset)
+                out.truncate()
+                try:
+                    shutil.copyfileobj(src, out, READ_BYTES)
+                except OSError:
+                    out.truncate(offset)
+                    raise
+            UploadSession.objects.filter(pk=session_id).update(received=offset + written)
+    finally:
+        _remove(part)
+
+    session.received = offset + written
+    return session
+
+
+def finish_upload(session_id, user) -> UploadSession:
+    """
+    Verify size and the client's whole-file sha256 against what is on disk.
+    A mismatch throws the bytes away: the client has to start over.
+    """
+    session = UploadSession.objects.get(pk=session_id, user=user)
+    if session.status == "complete":
+        return session
+    if session.received != session.size:
+        raise OffsetMismatch(session.received)
+
+    if _sha256_file(session.temp_path) != session.sha256:
+        discard_upload(session)
+        raise UploadError("Checksum mismatch: the file was corrupted in transit. Please upload it again.")
+
+    session.status = "complete"
+    session.save(update_fields=["status", "updated_at"])
+    return session
+
+
+def open_upload(user, upload_id) -> File:
+    """
+    A finished upload as a Django File (named like the original), ready for a FileField.
+    Raises UploadSession.DoesNotExist for unknown / unfinished / foreign ids.
+    """
+    session = UploadSession.objects.get(pk=upload_id, user=user, status="complete")
+    f = File(open(session.temp_path, "rb"), name=session.filename)
+    f.upload_session = session
+    return f
+
+
+def discard_upload(session: UploadSession):
+    _remove(session.temp_path)
+    session.delete()
+
+
+def release_upload(f):
+    """
+    After the file was saved into storage: close it and drop the temp copy (no-op for plain uploads).
+    """
+    session = getattr(f, "upload_session", None)
+    if session is None:
+        return
+    f.close()
+    discard_upload(session)
@@ -0,0 +1,420 @@
+# sources/services/vectors.py
+import fcntl
+import hashlib
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+from django.conf import settings
+
+from sources.models import DataSource, DocumentChunk
+from sources.services.embeddings import embed_texts, get_embedder
+from sources.services.search import indexed_pages, indexed_sources
+
+KINDS = {"page": 1, "source": 2, "chunk": 3}
+KIND_NAMES = {v: k for k, v in KINDS.items()}
+
+# one row of the id map (row i describes vector i)
+ID_DTYPE = np.dtype([
+    ("kind", "u1"),
+    ("alive", "u1"),
+    ("object_id", "<i8"),
+    ("source_id", "<i8"),
+    ("text_hash", "<u8"),
+])
+
+MIN_CAPACITY = 1024
+COMPACT_DEAD_RATIO = 0.25
+SEARCH_BLOCK_ROWS = 32768        # float16 matrices are widened block by block
+IVF_TRAIN_SAMPLE = 20000
+IVF_ITERATIONS = 10
+IVF_TAIL_RATIO = 0.2             # rebuild clusters once this share of rows was added after the last build
+DEFAULT_NPROBE = 8
+
+
+def _text_hash(embedder_name: str, text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(f"{embedder_name}\x00{text}".encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class VectorStore:
+    """
+    One user's embeddings: a contiguous (capacity, dim) float32/float16 matrix and a
+    parallel id map, both raw files opened with np.memmap, plus meta.json with the row count.
+
+    Writers (flock'ed) append rows and tombstone replaced ones in place, then publish the
+    new count by atomically replacing meta.json; readers in other processes notice the
+    meta change and remap. Compaction writes a new file generation; IVF cluster lists
+    (optional, for large tenants) live next to it.
+    """
+
+    def __init__(self, user_id):
+        self.dir = os.path.join(settings.VECTOR_INDEX_DIR, str(user_id))
+        self.meta = None
+        self.vecs = None
+        self.ids = None
+        self.ivf = None
+        self._stamp = None
+        self._writable = False
+        self._lock = threading.Lock()  # threads of one process share the mapping
+
+    # ---------- files ----------
+    def _path(self, name: str) -> str:
+        return os.path.join(self.dir, name)
+
+    def _files(self, gen: int):
+        return self._path(f"vectors.{gen}.bin"), self._path(f"ids.{gen}.bin"), self._path(f"ivf.{gen}.npz")
+
+    def _write_meta(self, meta: dict):
+        tmp = self._path("meta.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp, self._path("meta.json"))
+
+    def _open(self, writable: bool = False):
+        """
+        (Re)map the files if meta.json changed since we last looked. Returns False if there is no index.
+        """
+        try:
+            st = os.stat(self._path("meta.json"))
+        except FileNotFoundError:
+            self.meta = self.vecs = self.ids = self.ivf = None
+            self._stamp = None
+            return False
+        stamp = (st.st_mtime_ns, st.st_ino)
+        if stamp == self._stamp and (self._writable or not writable):
+            return True
+
+        with open(self._path("meta.json")) as f:
+            meta = json.load(f)
+        vec_path, id_path, ivf_path = self._files(meta["generation"])
+        mode = "r+" if writable else "r"
+        shape = (meta["capacity"], meta["dim"])
+        self.vecs = np.memmap(vec_path, dtype=meta["dtype"], mode=mode, shape=shape)
+        self.ids = np.memmap(id_path, dtype=ID_DTYPE, mode=mode, shape=(meta["capacity"],))
+        self.ivf = None
+        if meta.get("ivf_rows"):
+            with np.load(ivf_path) as z:
+                self.ivf = {"centroids": z["centroids"], "order": z["order"], "offsets": z["offsets"]}
+        self.meta = meta
+        self._stamp = stamp
+        self._writable = writable
+        return True
+
+    @contextmanager
+    def _locked(self):
+        os.makedirs(self.dir, exist_ok=True)
+        with open(self._path("lock"), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _create(self, embedder, gen: int = 0, capacity: int = MIN_CAPACITY):
+        meta = {
+            "generation": gen,
+            "count": 0,
+            "dead": 0,
+            "capacity": capacity,
+            "dim": embedder.dim,
+            "dtype": settings.VECTOR_DTYPE,
+            "embedder": embedder.name,
+            "ivf_rows": 0,
+        }
+        vec_path, id_path, _ = self._files(gen)
+        itemsize = np.dtype(meta["dtype"]).itemsize
+        with open(vec_path, "wb") as f:
+            f.truncate(capacity * embedder.dim * itemsize)
+        with open(id_path, "wb") as f:
+            f.truncate(capacity * ID_DTYPE.itemsize)
+        return meta
+
+    def _grow(self, needed: int):
+        meta = self.meta
+        if meta["count"] + needed <= meta["capacity"]:
+            return
+        capacity = max(meta["capacity"] * 2, meta["count"] + needed)
+        vec_path, id_path, _ = self._files(meta["generation"])
+        self.vecs.flush()
+        self.ids.flush()
+        os.truncate(vec_path, capacity * meta["dim"] * np.dtype(meta["dtype"]).itemsize)
+        os.truncate(id_path, capacity * ID_DTYPE.itemsize)
+        meta["capacity"] = capacity
+        self._write_meta(meta)
+        self._open(writable=True)
+
+    # ---------- writes ----------
+    def _ensure(self, embedder, reset: bool = False):
+        if reset or not self._open(writable=True) or self.meta["embedder"] != embedder.name:
+            # first use, a rebuild, or the embedder changed (dims/space differ): start a fresh generation
+            gen = (self.meta["generation"] + 1) if self.meta else 0
+            old = self.meta
+            self._write_meta(self._create(embedder, gen=gen))
+            self._open(writable=True)
+            if old:
+                self._remove_generation(old["generation"])
+
+    def _remove_generation(self, gen: int):
+        for p in self._files(gen):
+            if os.path.exists(p):
+                os.remove(p)
+
+    def sync(self, items: list[tuple], scope_source_ids=None, scope_keys=None, reset: bool = False):
+        """
+        items: [(kind, object_id, source_id, text)] that should be present.
+        Rows inside the scope (all rows of scope_source_ids, plus scope_keys) that are not
+        in items are tombstoned; unchanged texts keep their vectors, everything else is
+        embedded in batches and appended. reset=True starts from an empty index.
+        """
+        embedder = get_embedder()
+        with self._lock, self._locked():
+            self._ensure(embedder, reset=reset)
+            n = self.meta["count"]
+            ids = self.ids[:n]
+            alive = ids["alive"] == 1
+
+            in_scope = np.zeros(n, dtype=bool)
+            if scope_source_ids:
+                in_scope |= np.isin(ids["source_id"], list(scope_source_ids))
+            for kind, object_id in scope_keys or ():
+                in_scope |= (ids["kind"] == KINDS[kind]) & (ids["object_id"] == object_id)
+            current = {}
+            for row in np.flatnonzero(alive & in_scope):
+                current[(int(ids["kind"][row]), int(ids["object_id"][row]))] = (int(row), int(ids["text_hash"][row]))
+
+            todo = []
+            keep = set()
+            for kind, object_id, source_id, text in items:
+                key = (KINDS[kind], object_id)
+                h = _text_hash(embedder.name, text)
+                old = current.get(key)
+                if old is not None and old[1] == h:
+                    keep.add(key)
+                    continue
+                todo.append((key, source_id, h, text))
+
+            # embed before touching the store: if the provider fails, the old rows stay searchable
+            vecs = embed_texts([t for *_, t in todo], embedder) if todo else None
+
+            dead = [row for key, (row, _) in current.items() if key not in keep]
+            if dead:
+                self.ids["alive"][dead] = 0
+                self.meta["dead"] += len(dead)
+
+            if todo:
+                self._grow(len(todo))
+                start = self.meta["count"]
+                rows = np.zeros(len(todo), dtype=ID_DTYPE)
+                rows["kind"] = [k[0] for k, *_ in todo]
+                rows["object_id"] = [k[1] for k, *_ in todo]
+                rows["source_id"] = [s for _, s, _, _ in todo]
+                rows["text_hash"] = [h for _, _, h, _ in todo]
+                rows["alive"] = 1
+                self.vecs[start:start + len(todo)] = vecs.astype(self.meta["dtype"])
+                self.ids[start:start + len(todo)] = rows
+                self.meta["count"] = start + len(todo)
+
+            self.vecs.flush()
+            self.ids.flush()
+            self._write_meta(self.meta)
+            self._maintain()
+            wanted = {(KINDS[kind], object_id) for kind, object_id, _, _ in items}
+            return {"embedded": len(todo), "kept": len(keep), "removed": len([k for k in current if k not in wanted])}
+
+    def _maintain(self):
+        meta = self.meta
+        if meta["dead"] > 256 and meta["dead"] > COMPACT_DEAD_RATIO * meta["count"]:
+            self._compact()
+            return
+        live = meta["count"] - meta["dead"]
+        if live >= settings.VECTOR_IVF_MIN_ROWS:
+            tail = meta["count"] - meta["ivf_rows"]
+            if not meta["ivf_rows"] or tail > IVF_TAIL_RATIO * meta["ivf_rows"]:
+                self._build_ivf()
+
+    def _compact(self):
+        meta = self.meta
+        n = meta["count"]
+        live_rows = np.flatnonzero(self.ids[:n]["alive"] == 1)
+        old_gen = meta["generation"]
+        new = dict(meta, generation=old_gen + 1, count=len(live_rows), dead=0, ivf_rows=0,
+                   capacity=max(MIN_CAPACITY, len(live_rows) * 2))
+        vec_path, id_path, _ = self._files(new["generation"])
+        vecs = np.memmap(vec_path, dtype=new["dtype"], mode="w+", shape=(new["capacity"], new["dim"]))
+        ids = np.memmap(id_path, dtype=ID_DTYPE, mode="w+", shape=(new["capacity"],))
+        for i in range(0, len(live_rows), SEARCH_BLOCK_ROWS):
+            block = live_rows[i:i + SEARCH_BLOCK_ROWS]
+            vecs[i:i + len(block)] = self.vecs[block]
+            ids[i:i + len(block)] = self.ids[block]
+        vecs.flush()
+        ids.flush()
+        del vecs, ids
+        self._write_meta(new)
+        self._open(writable=True)
+        self._remove_generation(old_gen)  # readers still holding the old mapping keep working (unlinked files)
+        if len(live_rows) >= settings.VECTOR_IVF_MIN_ROWS:
+            self._build_ivf()
+
+    def _build_ivf(self):
+        """
+        Spherical k-means over the live rows; rows get grouped by nearest centroid.
+        Rows appended later are searched brute-force as a tail until the next build.
+        """
+        meta = self.meta
+        n = meta["count"]
+        live_rows = np.flatnonzero(self.ids[:n]["alive"] == 1)
+        nlist = int(min(4096, max(16, np.sqrt(len(live_rows)))))
+
+        rng = np.random.default_rng(0)
+        sample = rng.choice(live_rows, size=min(len(live_rows), IVF_TRAIN_SAMPLE), replace=False)
+        sample.sort()
+        train = np.asarray(self.vecs[sample], dtype=np.float32)
+        centroids = train[rng.choice(len(train), size=nlist, replace=False)]
+        for _ in range(IVF_ITERATIONS):
+            assign = np.argmax(train @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = train[assign == c]
+                if len(members):
+                    centroids[c] = members.sum(axis=0)
+            centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-9)
+
+        assign = np.empty(n, dtype=np.int32)
+        for i in range(0, n, SEARCH_BLOCK_ROWS):
+            j = min(i + SEARCH_BLOCK_ROWS, n)
+            assign[i:j] = np.argmax(np.asarray(self.vecs[i:j], dtype=np.float32) @ centroids.T, axis=1)
+        order = np.argsort(assign, kind="stable").astype(np.int64)
+        offsets = np.searchsorted(assign[order], np.arange(nlist + 1)).astype(np.int64)
+
+        _, _, ivf_path = self._files(meta["generation"])
+        tmp = ivf_path + ".tmp.npz"
+        np.savez(tmp, centroids=centroids.astype(np.float32), order=order, offsets=offsets)
+        os.replace(tmp, ivf_path)
+        meta["ivf_rows"] = n
+        self._write_meta(meta)
+        self._open(writable=True)
+
+    # ---------- reads ----------
+    def search(self, q: np.ndarray, embedder_name: str, k: int = 10, source_ids=None, nprobe: int = DEFAULT_NPROBE):
+        with self._lock:
+            if k <= 0 or not self._open() or self.meta["embedder"] != embedder_name:
+                return []
+            meta, vecs, ids, ivf = self.meta, self.vecs, self.ids, self.ivf
+        n = meta["count"]
+        if not n:
+            return []
+        ids = ids[:n]
+
+        if ivf is not None:
+            ivf_rows = min(meta["ivf_rows"], n)
+            probe = np.argsort(-(ivf["centroids"] @ q))[:nprobe]
+            order, offsets = ivf["order"], ivf["offsets"]
+            parts = [order[offsets[c]:offsets[c + 1]] for c in probe]
+            parts.append(np.arange(ivf_rows, n))  # rows added since the clusters were built
+            rows = np.concatenate(parts)
+            scores = np.asarray(vecs[rows], dtype=np.float32) @ q
+        else:
+            rows = None
+            if vecs.dtype == np.float32:
+                scores = vecs[:n] @ q
+            else:
+                scores = np.empty(n, dtype=np.float32)
+                for i in range(0, n, SEARCH_BLOCK_ROWS):
+                    j = min(i + SEARCH_BLOCK_ROWS, n)
+                    scores[i:j] = np.asarray(vecs[i:j], dtype=np.float32) @ q
+
+        sel = ids if rows is None else ids[rows]
+        ok = sel["alive"] == 1
+        if source_ids is not None:
+            ok &= np.isin(sel["source_id"], list(source_ids))
+        scores = np.where(ok, scores, -np.inf)
+
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        out = []
+        for i in top:
+            if scores[i] == -np.inf:
+                break
+            r = sel[i]
+            out.append({
+                "kind": KIND_NAMES[int(r["kind"])],
+                "id": int(r["object_id"]),
+                "source_id": int(r["source_id"]),
+                "score": round(float(scores[i]), 4),
+            })
+        return out
+
+
+# -----------------------------
+# Module API
+# -----------------------------
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(user_id) -> VectorStore:
+    with _stores_lock:
+        store = _stores.get(user_id)
+        if store is None:
+            store = _stores[user_id] = VectorStore(user_id)
+        return store
+
+
+def _page_text(p) -> str:
+    return f"{(p.preview or {}).get('title') or p.url}\n{p.summary}"
+
+
+def _source_text(src) -> str:
+    return f"{src.name}\n{src.summary or src.custom_text[:4000]}"
+
+
+def source_items(src) -> list[tuple]:
+    """
+    Everything of one source that should be embedded: the source itself,
+    its finished website pages and its document chunks.
+    """
+    items = []
+    s = indexed_sources(src.user_id).filter(pk=src.pk).first()
+    if s is not None:
+        items.append(("source", s.id, s.id, _source_text(s)))
+    for p in indexed_pages(src.user_id).filter(source_id=src.pk):
+        items.append(("page", p.id, src.pk, _page_text(p)))
+    for c in DocumentChunk.objects.filter(source_id=src.pk).order_by("ordinal").only("id", "text"):
+        items.append(("chunk", c.id, src.pk, c.text))
+    return items
+
+
+def embed_source(src) -> dict:
+    """
+    Bring src's vectors up to date (only new/changed texts are embedded).
+    """
+    return get_store(src.user_id).sync(source_items(src), scope_source_ids=[src.pk])
+
+
+def embed_page(page) -> dict:
+    user_id = page.source.user_id
+    p = indexed_pages(user_id).filter(pk=page.pk).first()
+    items = [("page", p.id, p.source_id, _page_text(p))] if p else []
+    return get_store(user_id).sync(items, scope_keys=[("page", page.pk)])
+
+
+def rebuild_user(user_id) -> dict:
+    """
+    Re-embed everything of one user into a fresh index generation.
+    """
+    items = []
+    for src in DataSource.objects.filter(user_id=user_id).only("id", "user_id").order_by("id"):
+        items.extend(source_items(src))
+    return get_store(user_id).sync(items, reset=True)
+
+
+def semantic_search(user_id, query: str, k: int = 10, source_ids=None) -> list[dict]:
+    """
+    Cosine top-k over the user's pages, sources and document chunks.
+    Returns [{"kind": "page"|"source"|"chunk", "id", "source_id", "score"}], best first.
+    """
+    embedder = get_embedder()
+    q = embed_texts([query], embedder)[0]
+    return get_store(user_id).search(q, embedder.name, k=k, source_ids=source_ids)
@@ -1,3 +1,612 @@
-from django.test import TestCase
+import hashlib
+import io
+import os
+import random
+import tempfile
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import requests
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from sources.management.commands import run_source_jobs
+from sources.models import CrawlHost, CrawlLease, DataSource, DataSourcePage, SheetRow, TextBlob, UploadSession
+from sources.services import blobs, chunking, discover, politeness, retry, rowstore, tagindex, uploads, vectors
+from sources.services.embeddings import embed_texts, get_embedder
+from sources.services.tagging import set_tags_for_page, set_tags_for_source
+
+
+def _response(text="", status=200, content_type="text/html", headers=None):
+    return SimpleNamespace(
+        text=text,
+        status_code=status,
+        headers={"Content-Type": content_type, **(headers or {})},
+    )
+
+
+class DiscoverRankingTests(SimpleTestCase):
+    def test_pagerank_favours_linked_pages(self):
+        graph = {
+            "a": {"hub"},
+            "b": {"hub"},
+            "c": {"hub", "a"},
+            "hub": {"a"},
+        }
+        ranks = discover.pagerank(graph)
+        self.assertAlmostEqual(sum(ranks.values()), 1.0, places=6)
+        self.assertEqual(max(ranks, key=ranks.get), "hub")
+        self.assertGreater(ranks["a"], ranks["b"])
+
+    def test_pagerank_handles_dangling_and_empty_graphs(self):
+        self.assertEqual(discover.pagerank({}), {})
+        ranks = discover.pagerank({"a": {"b"}, "b": set()})
+        self.assertAlmostEqual(sum(ranks.values()), 1.0, places=6)
+
+    def test_score_urls_prefers_shallow_pages_at_equal_rank(self):
+        scores = discover.score_urls({}, {"https://x.com/a": 1, "https://x.com/a/b/c": 3})
+        self.assertGreater(scores["https://x.com/a"], scores["https://x.com/a/b/c"])
+
+    def test_sitemap_ranks_by_priority_and_drops_other_domains(self):
+        sitemap = """<?xml version="1.0"?>
+        <urlset>
+          <url><loc>https://x.com/blog/post</loc><priority>0.2</priority></url>
+          <url><loc>https://x.com/pricing</loc><priority>0.9</priority></url>
+          <url><loc>https://other.com/pricing</loc><priority>1.0</priority></url>
+          <url><loc>https://x.com/pricing/#top</loc></url>
+        </urlset>"""
+        with mock.patch.object(discover, "polite_get", return_value=_response(sitemap, content_type="application/xml")):
+            ranked = discover.discover_ranked_urls("https://x.com", max_urls=10)
+
+        urls = [u for u, _ in ranked]
+        self.assertEqual(urls, ["https://x.com/pricing", "https://x.com/blog/post"])
+
+    def test_crawl_ranks_link_graph_and_respects_cap(self):
+        site = {
+            "https://x.com": '<a href="/a">a</a><a href="/b">b</a><a href="/logo.png">x</a>',
+            "https://x.com/a": '<a href="/b">b</a><a href="mailto:hi@x.com">m</a>',
+            "https://x.com/b": '<a href="/">home</a><a href="https://other.com/z">z</a>',
+        }
+
+        def fake_get(url, **kwargs):
+            # no sitemap: falls back to the crawl
+            return _response(site[url]) if url in site else _response(status=404)
+
+        with mock.patch.object(discover, "polite_get", side_effect=fake_get):
+            ranked = discover.discover_ranked_urls("https://x.com", max_urls=10)
+            capped = discover.discover_ranked_urls("https://x.com", max_urls=2)
+
+        # /b is linked from both other pages, so it outranks /a at the same depth;
+        # assets, mailto: and other domains never become candidates
+        self.assertEqual([u for u, _ in ranked], ["https://x.com", "https://x.com/b", "https://x.com/a"])
+        self.assertEqual(len(capped), 2)
+
+
+class DiscoveryJobTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="owner", password="pw")
+        self.cmd = run_source_jobs.Command()
+
+    def _source(self):
+        return DataSource.objects.create(
+            user=self.user, name="Site", source_type="website",
+            domain_url="https://x.com", status="discovering",
+        )
+
+    def test_discovered_urls_become_a_draft(self):
+        src = self._source()
+        ranked = [("https://x.com", 1.0), ("https://x.com/blog/post", 0.4)]
+        with mock.patch.object(run_source_jobs, "discover_ranked_urls", return_value=ranked):
+            self.assertTrue(self.cmd._discover_next_source())
+            self.assertFalse(self.cmd._discover_next_source())
+
+        src.refresh_from_db()
+        self.assertEqual(src.status, "draft")
+        self.assertEqual((src.total_pages, src.selected_pages), (2, 2))
+        self.assertIsNone(src.next_run_at)
+        self.assertEqual(src.pages.get(url="https://x.com/blog/post").importance, 0.4)
+
+    def test_nothing_discovered_fails_the_source(self):
+        src = self._source()
+        with mock.patch.object(run_source_jobs, "discover_ranked_urls", side_effect=RuntimeError("down")), \
+                mock.patch.object(self.cmd, "stderr"):
+            self.cmd._discover_next_source()
+
+        src.refresh_from_db()
+        self.assertEqual(src.status, "failed")
+        self.assertFalse(src.pages.exists())
+
+
+class RetryPolicyTests(SimpleTestCase):
+    def _http_error(self, status):
+        return requests.HTTPError(response=SimpleNamespace(status_code=status))
+
+    def test_transient_errors(self):
+        for exc in (
+            requests.Timeout(),
+            requests.ConnectionError(),
+            ConnectionResetError(),
+            TimeoutError(),
+            self._http_error(429),
+            self._http_error(503),
+        ):
+            with self.subTest(exc=exc):
+                self.assertTrue(retry.is_transient_error(exc))
+
+    def test_permanent_errors(self):
+        for exc in (
+            self._http_error(404),
+            self._http_error(403),
+            requests.HTTPError(),  # no response attached
+            ValueError("parse error"),
+        ):
+            with self.subTest(exc=exc):
+                self.assertFalse(retry.is_transient_error(exc))
+
+    def test_backoff_doubles_within_jitter_and_caps(self):
+        base = retry.BACKOFF_BASE_SECONDS
+        for attempt in (1, 2, 3):
+            window = base * 2 ** (attempt - 1)
+            with mock.patch.object(retry.random, "uniform", side_effect=lambda a, b: b):
+                self.assertEqual(retry.backoff_delay(attempt), timedelta(seconds=window))
+            with mock.patch.object(retry.random, "uniform", side_effect=lambda a, b: a):
+                self.assertEqual(retry.backoff_delay(attempt), timedelta(seconds=window / 2))
+
+        self.assertLessEqual(retry.backoff_delay(50), timedelta(seconds=retry.BACKOFF_MAX_SECONDS))
+        # attempt 0 is treated like the first retry
+        self.assertLessEqual(retry.backoff_delay(0), timedelta(seconds=base))
+
+
+@override_settings(CRAWL_MIN_DELAY_SECONDS=0)
+class PolitenessLeaseTests(TestCase):
+    def setUp(self):
+        self.host = CrawlHost.objects.create(
+            host="x.com", max_concurrent=1, min_delay_seconds=0,
+            robots_checked_at=timezone.now(),
+        )
+
+    def test_slot_is_exclusive_until_released(self):
+        lease = politeness.acquire(self.host, max_wait=0)
+        with self.assertRaises(politeness.HostBusy):
+            politeness.acquire(self.host, max_wait=0)
+
+        politeness.release(lease, 200)
+        self.assertFalse(CrawlLease.objects.filter(pk=lease).exists())
+        politeness.release(politeness.acquire(self.host, max_wait=0), 200)
+
+    def test_expired_lease_is_reclaimed(self):
+        CrawlLease.objects.create(host=self.host, expires_at=timezone.now() - timedelta(seconds=1))
+        lease = politeness.acquire(self.host, max_wait=0)
+        self.assertEqual(list(CrawlLease.objects.values_list("pk", flat=True)), [lease])
+
+    def test_retry_after_backs_the_host_off(self):
+        before = timezone.now()
+        politeness.release(politeness.acquire(self.host, max_wait=0), 429, "120")
+
+        self.host.refresh_from_db()
+        self.assertEqual(self.host.backoff_level, 1)
+        self.assertGreaterEqual(self.host.backoff_until, before + timedelta(seconds=120))
+        with self.assertRaises(politeness.HostBusy):
+            politeness.acquire(self.host, max_wait=0)
+
+    def test_http_date_retry_after_uses_exponential_backoff(self):
+        self.host.backoff_level = 2
+        self.host.save()
+        before = timezone.now()
+        politeness.release(politeness.acquire(self.host, max_wait=0), 503, "Wed, 21 Oct 2026 07:28:00 GMT")
+
+        self.host.refresh_from_db()
+        self.assertEqual(self.host.backoff_level, 3)
+        wait = (self.host.backoff_until - before).total_seconds()
+        self.assertAlmostEqual(wait, politeness.BACKOFF_BASE_SECONDS * 4, delta=2)
+
+    def test_success_resets_backoff(self):
+        self.host.backoff_level = 3
+        self.host.save()
+        politeness.release(politeness.acquire(self.host, max_wait=0), 200)
+
+        self.host.refresh_from_db()
+        self.assertEqual(self.host.backoff_level, 0)
+
+
+class TextBlobTests(TestCase):
+    def test_round_trip_is_normalized_and_compressed(self):
+        text = "Pricing  \n\n starts at   $10.  " + "x" * 5000
+        blob = blobs.put_text(text)
+
+        self.assertEqual(blobs.get_text(blob), blobs.normalize_text(text))
+        self.assertEqual(blob.sha256, blobs.text_sha256(text))
+        self.assertLess(len(bytes(blob.data)), blob.raw_size)
+
+    def test_equal_text_is_stored_once(self):
+        a = blobs.put_text("Hello   world")
+        b = blobs.put_text(" Hello world\n")
+        self.assertEqual(a.pk, b.pk)
+        self.assertEqual(TextBlob.objects.count(), 1)
+        self.assertIsNone(blobs.put_text("  \n "))
+
+    def test_streamed_writer_matches_put_text(self):
+        pieces = ["Page one   text.", "", "  Page two\ttext. "]
+        writer = blobs.TextBlobWriter(head_chars=8)
+        for piece in pieces:
+            writer.write(piece)
+        blob = writer.save()
+
+        self.assertEqual(blob.pk, blobs.put_text(" ".join(pieces)).pk)
+        self.assertEqual(blobs.get_text(blob), "Page one text. Page two text.")
+        self.assertEqual(writer.head, "Page one")
+        self.assertIsNone(blobs.TextBlobWriter().save())
+
+
+class ChunkPagesTests(SimpleTestCase):
+    def _sentences(self, n, words=9):
+        return " ".join(f"Sentence {i} " + "word " * (words - 3) + "end." for i in range(n))
+
+    def test_empty_and_blank_pages_yield_nothing(self):
+        self.assertEqual(list(chunking.chunk_pages([])), [])
+        self.assertEqual(list(chunking.chunk_pages([(1, ""), (2, "   ")])), [])
+
+    def test_short_text_is_one_chunk(self):
+        chunks = list(chunking.chunk_pages([(None, "Just one line.")]))
+        self.assertEqual(len(chunks), 1)
+        self.assertEqual(chunks[0]["text"], "Just one line.")
+        self.assertIsNone(chunks[0]["page_start"])
+
+    def test_chunks_respect_budget_overlap_and_pages(self):
+        pages = [(1, self._sentences(10)), (2, self._sentences(10))]
+        chunks = list(chunking.chunk_pages(pages, max_tokens=40, overlap_tokens=12))
+
+        self.assertGreater(len(chunks), 2)
+        for prev, nxt in zip(chunks, chunks[1:]):
+            self.assertLessEqual(nxt["token_count"], 40)
+            self.assertNotEqual(prev["text"], nxt["text"])
+            # the next chunk opens with the previous chunk's last sentence
+            last = chunking.SENTENCE_RE.split(prev["text"])[-1]
+            self.assertTrue(nxt["text"].startswith(last))
+        self.assertEqual((chunks[0]["page_start"], chunks[-1]["page_end"]), (1, 2))
+        self.assertTrue(any(c["page_start"] == 1 and c["page_end"] == 2 for c in chunks))
+
+    def test_overlap_larger_than_sentences_is_capped(self):
+        chunks = list(chunking.chunk_pages([(1, self._sentences(20))], max_tokens=30, overlap_tokens=1000))
+        for prev, nxt in zip(chunks, chunks[1:]):
+            self.assertLessEqual(nxt["token_count"], 30)
+            self.assertFalse(nxt["text"].startswith(prev["text"]))
+
+    def test_overlong_sentence_is_split_on_words(self):
+        sentence = " ".join(f"w{i}" for i in range(100)) + "."
+        chunks = list(chunking.chunk_pages([(3, sentence)], max_tokens=20, overlap_tokens=0))
+
+        self.assertTrue(all(c["token_count"] <= 20 for c in chunks))
+        self.assertEqual(" ".join(c["text"] for c in chunks), sentence)
+
+
+class SheetRowStoreTests(TestCase):
+    HEADERS = ["Name", "Email", "Phone", "City"]
+
+    def setUp(self):
+        user = get_user_model().objects.create_user(username="owner", password="pw")
+        self.src = DataSource.objects.create(user=user, name="Contacts", source_type="sheet", status="done")
+        self.page = DataSourcePage.objects.create(
+            source=self.src, url="Sheet1", category="sheet", selected=True, status="done",
+            preview={"headers": self.HEADERS},
+        )
+        rowstore.sync_sheet_rows(self.src, self.page, self.HEADERS, [
+            ["Rohit Sharma", "rohit@example.com", "+91 98765 43210", "New York"],
+            ["Rohan Mehta", "rohan@example.com", "98111 22233", "Pune"],
+            ["Anita Rao", "anita@example.com", "", "New Delhi"],
+        ])
+
+    def _lookup(self, query):
+        return [r["data"]["Name"] for r in rowstore.lookup_rows([self.src.pk], query)]
+
+    def test_exact_key_lookups(self):
+        self.assertEqual(self._lookup("ROHIT@example.com"), ["Rohit Sharma"])
+        self.assertEqual(self._lookup("9876543210"), ["Rohit Sharma"])
+        self.assertEqual(self._lookup("new york"), ["Rohit Sharma"])
+
+    def test_words_must_all_match(self):
+        self.assertEqual(self._lookup("rohit sharma"), ["Rohit Sharma"])
+        self.assertEqual(self._lookup("rohit pune"), [])
+        self.assertEqual(self._lookup("rohan pune"), ["Rohan Mehta"])
+
+    def test_prefix_fallback(self):
+        self.assertEqual(self._lookup("roh"), ["Rohit Sharma", "Rohan Mehta"])
+        self.assertEqual(self._lookup("new"), ["Rohit Sharma", "Anita Rao"])
+
+    def test_results_are_scoped(self):
+        self.assertEqual(rowstore.lookup_rows([self.src.pk], "rohit", page_ids=[]), [])
+        self.assertEqual(rowstore.lookup_rows([], "rohit"), [])
+        row = rowstore.lookup_rows([self.src.pk], "anita")[0]
+        self.assertEqual((row["sheet"], row["row_number"]), ("Sheet1", 3))
+
+
+class SheetResyncTests(TestCase):
+    HEADERS = ["Name", "Email"]
+
+    def setUp(self):
+        user = get_user_model().objects.create_user(username="owner", password="pw")
+        self.src = DataSource.objects.create(user=user, name="Contacts", source_type="sheet", status="done")
+        self.page = DataSourcePage.objects.create(source=self.src, url="Sheet1", category="sheet")
+
+    def _sync(self, rows, key_column=""):
+        return rowstore.sync_sheet_rows(self.src, self.page, self.HEADERS, rows, key_column=key_column)
+
+    def _rows(self):
+        return list(SheetRow.objects.filter(page=self.page).order_by("row_number").values_list("row_number", "values"))
+
+    def _generation(self):
+        return DataSourcePage.objects.get(pk=self.page.pk).row_generation
+
+    def test_first_upload_inserts_everything(self):
+        stats = self._sync([["Ann", "ann@x.com"], ["", ""], ["Bob", "bob@x.com"]])
+        self.assertEqual((stats["inserted"], stats["total"]), (2, 2))
+        self.assertEqual(self._rows(), [(1, ["Ann", "ann@x.com"]), (2, ["Bob", "bob@x.com"])])
+        self.assertEqual(self._generation(), 1)
+
+    def test_unchanged_upload_touches_nothing(self):
+        self._sync([["Ann", "ann@x.com"]])
+        ids = list(SheetRow.objects.values_list("pk", flat=True))
+        stats = self._sync([["Ann", "ann@x.com"]])
+
+        self.assertEqual(stats["unchanged"], 1)
+        self.assertEqual(list(SheetRow.objects.values_list("pk", flat=True)), ids)
+        self.assertEqual(self._generation(), 1)
+
+    def test_update_move_and_delete_keep_row_identity(self):
+        self._sync([["Ann", "ann@x.com"], ["Bob", "bob@x.com"], ["Cy", "cy@x.com"]])
+        bob = SheetRow.objects.get(row_key="bob@x.com").pk
+
+        # Ann deleted, Bob moves up unchanged, Cy renamed (same email key), Dee added
+        stats = self._sync([["Bob", "bob@x.com"], ["Cyrus", "CY@x.com"], ["Dee", "dee@x.com"]])
+
+        self.assertEqual(
+            {k: stats[k] for k in ("inserted", "updated", "deleted", "unchanged")},
+            {"inserted": 1, "updated": 1, "deleted": 1, "unchanged": 1},
+        )
+        self.assertEqual(SheetRow.objects.get(pk=bob).row_number, 1)
+        self.assertEqual([v[0] for _, v in self._rows()], ["Bob", "Cyrus", "Dee"])
+        self.assertEqual(rowstore.lookup_rows([self.src.pk], "cyrus")[0]["row_number"], 2)
+        self.assertEqual(rowstore.lookup_rows([self.src.pk], "ann"), [])
+        self.assertEqual(self._generation(), 2)
+
+    def test_move_alone_bumps_the_generation(self):
+        self._sync([["Ann", "ann@x.com"], ["Bob", "bob@x.com"]])
+        stats = self._sync([["Bob", "bob@x.com"], ["Ann", "ann@x.com"]])
+        self.assertEqual(stats["unchanged"], 2)
+        self.assertEqual(self._generation(), 2)
+
+    def test_duplicate_keys_and_rows_stay_separate(self):
+        rows = [["Ann", "ann@x.com"], ["Ann B", "ann@x.com"], ["Ann", "ann@x.com"]]
+        self.assertEqual(self._sync(rows)["inserted"], 3)
+        stats = self._sync(rows)
+
+        self.assertEqual(stats["unchanged"], 3)
+        self.assertEqual(len(set(SheetRow.objects.values_list("row_key", flat=True))), 3)
+
+    def test_explicit_key_column_is_case_insensitive(self):
+        self._sync([["Ann", "ann@x.com"]], key_column="name")
+        stats = self._sync([["Ann", "ann@new.com"]], key_column="NAME")
+        self.assertEqual((stats["updated"], stats["inserted"]), (1, 0))
+
+    def test_failed_sync_keeps_previous_rows(self):
+        self._sync([["Ann", "ann@x.com"]])
+        with mock.patch.object(rowstore, "_reindex", side_effect=RuntimeError("db down")):
+            with self.assertRaises(RuntimeError):
+                self._sync([["Bob", "bob@x.com"]])
+
+        self.assertEqual(self._rows(), [(1, ["Ann", "ann@x.com"])])
+        self.assertEqual(self._generation(), 1)
+
+
+class ChunkedUploadTests(TestCase):
+    DATA = os.urandom(3000)
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        settings_override = override_settings(UPLOAD_TEMP_DIR=self.tmp.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = get_user_model().objects.create_user(username="owner", password="pw")
+        self.session = uploads.start_upload(
+            self.user, "report.pdf", len(self.DATA), hashlib.sha256(self.DATA).hexdigest(),
+        )
+
+    def _send(self, start, end, sha=""):
+        chunk = self.DATA[start:end]
+        return uploads.append_chunk(self.session.pk, self.user, start, io.BytesIO(chunk), len(chunk), sha)
+
+    def test_chunks_assemble_and_verify(self):
+        self._send(0, 1000, hashlib.sha256(self.DATA[:1000]).hexdigest())
+        self.assertEqual(self._send(1000, 3000).received, 3000)
+        uploads.finish_upload(self.session.pk, self.user)
+
+        f = uploads.open_upload(self.user, self.session.pk)
+        self.assertEqual(f.read(), self.DATA)
+        self.assertEqual(f.name, "report.pdf")
+        uploads.release_upload(f)
+        self.assertFalse(os.path.exists(self.session.temp_path))
+
+    def test_wrong_offset_reports_where_to_resume(self):
+        self._send(0, 1000)
+        with self.assertRaises(uploads.OffsetMismatch) as cm:
+            self._send(500, 1500)
+        self.assertEqual(cm.exception.offset, 1000)
+
+        # same file again (e.g. after a reload) resumes the open session
+        resumed = uploads.start_upload(self.user, "report.pdf", len(self.DATA), self.session.sha256)
+        self.assertEqual((resumed.pk, resumed.received), (self.session.pk, 1000))
+
+    def test_bad_chunk_checksum_is_dropped(self):
+        with self.assertRaises(uploads.UploadError):
+            self._send(0, 1000, "0" * 64)
+
+        self.assertEqual(UploadSession.objects.get(pk=self.session.pk).received, 0)
+        self.assertEqual(os.path.getsize(self.session.temp_path), 0)
+        self.assertEqual(os.listdir(self.tmp.name), [os.path.basename(self.session.temp_path)])
+
+    def test_short_body_keeps_what_arrived(self):
+        session = uploads.append_chunk(self.session.pk, self.user, 0, io.BytesIO(self.DATA[:400]), 1000)
+        self.assertEqual(session.received, 400)
+        self.assertEqual(self._send(400, 3000).received, 3000)
+
+    def test_whole_file_checksum_mismatch_discards(self):
+        self.session.sha256 = "f" * 64
+        self.session.save()
+        self._send(0, 3000)
+        with self.assertRaises(uploads.UploadError):
+            uploads.finish_upload(self.session.pk, self.user)
+        self.assertFalse(UploadSession.objects.filter(pk=self.session.pk).exists())
+
+    def test_finish_before_all_bytes_arrived(self):
+        self._send(0, 1000)
+        with self.assertRaises(uploads.OffsetMismatch):
+            uploads.finish_upload(self.session.pk, self.user)
+
+
+@override_settings(VECTOR_DTYPE="float32")
+class VectorStoreTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        settings_override = override_settings(VECTOR_INDEX_DIR=tmp.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.store = vectors.VectorStore(1)
+
+    def _search(self, text, k=5, **kwargs):
+        embedder = get_embedder()
+        q = embed_texts([text], embedder)[0]
+        return self.store.search(q, embedder.name, k=k, **kwargs)
+
+    def test_sync_embeds_only_changes(self):
+        items = [
+            ("page", 1, 10, "pricing plans and monthly billing"),
+            ("page", 2, 10, "office locations and opening hours"),
+            ("source", 10, 10, "Acme website"),
+        ]
+        self.assertEqual(self.store.sync(items, scope_source_ids=[10])["embedded"], 3)
+        self.assertEqual(self._search("monthly billing")[0]["id"], 1)
+
+        changed = items[:2] + [("source", 10, 10, "Acme Corp website")]
+        stats = self.store.sync(changed, scope_source_ids=[10])
+        self.assertEqual((stats["embedded"], stats["kept"]), (1, 2))
+
+        stats = self.store.sync(changed[1:], scope_source_ids=[10])
+        self.assertEqual(stats["removed"], 1)
+        self.assertNotIn(1, [h["id"] for h in self._search("monthly billing")])
+
+    def test_scope_limits_what_is_removed(self):
+        self.store.sync([("page", 1, 10, "pricing"), ("page", 2, 20, "hours")], scope_source_ids=[10, 20])
+        self.store.sync([], scope_source_ids=[10])
+
+        self.assertEqual([h["id"] for h in self._search("hours")], [2])
+        self.assertEqual(self._search("hours", source_ids=[10]), [])
+
+    def test_compaction_drops_dead_rows(self):
+        items = [("chunk", i, 10, f"chunk number {i} about topic {i % 7}") for i in range(400)]
+        self.store.sync(items, scope_source_ids=[10])
+        gen = self.store.meta["generation"]
+
+        self.store.sync(items[:50], scope_source_ids=[10])
+
+        meta = self.store.meta
+        self.assertEqual((meta["generation"], meta["count"], meta["dead"]), (gen + 1, 50, 0))
+        self.assertEqual(self._search("chunk number 7 about topic 0", k=1)[0]["id"], 7)
+        self.assertFalse(os.path.exists(self.store._files(gen)[0]))
+
+    @override_settings(VECTOR_IVF_MIN_ROWS=500)
+    def test_ivf_recall_against_exact_search(self):
+        rng = random.Random(0)
+        topics = [[f"t{t}w{w}" for w in range(30)] for t in range(25)]
+        docs = [" ".join(rng.choices(topics[i % 25], k=12)) for i in range(1500)]
+        self.store.sync([("chunk", i, 10, d) for i, d in enumerate(docs)], scope_source_ids=[10])
+        self.assertIsNotNone(self.store.ivf)
+
+        nlist = len(self.store.ivf["centroids"])
+        hits = total = 0
+        for t in range(0, 25, 3):
+            query = " ".join(rng.choices(topics[t], k=6))
+            exact = {h["id"] for h in self._search(query, k=10, nprobe=nlist)}
+            approx = {h["id"] for h in self._search(query, k=10)}
+            hits += len(exact & approx)
+            total += len(exact)
+        self.assertGreaterEqual(hits / total, 0.8)
+
+        # rows added after the clusters were built are still found (searched as a tail)
+        self.store.sync([("chunk", 9999, 20, "brand new unclustered text")], scope_keys=[("chunk", 9999)])
+        self.assertEqual(self._search("brand new unclustered text", k=1)[0]["id"], 9999)
+
+
+class TagBitsetTests(SimpleTestCase):
+    def setUp(self):
+        # pages 1-4 of source 10, page 5 of source 20; tags 7 and 8
+        self.space = tagindex._Space()
+        self.space.load([(1, 10, 7), (1, 10, 8), (2, 10, 7), (3, 10, 8), (5, 20, 7)])
+
+    def _ids(self, bits):
+        return sorted(self.space.object_ids(bits))
+
+    def test_and_or_and_source_scope(self):
+        self.assertEqual(self._ids(self.space.match([7, 8], "all")), [1])
+        self.assertEqual(self._ids(self.space.match([7, 8], "any")), [1, 2, 3, 5])
+        self.assertEqual(self._ids(self.space.match([7], "all", [20])), [5])
+        self.assertEqual(self._ids(self.space.match([], "all", [10])), [1, 2, 3])
+        self.assertEqual(self._ids(self.space.match([7, -1], "all")), [])
+
+    def test_set_and_remove_source_patch_the_bits(self):
+        self.space.set(3, 10, [7])
+        self.space.set(4, 10, [8])
+        self.assertEqual(self._ids(self.space.match([7], "all")), [1, 2, 3, 5])
+        self.assertEqual(self._ids(self.space.match([8], "all")), [1, 4])
+
+        self.space.remove_source(10)
+        self.assertEqual(self._ids(self.space.match([7, 8], "any")), [5])
+
+    def test_facets_count_within_selection(self):
+        self.assertEqual(self.space.facets(self.space.match([], "all", [10])), {7: 2, 8: 2})
+        self.assertEqual(self.space.facets(self.space.match([8], "all")), {7: 1, 8: 2})
+
+    def test_bitset_round_trip(self):
+        ords = [0, 7, 8, 63, 64, 1000]
+        self.assertEqual(list(tagindex._ordinals(tagindex._to_bitset(ords, 1001))), ords)
+
+
+class TagIndexTests(TestCase):
+    def setUp(self):
+        tagindex._entries.clear()
+        self.addCleanup(tagindex._entries.clear)
+        self.user = get_user_model().objects.create_user(username="owner", password="pw")
+        self.src = DataSource.objects.create(user=self.user, name="Site", source_type="website", status="done")
+        self.pages = [
+            DataSourcePage.objects.create(source=self.src, url=f"https://x.com/{i}", status="done")
+            for i in range(3)
+        ]
+        set_tags_for_page(self.pages[0], ["Pricing", "Plans"])
+        set_tags_for_page(self.pages[1], ["Pricing"])
+        set_tags_for_source(self.src, ["Plans"])
+
+    def test_filter_keys(self):
+        self.assertEqual(
+            tagindex.filter_keys(self.user.pk, ["pricing", "plans"]),
+            {("page", self.pages[0].pk)},
+        )
+        self.assertEqual(
+            tagindex.filter_keys(self.user.pk, ["plans"], "any"),
+            {("page", self.pages[0].pk), ("source", self.src.pk)},
+        )
+        self.assertEqual(tagindex.filter_keys(self.user.pk, ["plans"], "any", source_ids=[]), set())
+
+    def test_page_facets_and_live_updates(self):
+        chips, page_ids = tagindex.page_facets(self.user.pk, self.src.pk)
+        self.assertEqual([(c["slug"], c["count"]) for c in chips], [("pricing", 2), ("plans", 1)])
+        self.assertIsNone(page_ids)
+
+        set_tags_for_page(self.pages[2], ["Plans"])
+        chips, page_ids = tagindex.page_facets(self.user.pk, self.src.pk, ["plans"])
+        self.assertEqual(sorted(page_ids), [self.pages[0].pk, self.pages[2].pk])
+        self.assertEqual([(c["slug"], c["count"]) for c in chips], [("plans", 2), ("pricing", 1)])
@@ -11,5 +11,11 @@ urlpatterns = [
     path("pages/<int:page_id>/summary/", views.update_page_summary, name="update_page_summary"),
     path("data-sources/documents/new/", views.document_source_new, name="document_source_new"),
     path("data-sources/sheet/new/", views.sheet_source_new, name="sheet_source_new"),
+    path("data-sources/sheet/<int:source_id>/reupload/", views.sheet_source_reupload, name="sheet_source_reupload"),
     path("data-sources/custom/new/", views.custom_source_new, name="custom_source_new"),
+
+    path("uploads/", views.upload_start, name="upload_start"),
+    path("uploads/<uuid:upload_id>/", views.upload_status, name="upload_status"),
+    path("uploads/<uuid:upload_id>/chunk/", views.upload_chunk, name="upload_chunk"),
+    path("uploads/<uuid:upload_id>/complete/", views.upload_complete, name="upload_complete"),
 ]
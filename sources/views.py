@@ -6,16 +6,23 @@ from django.http import JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.views.decorators.http import require_POST
 from django.views.decorators.csrf import ensure_csrf_cookie
+from agents.services.kb import mark_stale_for_source
 from landing.tracking import log_pageview
-from .forms import WebsiteSourceCreateForm, DocumentSourceCreateForm, SheetSourceCreateForm, CustomSourceCreateForm
-from .models import DataSource, DataSourcePage
+from .forms import WebsiteSourceCreateForm, DocumentSourceCreateForm, SheetSourceCreateForm, SheetReuploadForm, CustomSourceCreateForm
+from .forms import ALLOWED_EXTS, SHEET_EXTS
+from .models import DataSource, DataSourcePage, UploadSession
 from .services.url_safety import normalize_domain_url
-from .services.discover import discover_urls
-from .services.categorize import categorize_url
 from .services.documents import extract_text_from_pdf, extract_text_from_docx, extract_urls
-from .services.sheets import preview_xlsx, preview_csv
+from .services.rowstore import lookup_rows
+from .services.tagindex import page_facets
+from .services.vectors import embed_page, embed_source
+from .services.filestore import store_file, delete_file_if_unused, find_processed, reuse_document, reuse_sheet
+from .services.uploads import (
+    UPLOAD_CHUNK_BYTES, UploadError, OffsetMismatch,
+    start_upload, append_chunk, finish_upload, release_upload,
+)
 import json
-import os
+from urllib.parse import urlencode
 
 
 @login_required
@@ -63,20 +70,37 @@ def source_detail(request, source_id: int):
         headers = preview.get("headers") or []
         rows = preview.get("rows") or []
 
+        # Row lookup (name / email / phone / city) over the full row store
+        q = (request.GET.get("q") or "").strip()
+        if q and active:
+            matches = lookup_rows([src.id], q, limit=50, page_ids=[active.id])
+            rows = [list(m["data"].values()) for m in matches]
+
         return render(request, "sources/source_detail.html", {
             "src": src,
             "pages": pages,     # sheet “cards”
             "active": active,   # active sheet card
             "headers": headers,
             "rows": rows,
+            "q": q,
         })
 
-    # 5) Website: show up to 500 selected pages (with per-page tags)
+    # 5) Website: show up to 500 selected pages (with per-page tags), narrowed by tag chips
     if src.source_type == "website":
+        active_tags = request.GET.getlist("tag")
+        facets, page_ids = page_facets(request.user.id, src.id, active_tags)
+        for f in facets:
+            f["active"] = f["slug"] in active_tags
+            toggled = [t for t in active_tags if t != f["slug"]] if f["active"] else active_tags + [f["slug"]]
+            f["href"] = "?" + urlencode([("tag", t) for t in toggled])
+        if page_ids is not None:
+            pages_qs = pages_qs.filter(id__in=page_ids)
         pages = pages_qs.order_by("category", "url")[:500]
         return render(request, "sources/source_detail.html", {
             "src": src,
             "pages": pages,
+            "facets": facets,
+            "active_tags": active_tags,
         })
 
     # 6) Document (and any other future types that behave like a single-page list)
@@ -117,34 +141,8 @@ def website_source_new(request):
                 name=name,
                 source_type="website",
                 domain_url=domain_url,
-                status="draft",
+                status="discovering",      # run_source_jobs crawls for URLs, then flips it to "draft"
             )
-
-            # Discover URLs now (fast enough). If you want async later, we’ll job this too.
-            urls = discover_urls(domain_url, max_urls=300)
-
-            if not urls:
-                src.status = "failed"
-                src.error_message = "Could not discover any URLs from this website."
-                src.save(update_fields=["status", "error_message"])
-                messages.error(request, "We couldn’t scrape this website. Try Documents / Custom Info instead.")
-                return redirect("/data-sources/")
-
-            pages = []
-            for u in urls:
-                pages.append(DataSourcePage(
-                    source=src,
-                    url=u,
-                    category=categorize_url(u),
-                    selected=True,
-                    status="pending",
-                ))
-            DataSourcePage.objects.bulk_create(pages, ignore_conflicts=True)
-
-            src.total_pages = src.pages.count()
-            src.selected_pages = src.pages.filter(selected=True).count()
-            src.save(update_fields=["total_pages", "selected_pages"])
-
             return redirect(f"/data-sources/website/{src.id}/pages/")
 
     else:
@@ -156,6 +154,13 @@ def website_pages_select(request, source_id: int):
     src = get_object_or_404(DataSource, pk=source_id, user=request.user, source_type="website")
     log_pageview(request, path=f"/data-sources/website/{source_id}/pages/")
 
+    if src.status == "discovering":
+        # the template polls source_progress and reloads once the URLs are in
+        return render(request, "sources/website_select_pages.html", {"src": src, "discovering": True})
+    if src.status == "failed" and not src.total_pages:
+        messages.error(request, "We couldn’t scrape this website. Try Documents / Custom Info instead.")
+        return redirect("/data-sources/")
+
     q = (request.GET.get("q") or "").strip()
     cat = (request.GET.get("cat") or "").strip()
 
@@ -199,11 +204,16 @@ def website_pages_select(request, source_id: int):
             if selected_count == 0:
                 messages.error(request, "Select at least 1 URL to continue.")
             else:
+                # a manual run gives permanently failed pages another go
+                src.pages.filter(selected=True, status__in=["failed", "retry"]).update(
+                    status="pending", attempts=0, next_attempt_at=None, error="",
+                )
                 src.selected_pages = selected_count
                 src.processed_pages = 0
+                src.next_run_at = None
                 src.status = "pending"
                 src.error_message = ""
-                src.save(update_fields=["selected_pages", "processed_pages", "status", "error_message"])
+                src.save(update_fields=["selected_pages", "processed_pages", "next_run_at", "status", "error_message"])
                 messages.success(request, "Started scraping job. You can track progress in Source History.")
                 return redirect(f"/sources/{src.id}/")
 
@@ -213,7 +223,7 @@ def website_pages_select(request, source_id: int):
         src.save(update_fields=["total_pages", "selected_pages"])
         return redirect(request.get_full_path())
 
-    paginator = Paginator(pages_qs.order_by("category", "url"), 25)
+    paginator = Paginator(pages_qs.order_by("category", "-importance", "url"), 25)
     page_obj = paginator.get_page(request.GET.get("page") or 1)
 
     selected_count = src.pages.filter(selected=True).count()
@@ -255,6 +265,11 @@ def update_page_summary(request, page_id: int):
 
     page.summary = summary
     page.save(update_fields=["summary", "updated_at"])
+    mark_stale_for_source(page.source)
+    try:
+        embed_page(page)
+    except Exception:
+        pass  # semantic index catches up on the next source re-run / rebuild
 
     return JsonResponse({"ok": True, "summary": page.summary})
 
@@ -263,32 +278,44 @@ def document_source_new(request):
     log_pageview(request, path="/data-sources/documents/new/")
 
     if request.method == "POST":
-        form = DocumentSourceCreateForm(request.POST, request.FILES)
+        form = DocumentSourceCreateForm(request.POST, request.FILES, user=request.user)
         if form.is_valid():
             name = form.cleaned_data["name"].strip()
             f = form.cleaned_data["file"]
 
-            src = DataSource.objects.create(
+            src = DataSource(
                 user=request.user,
                 name=name,
                 source_type="document",
-                status="pending",
-                original_filename=f.name,
-                file=f,
+                status="draft",            # not claimable by the worker until we know whether it's a reuse
                 total_pages=1,
                 selected_pages=1,
                 processed_pages=0,
             )
+            store_file(src, f)
+            src.save()
 
             DataSourcePage.objects.create(
                 source=src,
-                url=f.name,
+                url=src.original_filename,
                 category="document",
                 selected=True,
                 status="pending",
             )
-
-            messages.success(request, "Document uploaded. Summarization job started.")
+            release_upload(f)
+
+            donor = find_processed(src)
+            if donor:
+                # same bytes were already extracted + summarized: no job needed
+                reuse_document(src, donor)
+                try:
+                    embed_source(src)
+                except Exception:
+                    pass  # the worker's next run of this source re-syncs its vectors
+                messages.success(request, f"This document was already processed in “{donor.name}”. Reused its summary and tags.")
+            else:
+                DataSource.objects.filter(pk=src.pk).update(status="pending")
+                messages.success(request, "Document uploaded. Summarization job started.")
             return redirect(f"/sources/{src.id}/")
     else:
         form = DocumentSourceCreateForm()
@@ -300,7 +327,7 @@ def sheet_source_new(request):
     log_pageview(request, path="/data-sources/sheet/new/")
 
     if request.method == "POST":
-        form = SheetSourceCreateForm(request.POST, request.FILES)
+        form = SheetSourceCreateForm(request.POST, request.FILES, user=request.user)
         if form.is_valid():
             name = form.cleaned_data["name"].strip()
             ctx = (form.cleaned_data["source_context"] or "").strip()
@@ -311,54 +338,23 @@ def sheet_source_new(request):
                 name=name,
                 source_type="sheet",
                 source_context=ctx,
-                status="pending",          # worker will summarize
+                status="draft",            # set to pending once the file (and any reused pages) are in place
                 processed_pages=0,
             )
-            src.file = f
-            src.original_filename = f.name
-            src.save(update_fields=["file", "original_filename"])
-
-            file_path = src.file.path
-            ext = os.path.splitext(src.original_filename.lower())[1]
-
-            pages = []
-            if ext == ".xlsx":
-                sheets = preview_xlsx(file_path, max_rows=10)
-                if not sheets:
-                    src.status = "failed"
-                    src.error_message = "Could not read any sheets from this Excel file."
-                    src.save(update_fields=["status", "error_message"])
-                    messages.error(request, "Could not parse this Excel. Try a CSV instead.")
-                    return redirect("/data-sources/")
-
-                for s in sheets:
-                    pages.append(DataSourcePage(
-                        source=src,
-                        url=s["sheet_name"],       # reuse url column to store sheet name
-                        category="sheet",
-                        selected=True,
-                        status="pending",
-                        preview={"headers": s["headers"], "rows": s["rows"]},
-                    ))
-
-            else:  # .csv
-                prev = preview_csv(file_path, max_rows=10)
-                pages.append(DataSourcePage(
-                    source=src,
-                    url=src.original_filename,
-                    category="csv",
-                    selected=True,
-                    status="pending",
-                    preview=prev,
-                ))
-
-            DataSourcePage.objects.bulk_create(pages)
-
-            src.total_pages = src.pages.count()
-            src.selected_pages = src.pages.filter(selected=True).count()
-            src.save(update_fields=["total_pages", "selected_pages"])
-
-            messages.success(request, "Sheet uploaded. Summarization will appear shortly in Source History.")
+            # just persist the file: parsing happens in the worker, not in this request
+            store_file(src, f)
+            src.save(update_fields=["file", "original_filename", "file_sha256"])
+            release_upload(f)
+
+            donor = find_processed(src)
+            if donor:
+                # the worker only loads rows; summary and tags come from the earlier upload
+                reuse_sheet(src, donor)
+                messages.success(request, f"This sheet was already summarized in “{donor.name}”. Reused its summary; rows are loading.")
+            else:
+                messages.success(request, "Sheet uploaded. Summarization will appear shortly in Source History.")
+            # worker reads the sheets, then summarizes
+            DataSource.objects.filter(pk=src.pk).update(status="pending")
             return redirect(f"/sources/{src.id}/")
 
     else:
@@ -366,6 +362,134 @@ def sheet_source_new(request):
 
     return render(request, "sources/sheet_new.html", {"form": form})
 
+@login_required
+def sheet_source_reupload(request, source_id: int):
+    """
+    Replace the file behind an existing sheet source; the worker diffs the rows
+    against the row store and only re-summarizes if the columns changed.
+    """
+    src = get_object_or_404(DataSource, id=source_id, user=request.user, source_type="sheet")
+    log_pageview(request, path=f"/data-sources/sheet/{src.id}/reupload/")
+
+    if src.status in ("pending", "running"):
+        messages.error(request, "This sheet is still being processed. Try again in a moment.")
+        return redirect(f"/sources/{src.id}/")
+
+    if request.method == "POST":
+        form = SheetReuploadForm(request.POST, request.FILES, user=request.user)
+        if form.is_valid():
+            f = form.cleaned_data["file"]
+            key_column = (form.cleaned_data["key_column"] or "").strip()
+            old_file = src.file.name
+            old_sha = src.file_sha256
+
+            store_file(src, f)
+            release_upload(f)
+            if src.status == "done" and src.file_sha256 == old_sha and key_column == src.sheet_key_column:
+                messages.success(request, "This file is identical to the current version. Nothing to update.")
+                return redirect(f"/sources/{src.id}/")
+
+            src.sheet_key_column = key_column
+            src.status = "pending"
+            src.error_message = ""
+            src.save(update_fields=["file", "original_filename", "file_sha256", "sheet_key_column", "status", "error_message"])
+
+            if old_file and old_file != src.file.name:
+                delete_file_if_unused(old_file, src.file.storage)
+
+            messages.success(request, "New version uploaded. Only changed rows will be updated.")
+            return redirect(f"/sources/{src.id}/")
+    else:
+        form = SheetReuploadForm(initial={"key_column": src.sheet_key_column})
+
+    headers = []
+    first = src.pages.order_by("id").first()
+    if first:
+        headers = (first.preview or {}).get("headers") or []
+
+    return render(request, "sources/sheet_reupload.html", {"form": form, "src": src, "headers": headers})
+
+UPLOAD_KINDS = {"document": ALLOWED_EXTS, "sheet": SHEET_EXTS}
+
+@login_required
+@require_POST
+def upload_start(request):
+    """
+    Open (or resume) a chunked upload.
+    Accepts JSON: { "filename", "size", "sha256", "kind": "document" | "sheet" }
+    Returns the upload id and the offset to continue from.
+    """
+    try:
+        payload = json.loads(request.body.decode("utf-8") or "{}")
+        size = int(payload.get("size") or 0)
+    except (json.JSONDecodeError, TypeError, ValueError):
+        return JsonResponse({"ok": False, "error": "Invalid JSON"}, status=400)
+
+    try:
+        session = start_upload(
+            request.user,
+            payload.get("filename") or "",
+            size,
+            payload.get("sha256") or "",
+            allowed_exts=UPLOAD_KINDS.get(payload.get("kind")),
+        )
+    except UploadError as e:
+        return JsonResponse({"ok": False, "error": str(e)}, status=400)
+
+    return JsonResponse({
+        "ok": True,
+        "upload_id": str(session.id),
+        "offset": session.received,
+        "chunk_size": UPLOAD_CHUNK_BYTES,
+    })
+
+@login_required
+def upload_status(request, upload_id):
+    session = get_object_or_404(UploadSession, pk=upload_id, user=request.user)
+    return JsonResponse({"ok": True, "offset": session.received, "size": session.size, "status": session.status})
+
+@login_required
+@require_POST
+def upload_chunk(request, upload_id):
+    """
+    Raw chunk bytes as the request body, streamed straight to the temp file.
+    Headers: X-Upload-Offset (required), X-Chunk-SHA256 (optional).
+    409 + the server's offset when the client is out of step (resume from there).
+    """
+    try:
+        offset = int(request.headers.get("X-Upload-Offset", ""))
+        length = int(request.META.get("CONTENT_LENGTH") or 0)
+    except ValueError:
+        return JsonResponse({"ok": False, "error": "Missing X-Upload-Offset header."}, status=400)
+
+    try:
+        session = append_chunk(
+            upload_id, request.user, offset, request, length,
+            chunk_sha256=request.headers.get("X-Chunk-SHA256", ""),
+        )
+    except UploadSession.DoesNotExist:
+        return JsonResponse({"ok": False, "error": "Upload not found."}, status=404)
+    except OffsetMismatch as e:
+        return JsonResponse({"ok": False, "error": str(e), "offset": e.offset}, status=409)
+    except UploadError as e:
+        return JsonResponse({"ok": False, "error": str(e)}, status=400)
+
+    return JsonResponse({"ok": True, "offset": session.received})
+
+@login_required
+@require_POST
+def upload_complete(request, upload_id):
+    try:
+        finish_upload(upload_id, request.user)
+    except UploadSession.DoesNotExist:
+        return JsonResponse({"ok": False, "error": "Upload not found."}, status=404)
+    except OffsetMismatch as e:
+        return JsonResponse({"ok": False, "error": "Upload incomplete.", "offset": e.offset}, status=409)
+    except UploadError as e:
+        return JsonResponse({"ok": False, "error": str(e)}, status=400)
+
+    return JsonResponse({"ok": True, "upload_id": str(upload_id)})
+
 @login_required
 def custom_source_new(request):
     log_pageview(request, path="/data-sources/custom/new/")
@@ -378,10 +502,10 @@ def custom_source_new(request):
                 name=form.cleaned_data["name"].strip(),
                 source_type="custom",
                 custom_text=form.cleaned_data["custom_text"],
-                status="done",              # immediately done (no worker)
+                status="pending",           # worker only chunks it; the text is usable right away
                 total_pages=1,
                 selected_pages=1,
-                processed_pages=1,
+                processed_pages=0,
                 error_message="",
             )
             messages.success(request, "Custom source added.")